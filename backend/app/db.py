@@ -1,4 +1,8 @@
-from tortoise import Tortoise
+import asyncio
+
+from tortoise import Tortoise, connections
+from tortoise.exceptions import IntegrityError
+from services.metrics import instrument_db
 from settings import settings
 
 
@@ -10,6 +14,9 @@ TORTOISE_ORM = {
                 "models.device",
                 "models.binding",
                 "models.user_token",
+                "models.device_state",
+                "models.kv_entry",
+                "models.cache_generation",
             ],
             "default_connection": "default",
         }
@@ -19,7 +26,14 @@ TORTOISE_ORM = {
 
 async def init_db() -> None:
     await Tortoise.init(config=TORTOISE_ORM)
-    await Tortoise.generate_schemas()
+    try:
+        await Tortoise.generate_schemas()
+    except IntegrityError:
+        # несколько воркеров создают таблицы одновременно: дожидаемся
+        # соседа и повторяем (CREATE ... IF NOT EXISTS)
+        await asyncio.sleep(1.0)
+        await Tortoise.generate_schemas()
+    instrument_db(connections.get("default"))
 
 
 async def close_db() -> None:
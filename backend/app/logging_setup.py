@@ -0,0 +1,182 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from settings import settings
+
+# Атрибуты LogRecord; всё остальное в record.__dict__ — поля из extra=
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+# Секреты, которые не должны попасть в лог ни в каком виде
+_SECRETS = [
+    (re.compile(r"\b(Bearer|OAuth|Oauth)\s+[^\s\"',]+"), r"\1 ***"),
+    (re.compile(
+        r"\b(code|token|access_token|refresh_token|client_secret|password"
+        r"|conversationToken|oauthToken)"
+        r"(=|\"?\s*:\s*\"?)([^&\s\"',}]+)"
+    ), r"\1\2***"),
+    (re.compile(r"\bgAAAAA[\w-]{20,}={0,2}"), "***"),  # шифртекст Fernet
+]
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _SECRETS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class Formatter(logging.Formatter):
+    """Текст или JSON; поля из ``extra=`` дописываются как ``key=value``.
+
+    Форматирование и вырезание секретов идут уже в потоке записи логов,
+    а не в event loop.
+    """
+
+    def __init__(self, json_lines: bool = False) -> None:
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RESERVED}
+        if self.json_lines:
+            entry = {
+                "ts": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return redact(json.dumps(entry, ensure_ascii=False, default=str))
+        text = super().format(record)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return redact(text)
+
+
+class SamplingFilter(logging.Filter):
+    """Не больше ``rate`` записей в секунду на шаблон сообщения.
+
+    Ограничение — token bucket на пару (логгер, шаблон), так что поток
+    однотипных сообщений по устройствам не забивает лог; число
+    пропущенных дописывается к следующей записи. ERROR и выше проходят
+    всегда.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+        self._buckets: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.ERROR:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._buckets.clear()
+                # токены, время, пропущено
+                bucket = self._buckets[key] = [self.rate, now, 0]
+            tokens = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return False
+            bucket[0] = tokens - 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Кладёт запись в очередь, не форматируя её в вызывающем потоке"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        values = args.values() if isinstance(args, dict) else args
+        if args and not all(isinstance(a, _PRIMITIVES) for a in values):
+            # изменяемые аргументы фиксируем сейчас, пока они не поменялись
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[_QueueHandler] = None
+_stream: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def init_logging() -> None:
+    """Корневой логгер пишет через очередь; stderr — в отдельном потоке.
+
+    Уровни: ``log_level`` для всего приложения и ``log_levels`` для
+    отдельных логгеров (например, ``{"routes.provider": "DEBUG"}``).
+    """
+    global _handler, _stream, _listener
+    if _listener is not None:
+        return
+    _stream = logging.StreamHandler()
+    _stream.setFormatter(Formatter(json_lines=settings.log_format == "json"))
+    _handler = _QueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+    _handler.addFilter(SamplingFilter(settings.log_sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(settings.log_level.upper())
+    for name, level in settings.log_levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(
+        _handler.queue, _stream, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(close_logging)
+
+
+def close_logging() -> None:
+    """Дописывает очередь и переключает корневой логгер на прямую запись"""
+    global _listener
+    if _listener is None:
+        return
+    if _handler.dropped:
+        logging.getLogger(__name__).warning(
+            "Log queue overflowed, dropped %d records", _handler.dropped
+        )
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    root.addHandler(_stream)
+
+
+def stats() -> dict:
+    return {
+        "running": _listener is not None,
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
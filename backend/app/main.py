@@ -1,21 +1,33 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import logging
 
 from settings import settings
 from db import init_db, close_db
+from logging_setup import close_logging, init_logging
 from services.adb_pool import adb_pool
+from services.adb_shell import shell_sessions
+from services.adb_tracker import adb_tracker
+from services.cache_sync import cache_sync
+from services.http_clients import http_clients
+from services.kv_store import adb_status, oauth_codes, replica_stats
+from services.leader import leader
+from services.metrics import MetricsMiddleware
+from services.mqtt_publisher import mqtt_publisher
 from services.mqtt_service import mqtt_service
+from services.provider_tokens import provider_tokens
+from services.state_store import state_store
+from services.tracing import TracingMiddleware
+from services.station_client import station_client
+from services.yandex_notifier import yandex_notifier
 from routes import api_router
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Логи пишутся через очередь в фоновом потоке; уровни — из Settings
+init_logging()
 
 app = FastAPI(title="y2m", version="0.1.0")
 
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -36,18 +48,58 @@ async def health():
     return {"status": "ok"}
 
 
+async def start_singletons():
+    """Фоновые службы, которые должны работать ровно в одном воркере"""
+    await adb_status.start()
+    await adb_pool.start()
+    await oauth_codes.start()
+    await replica_stats.start()
+    await provider_tokens.start()
+    # уведомления Яндекса шлёт только лидер: иначе каждое изменение
+    # состояния ушло бы по разу из каждого воркера
+    await yandex_notifier.start()
+    if mqtt_service.mode == "leader":
+        await mqtt_service.set_invokes(True)
+
+
+async def stop_singletons():
+    if mqtt_service.mode == "leader":
+        await mqtt_service.set_invokes(False)
+    await yandex_notifier.stop()
+    await provider_tokens.stop()
+    await replica_stats.stop()
+    await oauth_codes.stop()
+    await adb_pool.stop()
+    await adb_status.stop()
+
+
+leader.on_elected(start_singletons)
+leader.on_demoted(stop_singletons)
+
+
 @app.on_event("startup")
 async def on_startup():
     await init_db()
     app.include_router(api_router)
-    await adb_pool.start()
+    await cache_sync.start()
+    await state_store.start()
+    await http_clients.start()
+    await adb_tracker.start()
+    await mqtt_publisher.start()
     await mqtt_service.start()
+    await leader.start()
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
-    await adb_pool.stop()
+    await leader.stop()
+    await shell_sessions.stop()
+    await adb_tracker.stop()
     await mqtt_service.stop()
+    await mqtt_publisher.stop()
+    await station_client.stop()
+    await state_store.stop()
+    await cache_sync.stop()
+    await http_clients.stop()
     await close_db()
-
-
+    close_logging()
@@ -13,5 +13,8 @@ class Binding(Model):
 
     class Meta:
         table = "bindings"
+        # привязки устройства: удаление вместе с устройством и отвязка по
+        # device_id, поиск по ключу реестра (device, "type:instance")
+        indexes = (("device_id", "capability"),)
 
 
@@ -0,0 +1,11 @@
+from tortoise import fields
+from tortoise.models import Model
+
+
+class CacheGeneration(Model):
+    name = fields.CharField(pk=True, max_length=64)  # e.g. discovery, bindings
+    value = fields.CharField(max_length=32)  # случайная метка последней инвалидации
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "cache_generations"
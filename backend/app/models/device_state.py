@@ -0,0 +1,15 @@
+from tortoise import fields
+from tortoise.models import Model
+
+
+class DeviceState(Model):
+    id = fields.IntField(pk=True)
+    device_id = fields.IntField(index=True)
+    type = fields.CharField(max_length=128)  # e.g. devices.capabilities.on_off
+    instance = fields.CharField(max_length=64)  # e.g. on, volume, channel
+    value = fields.JSONField(null=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "device_states"
+        unique_together = (("device_id", "type", "instance"),)
@@ -0,0 +1,15 @@
+from tortoise import fields
+from tortoise.models import Model
+
+
+class KVEntry(Model):
+    id = fields.IntField(pk=True)
+    namespace = fields.CharField(max_length=64)  # e.g. oauth_codes
+    key = fields.CharField(max_length=255)
+    value = fields.JSONField(null=True)
+    expires_at = fields.FloatField(index=True)  # unix time
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "kv_entries"
+        unique_together = (("namespace", "key"),)
@@ -2,6 +2,11 @@ from .base import Action, ActionResult
 from typing import Literal
 import asyncio
 
+from services.adb_client import ADBError, adb_client
+from services.adb_shell import shell_sessions
+from services.adb_tracker import adb_tracker
+from settings import settings
+
 
 class ADBAction(Action):
     type: Literal["adb"] = "adb"
@@ -23,13 +28,18 @@ class ADBAction(Action):
         cmd = payload.get("command")
         if not host or not cmd:
             return {"ok": False, "error": "invalid config"}
-        proc = await asyncio.create_subprocess_exec(
-            "adb", "-s", f"{host}:{port}", "shell", cmd,
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await proc.communicate()
-        if proc.returncode != 0:
-            return {"ok": False, "error": (stderr or stdout).decode(errors="ignore")}
-        return {"ok": True, "output": stdout.decode(errors="ignore")}
-
-
+        serial = f"{host}:{port}"
+        if adb_tracker.is_offline(serial):
+            return {"ok": False, "error": f"device {serial} is offline"}
+        try:
+            if settings.adb_persistent_shell:
+                code, stdout, stderr = await shell_sessions.run(serial, cmd)
+            else:
+                code, stdout, stderr = await adb_client.shell(serial, cmd)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": "adb timeout"}
+        except (ADBError, OSError) as exc:
+            return {"ok": False, "error": str(exc)}
+        if code != 0:
+            return {"ok": False, "error": stderr or stdout}
+        return {"ok": True, "output": stdout}
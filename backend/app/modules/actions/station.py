@@ -1,7 +1,12 @@
 from .base import Action, ActionResult
 from typing import Literal
+import asyncio
 import httpx
 
+from services.http_clients import http_clients
+from services.station_client import StationError, station_client
+from settings import settings
+
 
 class StationAction(Action):
     type: Literal["station"] = "station"
@@ -23,7 +28,7 @@ class StationAction(Action):
         }
 
     async def execute(self, payload: dict) -> ActionResult:
-        """Выполняет команду на Яндекс Станции через yapi контейнер"""
+        """Выполняет команду на Яндекс Станции: по LAN напрямую или через yapi"""
         import logging
         logger = logging.getLogger(__name__)
         
@@ -45,23 +50,37 @@ class StationAction(Action):
             elif command == "rewind":
                 body["position"] = payload.get("position", 0)
             
-            logger.info(f"Executing station command: {command} on device {device_id}")
-            
+            log_extra = {"station_id": device_id}
+            logger.info("Executing station command %s", command, extra=log_extra)
+            done = f"Station command '{command}' executed successfully"
+
+            if settings.station_native:
+                # Напрямую в станцию по уже открытому WebSocket
+                await station_client.send(
+                    device_id, body, oauth_token,
+                    host=payload.get("host"), port=payload.get("port")
+                )
+                return {"ok": True, "output": done}
+
             # Отправляем команду в yapi контейнер
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                yapi_url = "http://yapi:8001"
-                
-                logger.info(f"Sending request to yapi at {yapi_url} with data: {body}")
-                
-                response = await client.post(yapi_url, json=body)
-                
-                logger.info(f"yapi response: {response.status_code} - {response.text}")
-                
-                if response.status_code == 200:
-                    return {"ok": True, "output": f"Station command '{command}' executed successfully"}
-                else:
-                    return {"ok": False, "error": f"yapi error: {response.status_code} - {response.text}"}
-                    
+            logger.debug("Sending station command %s to yapi", command, extra=log_extra)
+
+            response = await http_clients.get("yapi").post("/", json=body)
+
+            logger.debug("yapi response %s", response.status_code, extra=log_extra)
+
+            if response.status_code == 200:
+                return {"ok": True, "output": done}
+            else:
+                error = f"yapi error: {response.status_code} - {response.text}"
+                return {"ok": False, "error": error}
+
+        except StationError as e:
+            logger.error("Station error: %s", e, extra={"station_id": device_id})
+            return {"ok": False, "error": str(e)}
+        except asyncio.TimeoutError:
+            logger.error("station command timeout")
+            return {"ok": False, "error": "station command timeout"}
         except httpx.ConnectError:
             logger.error("yapi container not available")
             return {"ok": False, "error": "yapi container not available"}
@@ -69,7 +88,7 @@ class StationAction(Action):
             logger.error("yapi request timeout")
             return {"ok": False, "error": "yapi request timeout"}
         except Exception as e:
-            logger.error(f"Station action error: {e}")
+            logger.error("Station action error: %s", e)
             return {"ok": False, "error": str(e)}
 
 
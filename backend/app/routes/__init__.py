@@ -9,6 +9,11 @@ from .auth import router as auth_router
 from .station_proxy import router as station_router
 from .provider import router as provider_router
 from .oauth import router as oauth_router
+from .mqtt import router as mqtt_router
+from .http import router as http_router
+from .cluster import router as cluster_router
+from .metrics import router as metrics_router
+from .traces import router as traces_router
 
 
 api_router = APIRouter()
@@ -21,5 +26,10 @@ api_router.include_router(auth_router)
 api_router.include_router(station_router)
 api_router.include_router(provider_router)
 api_router.include_router(oauth_router)
+api_router.include_router(mqtt_router)
+api_router.include_router(http_router)
+api_router.include_router(cluster_router)
+api_router.include_router(metrics_router)
+api_router.include_router(traces_router)
 
 
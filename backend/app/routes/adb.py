@@ -2,6 +2,12 @@ import asyncio
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from services.adb_client import ADBError, adb_client
+from services.adb_pool import adb_pool
+from services.adb_tracker import adb_tracker
+from services.kv_store import adb_status
+from services.leader import leader
+
 
 router = APIRouter(prefix="/api/adb", tags=["adb"])
 
@@ -19,29 +25,25 @@ class DisconnectBody(ConnectBody):
     pass
 
 
-async def run_cmd(cmd: list[str], timeout: float = 20.0) -> tuple[int, str, str]:
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
+async def run_cmd(coro, timeout: float = 20.0):
     try:
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        return await asyncio.wait_for(coro, timeout=timeout)
     except asyncio.TimeoutError:
-        proc.kill()
         raise HTTPException(status_code=408, detail="ADB timeout")
-    return proc.returncode, stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
+    except (ADBError, OSError) as exc:
+        raise HTTPException(status_code=500, detail=str(exc) or "adb failed")
 
 
 @router.post("/connect")
 async def adb_connect(body: ConnectBody):
-    code, out, err = await run_cmd(["adb", "connect", f"{body.host}:{body.port}"])
-    if code != 0:
-        raise HTTPException(status_code=500, detail=err or out or "adb connect failed")
+    out = await run_cmd(adb_client.connect(body.host, body.port))
     return {"ok": True, "output": out}
 
 
 @router.post("/exec")
 async def adb_exec(body: ExecBody):
-    code, out, err = await run_cmd(["adb", "-s", f"{body.host}:{body.port}", "shell", body.cmd])
+    serial = f"{body.host}:{body.port}"
+    code, out, err = await run_cmd(adb_client.shell(serial, body.cmd))
     if code != 0:
         raise HTTPException(status_code=500, detail=err or out or "adb shell failed")
     return {"ok": True, "output": out}
@@ -49,17 +51,29 @@ async def adb_exec(body: ExecBody):
 
 @router.post("/disconnect")
 async def adb_disconnect(body: DisconnectBody):
-    code, out, err = await run_cmd(["adb", "disconnect", f"{body.host}:{body.port}"])
-    if code != 0:
-        raise HTTPException(status_code=500, detail=err or out or "adb disconnect failed")
+    out = await run_cmd(adb_client.disconnect(f"{body.host}:{body.port}"))
     return {"ok": True, "output": out}
 
 
 @router.get("/devices")
 async def adb_devices():
-    code, out, err = await run_cmd(["adb", "devices"])
-    if code != 0:
-        raise HTTPException(status_code=500, detail=err or out or "adb devices failed")
+    devices = await run_cmd(adb_client.devices())
+    lines = "".join(f"{serial}\t{state}\n" for serial, state in devices)
+    out = "List of devices attached\n" + lines
     return {"ok": True, "output": out}
 
 
+@router.get("/status")
+async def get_adb_status():
+    """Переподключения ведёт лидер: остальные воркеры отдают его последний снимок"""
+    if leader.is_leader:
+        devices = adb_pool.status()
+    else:
+        published = await adb_status.get("pool")
+        devices = published["devices"] if published else None
+    return {
+        "ok": True,
+        "leader": leader.is_leader,
+        "tracking": adb_tracker.live,
+        "devices": devices,
+    }
@@ -4,11 +4,13 @@ from typing import Optional
 
 from models.binding import Binding
 from models.device import Device
-from models.user_token import UserToken
-from services.crypto import decrypt
-from settings import settings
+from services.binding_registry import binding_registry
+from services.cache_sync import cache_sync
+from services.mqtt_publisher import PublishQueueFull, mqtt_publisher
+from services.oauth_yandex import get_provider_token
+from services.payload_template import TemplateError, validate_mqtt_config
+from services.tracing import tracer
 import json
-import aiomqtt
 
 
 router = APIRouter(prefix="/api/bindings", tags=["bindings"])
@@ -27,6 +29,16 @@ class BindingUpdate(BaseModel):
     action_config: Optional[dict] = None
 
 
+def _check_templates(action_type: str, action_config: Optional[dict]) -> None:
+    """Шаблоны MQTT-привязки разбираются при сохранении, а не при первом invoke"""
+    if action_type != "mqtt":
+        return
+    try:
+        validate_mqtt_config(action_config)
+    except TemplateError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid MQTT template: {exc}")
+
+
 @router.get("")
 async def list_bindings():
     items = await Binding.all().prefetch_related("device")
@@ -46,12 +58,15 @@ async def list_bindings():
 async def create_binding(payload: BindingCreate):
     if not await Device.exists(id=payload.device_id):
         raise HTTPException(status_code=404, detail="Device not found")
+    _check_templates(payload.action_type, payload.action_config)
     b = await Binding.create(
         device_id=payload.device_id,
         capability=payload.capability,
         action_type=payload.action_type,
         action_config=payload.action_config,
     )
+    binding_registry.invalidate()
+    await cache_sync.bump("bindings")
     return {"id": b.id}
 
 
@@ -61,7 +76,13 @@ async def update_binding(binding_id: int, payload: BindingUpdate):
     if not b:
         raise HTTPException(status_code=404, detail="Binding not found")
     update_dict = {k: v for k, v in payload.model_dump().items() if v is not None}
+    _check_templates(
+        update_dict.get("action_type", b.action_type),
+        update_dict.get("action_config", b.action_config),
+    )
     await b.update_from_dict(update_dict).save()
+    binding_registry.invalidate()
+    await cache_sync.bump("bindings")
     return {"ok": True}
 
 
@@ -70,6 +91,8 @@ async def delete_binding(binding_id: int):
     deleted = await Binding.filter(id=binding_id).delete()
     if not deleted:
         raise HTTPException(status_code=404, detail="Binding not found")
+    binding_registry.invalidate()
+    await cache_sync.bump("bindings")
     return {"ok": True}
 
 
@@ -79,65 +102,44 @@ class InvokePayload(BaseModel):
 
 @router.post("/{binding_id}/invoke")
 async def invoke_binding(binding_id: int, body: InvokePayload | None = None):
-    b = await Binding.get_or_none(id=binding_id)
-    if not b:
+    entry = await binding_registry.get(binding_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Binding not found")
 
     # Обогащаем payload в зависимости от типа действия
     payload = (body.payload if body and body.payload else {})
     
-    if b.action_type == "station":
-        # Берём токен провайдера из БД (любой активный для провайдера yandex)
-        token_record = await UserToken.filter(provider="yandex").first()
-        if not token_record:
-            raise HTTPException(status_code=400, detail="No Yandex token configured")
-        try:
-            oauth_token = decrypt(token_record.access_token)
-        except Exception:
-            oauth_token = token_record.access_token
-
-        payload = {
-            **payload,
-            "oauthToken": oauth_token,
-            "deviceId": (b.action_config or {}).get("deviceId"),
-        }
-        topic = f"y2m/bindings/{binding_id}/invoke"
-        message = json.dumps(payload)
-        
-    elif b.action_type == "mqtt":
-        # Для MQTT отправляем в указанный топик
-        mqtt_topic = (b.action_config or {}).get("topic")
-        if not mqtt_topic:
-            raise HTTPException(status_code=400, detail="MQTT topic not configured")
-        
-        # Подготавливаем payload с подстановкой переменных
-        mqtt_payload = (b.action_config or {}).get("payload", "{}")
-        
-        # Подставляем переменные из payload от Яндекса
-        if payload:
-            # Извлекаем данные из payload Яндекса
-            yandex_value = payload.get("value")
-            yandex_capability = payload.get("capability", b.capability)
-            yandex_instance = payload.get("instance")
-            yandex_device_id = payload.get("device_id", b.device_id)
-            
-            # Заменяем переменные в payload
-            mqtt_payload = mqtt_payload.replace("{{value}}", str(yandex_value) if yandex_value is not None else "")
-            mqtt_payload = mqtt_payload.replace("{{capability}}", str(yandex_capability))
-            mqtt_payload = mqtt_payload.replace("{{instance}}", str(yandex_instance) if yandex_instance else "")
-            mqtt_payload = mqtt_payload.replace("{{device_id}}", str(yandex_device_id))
-        
-        topic = mqtt_topic
-        message = mqtt_payload
-        
-    else:
-        # Для ADB и других типов
-        topic = f"y2m/bindings/{binding_id}/invoke"
-        message = json.dumps(payload)
-
-    # Публикуем в MQTT
-    async with aiomqtt.Client(hostname=settings.mqtt_host, port=settings.mqtt_port) as client:
-        await client.publish(topic, message, qos=0, retain=False)
+    try:
+        if entry.action_type == "mqtt":
+            # Для MQTT сразу публикуем в указанный топик
+            result = await entry.execute(payload)
+            if not result.get("ok"):
+                raise HTTPException(status_code=400, detail=result.get("error"))
+            return {"ok": True}
+
+        if entry.action_type == "station":
+            # Берём токен провайдера из БД (любой активный для провайдера yandex)
+            oauth_token = await get_provider_token()
+            if not oauth_token:
+                raise HTTPException(
+                    status_code=400, detail="No Yandex token configured"
+                )
+            payload = {
+                **payload,
+                "oauthToken": oauth_token,
+                "deviceId": entry.action_config.get("deviceId"),
+            }
+
+        # Для ADB и станции выполняет потребитель y2m/bindings/+/invoke;
+        # traceId продолжает трассу запроса в воркере и в сообщении состояния
+        trace_id = tracer.current_id()
+        if trace_id:
+            payload = {**payload, "traceId": trace_id}
+        await mqtt_publisher.publish(
+            f"y2m/bindings/{binding_id}/invoke", json.dumps(payload),
+            qos=0, retain=False,
+        )
+    except PublishQueueFull:
+        raise HTTPException(status_code=503, detail="MQTT publish queue is full")
 
     return {"ok": True}
-
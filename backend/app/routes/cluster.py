@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from services.cache_sync import cache_sync
+from services.leader import leader
+
+
+router = APIRouter(prefix="/api/cluster", tags=["cluster"])
+
+
+@router.get("/status")
+async def cluster_status():
+    return {**leader.status(), "cache_sync": cache_sync.stats()}
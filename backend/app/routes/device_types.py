@@ -1,17 +1,11 @@
 from fastapi import APIRouter
-import json
-from pathlib import Path
 
+from services.device_catalog import device_catalog
 
-router = APIRouter(prefix="/api/device-types", tags=["device-types"])
 
-DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "yandex_device_types.json"
+router = APIRouter(prefix="/api/device-types", tags=["device-types"])
 
 
 @router.get("")
 async def list_device_types():
-    with DATA_PATH.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
-
-
+    return device_catalog.raw()
@@ -4,8 +4,13 @@ from pydantic import BaseModel
 from typing import Optional
 
 from models.device import Device
-from services.adb_pool import ensure_connected
-from .provider import get_device_capabilities
+from services.adb_pool import adb_pool
+from services.binding_registry import binding_registry
+from services.cache_sync import cache_sync
+from services.device_catalog import device_catalog
+from services.discovery_cache import discovery_cache
+from services.state_store import state_store
+from services.yandex_notifier import yandex_notifier
 
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
@@ -40,9 +45,12 @@ async def list_devices():
 @router.post("")
 async def create_device(payload: DeviceCreate):
     device = await Device.create(**payload.model_dump())
+    discovery_cache.bump()
+    await cache_sync.bump("discovery")
+    yandex_notifier.devices_changed()
     if device.adb_host and device.adb_port:
         # fire-and-forget ensure connection
-        asyncio.create_task(ensure_connected(device.adb_host, device.adb_port))
+        asyncio.create_task(adb_pool.connect(device.adb_host, device.adb_port))
     return {"id": device.id}
 
 
@@ -52,8 +60,12 @@ async def update_device(device_id: int, payload: DeviceUpdate):
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     await device.update_from_dict(payload.model_dump()).save()
+    discovery_cache.bump()
+    yandex_notifier.devices_changed()
+    binding_registry.invalidate()
+    await cache_sync.bump("discovery", "bindings")
     if device.adb_host and device.adb_port:
-        asyncio.create_task(ensure_connected(device.adb_host, device.adb_port))
+        asyncio.create_task(adb_pool.connect(device.adb_host, device.adb_port))
     return {"ok": True}
 
 
@@ -69,6 +81,11 @@ async def delete_device(device_id: int):
     
     # Удаляем само устройство
     await device.delete()
+    discovery_cache.bump()
+    yandex_notifier.devices_changed()
+    binding_registry.invalidate()
+    await cache_sync.bump("discovery", "bindings")
+    state_store.forget([device_id])
     
     return {"ok": True}
 
@@ -78,7 +95,7 @@ async def device_capabilities(device_id: int):
     device = await Device.get_or_none(id=device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    caps = get_device_capabilities(device.yandex_type)
+    caps = device_catalog.capabilities(device.yandex_type)
     # pydantic v2 BaseModel supports model_dump
     return {"capabilities": [c.model_dump() for c in caps]}
 
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from services.http_clients import http_clients
+
+
+router = APIRouter(prefix="/api/http", tags=["http"])
+
+
+@router.get("/status")
+async def http_status():
+    return {"upstreams": http_clients.stats()}
@@ -0,0 +1,104 @@
+from collections import Counter
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+import logging_setup
+from services.adb_pool import adb_pool
+from services.adb_shell import shell_sessions
+from services.http_clients import http_clients
+from services.leader import leader
+from services.metrics import metrics
+from services.mqtt_publisher import mqtt_publisher
+from services.mqtt_service import mqtt_service
+from services.provider_tokens import provider_tokens
+from services.station_client import station_client
+from services.token_cache import token_cache
+from services.yandex_notifier import yandex_notifier
+
+
+router = APIRouter(tags=["metrics"])
+
+
+def _adb_states():
+    states = Counter(d["state"] for d in adb_pool.status())
+    return [((state,), count) for state, count in states.items()]
+
+
+def _upstream(field: str):
+    return [((name,), s[field]) for name, s in http_clients.stats().items()]
+
+
+# Значения, которые службы уже считают сами, читаются при каждой выдаче
+metrics.callback(
+    "y2m_mqtt_queue_depth", "Invokes waiting in worker queues",
+    lambda: mqtt_service.stats()["queue_depth"],
+)
+metrics.callback(
+    "y2m_mqtt_invokes_processed_total", "Invokes executed",
+    lambda: mqtt_service.processed, "counter",
+)
+metrics.callback(
+    "y2m_mqtt_invokes_failed_total", "Invokes that raised",
+    lambda: mqtt_service.failed, "counter",
+)
+metrics.callback(
+    "y2m_mqtt_publish_queue_size", "Outgoing MQTT messages queued",
+    lambda: mqtt_publisher.queue_size,
+)
+metrics.callback(
+    "y2m_mqtt_publisher_connected", "Publisher connection state",
+    lambda: int(mqtt_publisher.connected),
+)
+metrics.callback(
+    "y2m_adb_devices", "ADB devices by autoconnect state",
+    _adb_states, labels=("state",),
+)
+metrics.callback(
+    "y2m_adb_shell_sessions", "Open persistent adb shell sessions",
+    lambda: shell_sessions.stats()["sessions"],
+)
+metrics.callback(
+    "y2m_station_connected", "Station WebSocket connections that are up",
+    lambda: sum(1 for s in station_client.status() if s["connected"]),
+)
+metrics.callback(
+    "y2m_http_upstream_requests_total", "Outgoing HTTP requests by upstream",
+    lambda: _upstream("requests"), "counter", ("upstream",),
+)
+metrics.callback(
+    "y2m_http_upstream_connections_total", "New TCP connections by upstream",
+    lambda: _upstream("connections"), "counter", ("upstream",),
+)
+metrics.callback(
+    "y2m_yandex_callbacks_sent_total", "Yandex callbacks delivered",
+    lambda: yandex_notifier.sent, "counter",
+)
+metrics.callback(
+    "y2m_yandex_callbacks_failed_total", "Yandex callbacks given up",
+    lambda: yandex_notifier.failed, "counter",
+)
+metrics.callback(
+    "y2m_token_cache_lookups_total", "Bearer token cache lookups by result",
+    lambda: [(("hit",), token_cache.hits), (("miss",), token_cache.misses)],
+    "counter", ("result",),
+)
+metrics.callback(
+    "y2m_provider_token_lookups_total", "Provider token cache lookups by result",
+    lambda: [(("hit",), provider_tokens.hits), (("miss",), provider_tokens.misses)],
+    "counter", ("result",),
+)
+metrics.callback(
+    "y2m_log_records_dropped_total", "Log records dropped on a full queue",
+    lambda: logging_setup.stats()["dropped"], "counter",
+)
+metrics.callback(
+    "y2m_leader", "1 if this worker is the leader", lambda: int(leader.is_leader)
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
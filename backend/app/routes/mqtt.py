@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+
+from services.mqtt_publisher import mqtt_publisher
+from services.mqtt_service import mqtt_service
+
+
+router = APIRouter(prefix="/api/mqtt", tags=["mqtt"])
+
+
+@router.get("/status")
+async def mqtt_status():
+    return {
+        "consumer": mqtt_service.stats(),
+        "publisher": {
+            "connected": mqtt_publisher.connected,
+            "queue_size": mqtt_publisher.queue_size,
+        },
+    }
+
+
+@router.get("/replicas")
+async def mqtt_replicas():
+    """Счётчики всех реплик потребителя — для проверки баланса invoke"""
+    return {"replicas": await mqtt_service.replicas_stats()}
@@ -9,7 +9,11 @@ import base64
 import logging
 from urllib.parse import urlencode
 
-from services.oauth_yandex import exchange_code, save_tokens
+from services.oauth_yandex import exchange_code, refresh_access_token, save_tokens
+from services.cache_sync import cache_sync
+from services.kv_store import oauth_codes
+from services.provider_tokens import provider_tokens
+from services.token_cache import hash_token, token_cache
 from settings import settings
 from models.user_token import UserToken
 
@@ -17,10 +21,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["oauth"])
 
-# Хранилище временных кодов авторизации (в продакшене использовать Redis)
-auth_codes = {}
-
-
 class TokenRequest(BaseModel):
     grant_type: str
     code: Optional[str] = None
@@ -49,18 +49,21 @@ async def authorize(
 ):
     """OAuth 2.0 Authorization Endpoint для навыка Яндекс.Умный дом"""
     
-    logger.info(f"Authorize request: client_id={client_id}, redirect_uri={redirect_uri}, state={state}")
+    logger.info(
+        "Authorize request",
+        extra={"client_id": client_id, "redirect_uri": redirect_uri},
+    )
     
     # Проверяем параметры
     if response_type != "code":
-        logger.error(f"Unsupported response type: {response_type}")
+        logger.error("Unsupported response type: %s", response_type)
         raise HTTPException(
             status_code=400, 
             detail="Unsupported response type. Only 'code' is supported."
         )
     
     if client_id != settings.yandex_skill_client_id:
-        logger.error(f"Invalid client_id: {client_id}, expected: {settings.yandex_skill_client_id}")
+        logger.error("Invalid client_id", extra={"client_id": client_id})
         raise HTTPException(
             status_code=400, 
             detail="Invalid client_id"
@@ -90,22 +93,24 @@ async def authorize(
         return HTMLResponse(content=login_page)
     
     # Пользователь уже авторизован, генерируем код авторизации
-    logger.info(f"User authenticated, generating auth code for user_token_id={token_record.id}")
+    logger.info(
+        "User authenticated, issuing auth code",
+        extra={"user_token_id": token_record.id},
+    )
     auth_code = secrets.token_urlsafe(32)
     
     # Сохраняем код авторизации с параметрами
-    auth_codes[auth_code] = {
+    await oauth_codes.set(auth_code, {
         "client_id": client_id,
         "redirect_uri": redirect_uri,
         "scope": scope,
         "state": state,
         "user_token_id": token_record.id,
-        "expires_at": None
-    }
+    })
     
     # Перенаправляем обратно в навык с кодом авторизации
     redirect_url = f"{redirect_uri}?code={auth_code}&state={state or ''}"
-    logger.info(f"Redirecting to: {redirect_url}")
+    logger.info("Redirecting back to skill", extra={"redirect_uri": redirect_uri})
     return RedirectResponse(url=redirect_url)
 
 
@@ -120,7 +125,9 @@ async def token(
 ):
     """OAuth 2.0 Token Endpoint"""
     
-    logger.info(f"Token request: grant_type={grant_type}, client_id={client_id}, code={'***' if code else None}")
+    logger.info(
+        "Token request", extra={"grant_type": grant_type, "client_id": client_id}
+    )
     
     if grant_type == "authorization_code":
         return await handle_authorization_code_grant(
@@ -131,7 +138,7 @@ async def token(
             grant_type, code, refresh_token, client_id, client_secret, redirect_uri
         )
     else:
-        logger.error(f"Unsupported grant type: {grant_type}")
+        logger.error("Unsupported grant type: %s", grant_type)
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported grant type: {grant_type}"
@@ -164,15 +171,14 @@ async def handle_authorization_code_grant(
             detail="Invalid client credentials"
         )
     
-    # Проверяем код авторизации
-    if code not in auth_codes:
+    # Проверяем код авторизации и сразу погашаем его (код одноразовый)
+    auth_code_data = await oauth_codes.pop(code)
+    if auth_code_data is None:
         raise HTTPException(
             status_code=400,
             detail="Invalid or expired authorization code"
         )
     
-    auth_code_data = auth_codes[code]
-    
     # Получаем существующий токен пользователя
     try:
         user_token_record = await UserToken.get(id=auth_code_data["user_token_id"])
@@ -182,9 +188,6 @@ async def handle_authorization_code_grant(
         access_token = decrypt(user_token_record.access_token)
         refresh_token_decrypted = decrypt(user_token_record.refresh_token) if user_token_record.refresh_token else None
         
-        # Удаляем использованный код авторизации
-        del auth_codes[code]
-        
         return TokenResponse(
             access_token=access_token,
             token_type="Bearer",
@@ -194,7 +197,7 @@ async def handle_authorization_code_grant(
         )
         
     except Exception as e:
-        logger.error(f"Token exchange error: {e}")
+        logger.error("Token exchange error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to exchange code for token: {str(e)}"
@@ -244,16 +247,7 @@ async def handle_refresh_token_grant(
         from services.crypto import decrypt
         decrypted_refresh_token = decrypt(token_record.refresh_token)
         
-        async with httpx.AsyncClient(timeout=15) as client:
-            data = {
-                "grant_type": "refresh_token",
-                "refresh_token": decrypted_refresh_token,
-                "client_id": settings.ya_client_id,
-                "client_secret": settings.ya_client_secret,
-            }
-            resp = await client.post("https://oauth.yandex.ru/token", data=data)
-            resp.raise_for_status()
-            token_data = resp.json()
+        token_data = await refresh_access_token(decrypted_refresh_token)
             
     except httpx.HTTPStatusError as e:
         raise HTTPException(
@@ -270,9 +264,13 @@ async def handle_refresh_token_grant(
     try:
         from services.crypto import encrypt
         token_record.access_token = encrypt(token_data["access_token"])
+        token_record.access_token_hash = hash_token(token_data["access_token"])
         if token_data.get("refresh_token"):
             token_record.refresh_token = encrypt(token_data["refresh_token"])
         await token_record.save()
+        token_cache.invalidate_user(token_record.user_id)
+        provider_tokens.invalidate("yandex")
+        await cache_sync.bump("tokens")
         
         return TokenResponse(
             access_token=token_data["access_token"],
@@ -1,28 +1,40 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Sequence
+import asyncio
 import json
 import logging
 import uuid
 
+from models.binding import Binding
 from models.device import Device
 from models.user_token import UserToken
+from services.binding_registry import binding_registry
+from services.cache_sync import cache_sync
 from services.crypto import decrypt
-import hashlib
+from services.device_catalog import DeviceCapability, device_catalog
+from services.discovery_cache import discovery_cache
+from services.mqtt_publisher import PublishQueueFull, mqtt_publisher
+from services.provider_tokens import provider_tokens
+from services.state_store import DEFAULT_INSTANCES, state_store
+from services.token_cache import hash_token, token_cache
+from services.tracing import tracer
+from settings import settings
 
 router = APIRouter(prefix="/v1.0", tags=["provider"])
 security = HTTPBearer()
 
 logger = logging.getLogger(__name__)
 
+# Код ошибки для команд, не успевших выполниться до settings.action_deadline
+ACTION_TIMEOUT_CODE = "DEVICE_UNREACHABLE"
 
-class DeviceCapability(BaseModel):
-    type: str
-    retrievable: bool = True
-    reportable: bool = True
-    parameters: Optional[Dict[str, Any]] = None
-    description: Optional[str] = None
+
+def _request_id(request: Request) -> str:
+    """Один id на запрос: X-Request-Id, иначе id трассы из TracingMiddleware"""
+    header = request.headers.get("X-Request-Id")
+    return header or tracer.current_id() or str(uuid.uuid4())
 
 
 class DeviceInfo(BaseModel):
@@ -46,25 +58,14 @@ class DeviceAction(BaseModel):
 async def get_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """Извлекает user_id из токена авторизации"""
     try:
-        logger.info(f"Validating token: {credentials.credentials[:20]}...")
-        
-        # Находим токен в базе данных
-        token_record = await UserToken.filter(
-            provider="yandex",
-            access_token__isnull=False
-        ).first()
-        
-        if not token_record:
-            logger.error("No token found in database")
-            raise HTTPException(status_code=401, detail="Token not found")
-        
-        logger.info(f"Found token record: id={token_record.id}, user_id={token_record.user_id}")
-        
-        # Сопоставляем по хэшу без хранения открытого токена
         bearer = credentials.credentials
-        bearer_hash = hashlib.sha256(bearer.encode("utf-8")).hexdigest()
+        bearer_hash = hash_token(bearer)
+
+        cached_user_id = token_cache.get(bearer_hash)
+        if cached_user_id is not None:
+            return cached_user_id
 
-        # Ищем по хэшу в БД
+        # Сопоставляем по хэшу без хранения открытого токена
         token_record = await UserToken.filter(provider="yandex", access_token_hash=bearer_hash).first()
 
         # Fallback: если старые записи без hash — проверим расшифровкой и одновременно бэконим hash
@@ -86,19 +87,30 @@ async def get_user_from_token(credentials: HTTPAuthorizationCredentials = Depend
             token_record = legacy
         
         # Возвращаем user_id из токена
-        user_id = token_record.user_id
-        logger.info(f"Token validated successfully for user_id: {user_id}")
-        return str(user_id)
+        user_id = str(token_record.user_id)
+        token_cache.put(bearer_hash, user_id)
+        logger.debug("Token validated", extra={"user_id": user_id})
+        return user_id
         
     except Exception as e:
-        logger.error(f"Token validation error: {e}")
+        logger.error("Token validation error: %s", e)
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
+async def fetch_devices(device_ids: Iterable[Any]) -> Dict[str, Device]:
+    """Загружает устройства одним запросом ``id__in``; ключ — id в виде строки,
+    как его присылает Яндекс. Отсутствующие id в результат не попадают.
+    Привязки не подгружаются: действия находят их через binding_registry."""
+    pks = {int(str(device_id)) for device_id in device_ids if str(device_id).isdigit()}
+    if not pks:
+        return {}
+    return {str(device.id): device for device in await Device.filter(id__in=pks)}
+
+
 @router.head("")
 async def health_check():
     """Проверка доступности Endpoint URL провайдера"""
-    logger.info("Health check called")
+    logger.debug("Health check called")
     return {}
 
 
@@ -106,40 +118,44 @@ async def health_check():
 async def get_devices(request: Request, user_id: str = Depends(get_user_from_token)):
     """Информация об устройствах пользователя"""
     try:
-        logger.info(f"GET /user/devices called with user_id: {user_id}")
-        request_id = request.headers.get("X-Request-Id") or str(uuid.uuid4())
-        
-        devices = await Device.all()
-        logger.info(f"Found {len(devices)} devices for user {user_id}")
-        
-        devices_list = []
-        for device in devices:
-            logger.info(f"Processing device: id={device.id} (type={type(device.id)}), name={device.name}, type={device.yandex_type}")
-            # Определяем тип устройства и его возможности
-            device_info = DeviceInfo(
-                id=str(device.id),
-                name=device.name,
-                type=device.yandex_type,
-                capabilities=get_device_capabilities(device.yandex_type),
-                device_info={
-                    "manufacturer": "Y2M",
-                    "model": device.name,
-                    "hw_version": "1.0",
-                    "sw_version": "1.0"
-                }
-            )
-            devices_list.append(device_info.dict())
-        
-        return {
-            "request_id": request_id,
-            "payload": {
+        logger.debug("GET /user/devices", extra={"user_id": user_id})
+        request_id = _request_id(request)
+
+        # Поколение читаем до запроса к БД: если список устройств изменится
+        # во время сборки, ответ не попадёт в кэш
+        cache_key = (discovery_cache.generation, device_catalog.version)
+        body = discovery_cache.get(user_id, cache_key)
+        if body is None:
+            devices = await Device.all()
+            logger.debug("Found %d devices", len(devices), extra={"user_id": user_id})
+
+            devices_list = []
+            for device in devices:
+                # Определяем тип устройства и его возможности
+                device_info = DeviceInfo(
+                    id=str(device.id),
+                    name=device.name,
+                    type=device.yandex_type,
+                    capabilities=get_device_capabilities(device.yandex_type),
+                    device_info={
+                        "manufacturer": "Y2M",
+                        "model": device.name,
+                        "hw_version": "1.0",
+                        "sw_version": "1.0"
+                    }
+                )
+                devices_list.append(device_info.model_dump())
+
+            body = discovery_cache.put(user_id, cache_key, {
                 "user_id": user_id,
                 "devices": devices_list
-            }
-        }
-        
+            })
+
+        content = discovery_cache.render(request_id, body)
+        return Response(content=content, media_type="application/json")
+
     except Exception as e:
-        logger.error(f"Error getting devices: {e}")
+        logger.error("Error getting devices: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -147,12 +163,13 @@ async def get_devices(request: Request, user_id: str = Depends(get_user_from_tok
 async def query_devices(request: Request, query: DeviceQuery, user_id: str = Depends(get_user_from_token)):
     """Информация о состояниях устройств пользователя"""
     try:
-        request_id = request.headers.get("X-Request-Id") or str(uuid.uuid4())
+        request_id = _request_id(request)
         devices = []
+        found = await fetch_devices(item["id"] for item in query.devices)
         
         for device_query in query.devices:
             device_id = device_query["id"]
-            device = await Device.get_or_none(id=device_id)
+            device = found.get(str(device_id))
             
             if device:
                 # Получаем текущее состояние устройства
@@ -161,6 +178,12 @@ async def query_devices(request: Request, query: DeviceQuery, user_id: str = Dep
                     "id": device_id,
                     "capabilities": state
                 })
+            else:
+                devices.append({
+                    "id": device_id,
+                    "error_code": "DEVICE_NOT_FOUND",
+                    "error_message": "Device not found"
+                })
         
         return {
             "request_id": request_id,
@@ -170,7 +193,7 @@ async def query_devices(request: Request, query: DeviceQuery, user_id: str = Dep
         }
         
     except Exception as e:
-        logger.error(f"Error querying devices: {e}")
+        logger.error("Error querying devices: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -178,14 +201,18 @@ async def query_devices(request: Request, query: DeviceQuery, user_id: str = Dep
 async def device_action(request: Request, action: DeviceAction, user_id: str = Depends(get_user_from_token)):
     """Изменение состояния устройств пользователя"""
     try:
-        request_id = request.headers.get("X-Request-Id") or str(uuid.uuid4())
+        request_id = _request_id(request)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.action_deadline
         results = []
+        jobs = []
+        found = await fetch_devices(item["id"] for item in action.devices)
         
         for device_action_item in action.devices:
             device_id = device_action_item["id"]
             capabilities = device_action_item.get("capabilities", [])
             
-            device = await Device.get_or_none(id=device_id)
+            device = found.get(str(device_id))
             if not device:
                 results.append({
                     "id": device_id,
@@ -194,28 +221,18 @@ async def device_action(request: Request, action: DeviceAction, user_id: str = D
                 })
                 continue
             
-            # Обрабатываем каждую команду
-            device_result = {"id": device_id, "capabilities": []}
-            
-            for capability in capabilities:
-                try:
-                    result = await execute_device_action(device, capability)
-                    device_result["capabilities"].append(result)
-                except Exception as e:
-                    logger.error(f"Error executing action for device {device_id}: {e}")
-                    device_result["capabilities"].append({
-                        "type": capability["type"],
-                        "state": {
-                            "instance": capability.get("state", {}).get("instance"),
-                            "action_result": {
-                                "status": "ERROR",
-                                "error_code": "ACTION_ERROR",
-                                "error_message": str(e)
-                            }
-                        }
-                    })
-            
+            # Пока команда не выполнена, в ответе для неё стоит ошибка таймаута
+            device_result = {
+                "id": device_id,
+                "capabilities": [
+                    _action_error(capability, ACTION_TIMEOUT_CODE, "Action timed out")
+                    for capability in capabilities
+                ]
+            }
             results.append(device_result)
+            jobs.append((device, capabilities, device_result["capabilities"]))
+
+        await run_device_actions(jobs, deadline - loop.time())
         
         return {
             "request_id": request_id,
@@ -225,17 +242,102 @@ async def device_action(request: Request, action: DeviceAction, user_id: str = D
         }
         
     except Exception as e:
-        logger.error(f"Error executing device action: {e}")
+        logger.error("Error executing device action: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+def _action_error(capability: Dict[str, Any], error_code: str,
+                  error_message: str) -> Dict[str, Any]:
+    return {
+        "type": capability.get("type"),
+        "state": {
+            "instance": (capability.get("state") or {}).get("instance"),
+            "action_result": {
+                "status": "ERROR",
+                "error_code": error_code,
+                "error_message": error_message
+            }
+        }
+    }
+
+
+async def _remember_state(device: Device, capability: Dict[str, Any],
+                          result: Dict[str, Any]) -> None:
+    result_state = result.get("state") or {}
+    if (result_state.get("action_result") or {}).get("status") != "DONE":
+        return
+    requested = capability.get("state") or {}
+    instance = result_state.get("instance") or requested.get("instance")
+    value = requested["value"] if "value" in requested else requested.get(instance)
+    if value is None:
+        return
+    state_store.set(device.id, capability["type"], instance, value)
+    # остальные воркеры, в том числе лидер с уведомлениями Яндекса,
+    # узнают о новом состоянии из y2m/devices/{id}/state
+    message = {"type": capability["type"], "instance": instance, "value": value}
+    trace_id = tracer.current_id()
+    if trace_id:
+        message["traceId"] = trace_id
+    try:
+        with tracer.span("state.publish", device_id=device.id):
+            await mqtt_publisher.publish(
+                f"y2m/devices/{device.id}/state", json.dumps(message),
+                qos=0, retain=False, timeout=0,
+            )
+    except PublishQueueFull:
+        logger.warning(
+            "Dropped state message for device %s: publish queue is full", device.id
+        )
+
+
+async def run_device_actions(jobs: List[tuple], timeout: float) -> None:
+    """Выполняет действия параллельно по устройствам.
+
+    ``jobs`` — список ``(device, capabilities, slots)``: команды одного
+    устройства идут строго по порядку, результат каждой записывается в
+    ``slots`` на её позицию. Одновременно обрабатывается не больше
+    ``settings.action_concurrency`` устройств; всё, что не успело до
+    истечения ``timeout``, отменяется и остаётся с ошибкой таймаута.
+    """
+    if not jobs:
+        return
+    semaphore = asyncio.Semaphore(max(1, settings.action_concurrency))
+
+    async def run_device(device: Device, capabilities: List[Dict[str, Any]],
+                         slots: List[Dict[str, Any]]) -> None:
+        async with semaphore:
+            for index, capability in enumerate(capabilities):
+                try:
+                    result = await execute_device_action(device, capability)
+                    slots[index] = result
+                    await _remember_state(device, capability, result)
+                except Exception as e:
+                    logger.error(
+                        "Error executing action: %s", e,
+                        extra={"device_id": device.id},
+                    )
+                    slots[index] = _action_error(capability, "ACTION_ERROR", str(e))
+
+    tasks = [asyncio.create_task(run_device(*job)) for job in jobs]
+    _, pending = await asyncio.wait(tasks, timeout=max(0.0, timeout))
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(
+            "Action deadline exceeded, %d device(s) unfinished", len(pending)
+        )
+
+
 @router.post("/user/unlink")
 async def unlink_user(request: Request, user_id: str = Depends(get_user_from_token)):
     """Обработка отвязки аккаунта пользователя"""
     try:
-        request_id = request.headers.get("X-Request-Id") or str(uuid.uuid4())
+        request_id = _request_id(request)
         # Удаляем токены пользователя
         await UserToken.filter(provider="yandex", user_id=user_id).delete()
+        token_cache.invalidate_user(user_id)
+        provider_tokens.invalidate("yandex")
+        await cache_sync.bump("tokens")
         
         return {
             "request_id": request_id,
@@ -246,7 +348,7 @@ async def unlink_user(request: Request, user_id: str = Depends(get_user_from_tok
         }
         
     except Exception as e:
-        logger.error(f"Error unlinking user: {e}")
+        logger.error("Error unlinking user: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -254,21 +356,24 @@ async def unlink_user(request: Request, user_id: str = Depends(get_user_from_tok
 async def unlink_device(request: Request, device_query: DeviceQuery, user_id: str = Depends(get_user_from_token)):
     """Обработка отвязки конкретного устройства от Яндекс Дома"""
     try:
-        request_id = request.headers.get("X-Request-Id") or str(uuid.uuid4())
+        request_id = _request_id(request)
         results = []
+        found = await fetch_devices(item["id"] for item in device_query.devices)
+
+        if found:
+            pks = [device.id for device in found.values()]
+            # Удаляем все привязки устройств и сами устройства
+            await Binding.filter(device_id__in=pks).delete()
+            await Device.filter(id__in=pks).delete()
+            discovery_cache.bump()
+            state_store.forget(pks)
+            binding_registry.invalidate()
+            await cache_sync.bump("discovery", "bindings")
         
         for device_query_item in device_query.devices:
             device_id = device_query_item["id"]
-            device = await Device.get_or_none(id=device_id)
             
-            if device:
-                # Удаляем все привязки устройства
-                from models.binding import Binding
-                await Binding.filter(device_id=device_id).delete()
-                
-                # Удаляем само устройство
-                await device.delete()
-                
+            if str(device_id) in found:
                 results.append({
                     "id": device_id,
                     "status": "unlinked"
@@ -288,240 +393,41 @@ async def unlink_device(request: Request, device_query: DeviceQuery, user_id: st
         }
         
     except Exception as e:
-        logger.error(f"Error unlinking device: {e}")
+        logger.error("Error unlinking device: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-def get_capability_description(capability_type: str, instance: str = None) -> str:
-    """Возвращает описание capability на русском языке"""
-    descriptions = {
-        "devices.capabilities.on_off": "Включение/выключение",
-        "devices.capabilities.range": {
-            "brightness": "Яркость",
-            "volume": "Громкость", 
-            "temperature": "Температура",
-            "channel": "Канал",
-            "humidity": "Влажность",
-            "pressure": "Давление",
-            "co2_level": "Уровень CO2",
-            "pm1_density": "Плотность PM1",
-            "pm2.5_density": "Плотность PM2.5",
-            "pm10_density": "Плотность PM10",
-            "tvoc": "Летучие органические соединения",
-            "water_level": "Уровень воды",
-            "open": "Открытие",
-            "battery_level": "Уровень заряда",
-            "co_level": "Уровень CO",
-            "smoke_level": "Уровень дыма",
-            "ammonia": "Аммиак",
-            "butane": "Бутан",
-            "propane": "Пропан",
-            "methane": "Метан",
-            "hydrogen": "Водород",
-            "oxygen": "Кислород",
-            "ozone": "Озон",
-            "formaldehyde": "Формальдегид",
-            "heater": "Нагрев",
-            "current": "Ток",
-            "voltage": "Напряжение",
-            "power": "Мощность",
-            "electricity_meter": "Счетчик электроэнергии",
-            "gas_meter": "Счетчик газа",
-            "water_meter": "Счетчик воды",
-            "heat_meter": "Счетчик тепла"
-        },
-        "devices.capabilities.mode": {
-            "work_mode": "Режим работы",
-            "thermostat": "Термостат",
-            "fan_speed": "Скорость вентилятора",
-            "heat": "Нагрев",
-            "swing": "Качание",
-            "input_source": "Источник сигнала",
-            "tea_mode": "Режим заваривания чая",
-            "program": "Программа",
-            "tank_filled": "Заполнение бака",
-            "pause": "Пауза",
-            "fan_mode": "Режим вентилятора",
-            "ionization": "Ионизация",
-            "backlight": "Подсветка",
-            "child_lock": "Блокировка от детей",
-            "sound": "Звук",
-            "oscillation": "Колебание",
-            "humidity": "Влажность",
-            "buzzer": "Зуммер",
-            "led": "Светодиод",
-            "keep_warm": "Подогрев",
-            "boil": "Кипячение",
-            "controls_locked": "Блокировка управления",
-            "mute": "Отключение звука"
-        },
-        "devices.capabilities.toggle": {
-            "backlight": "Подсветка",
-            "controls_locked": "Блокировка управления",
-            "mute": "Отключение звука",
-            "pause": "Пауза",
-            "keep_warm": "Подогрев",
-            "sound": "Звук",
-            "boil": "Кипячение",
-            "ionization": "Ионизация",
-            "oscillation": "Колебание",
-            "buzzer": "Зуммер",
-            "led": "Светодиод",
-            "child_lock": "Блокировка от детей",
-            "night_light": "Ночной режим",
-            "swing": "Качание",
-            "tank_filled": "Заполнение бака"
-        },
-        "devices.capabilities.color_setting": "Настройка цвета",
-        "devices.capabilities.video_stream": "Видеопоток"
-    }
-    
-    if capability_type in descriptions:
-        if isinstance(descriptions[capability_type], dict) and instance:
-            return descriptions[capability_type].get(instance, instance)
-        elif isinstance(descriptions[capability_type], str):
-            return descriptions[capability_type]
-    
-    return capability_type.split('.')[-1].replace('_', ' ').title()
+def get_device_capabilities(device_type: str) -> Sequence[DeviceCapability]:
+    """Возвращает список возможностей для типа устройства"""
+    return device_catalog.capabilities(device_type)
 
 
-def get_device_capabilities(device_type: str) -> List[DeviceCapability]:
-    """Возвращает список возможностей для типа устройства"""
-    try:
-        # Загружаем типы устройств из JSON файла
-        import os
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        json_path = os.path.join(current_dir, "..", "data", "yandex_device_types.json")
-        
-        with open(json_path, "r", encoding="utf-8") as f:
-            device_types_data = json.load(f)
-        
-        # Ищем нужный тип устройства
-        for device_type_info in device_types_data["types"]:
-            if device_type_info["type"] == device_type:
-                capabilities = []
-                
-                # Обрабатываем capabilities из JSON
-                for cap in device_type_info.get("capabilities", []):
-                    if isinstance(cap, dict) and "type" in cap:
-                        cap_type = cap["type"]
-                        parameters = None
-                        
-                        # Добавляем parameters для capabilities с instances
-                        if "instances" in cap and cap["instances"]:
-                            for instance in cap["instances"]:
-                                if isinstance(instance, dict) and "function" in instance:
-                                    function = instance["function"]
-                                    
-                                    # Создаем parameters в зависимости от типа capability
-                                    if cap_type == "devices.capabilities.range":
-                                        if function == "brightness":
-                                            parameters = {
-                                                "instance": "brightness",
-                                                "range": {"min": 0, "max": 100, "precision": 1},
-                                                "unit": "unit.percent"
-                                            }
-                                        elif function == "volume":
-                                            parameters = {
-                                                "instance": "volume", 
-                                                "range": {"min": 0, "max": 100, "precision": 1},
-                                                "unit": "unit.percent"
-                                            }
-                                        elif function == "temperature":
-                                            parameters = {
-                                                "instance": "temperature",
-                                                "range": {"min": 0, "max": 100, "precision": 1},
-                                                "unit": "unit.temperature.celsius"
-                                            }
-                                        elif function == "channel":
-                                            parameters = {
-                                                "instance": "channel",
-                                                "range": {"min": 1, "max": 999, "precision": 1}
-                                            }
-                                        else:
-                                            parameters = {"instance": function}
-                                    
-                                    elif cap_type == "devices.capabilities.mode":
-                                        if "values" in instance and instance["values"]:
-                                            parameters = {
-                                                "instance": function,
-                                                "modes": [{"value": v} for v in instance["values"]]
-                                            }
-                                        else:
-                                            parameters = {"instance": function}
-                                    
-                                    elif cap_type == "devices.capabilities.toggle":
-                                        parameters = {"instance": function}
-                                    
-                                    elif cap_type == "devices.capabilities.color_setting":
-                                        parameters = {
-                                            "color_model": "rgb",
-                                            "temperature_k": {"min": 2000, "max": 9000}
-                                        }
-                                    
-                                    break  # Берем первый instance
-                        
-                        # Получаем описание capability
-                        description = get_capability_description(cap_type, parameters.get("instance") if parameters else None)
-                        
-                        capabilities.append(DeviceCapability(
-                            type=cap_type,
-                            retrievable=True,
-                            reportable=True,
-                            parameters=parameters,
-                            description=description
-                        ))
-                
-                return capabilities
-        
-        # Если тип устройства не найден, возвращаем базовый on_off
-        return [
-            DeviceCapability(
-                type="devices.capabilities.on_off",
-                retrievable=True,
-                reportable=True
-            )
-        ]
-        
-    except Exception as e:
-        logger.error(f"Error loading device capabilities for {device_type}: {e}")
-        # Fallback к базовому on_off
-        return [
-            DeviceCapability(
-                type="devices.capabilities.on_off",
-                retrievable=True,
-                reportable=True
-            )
-        ]
+def _state_instances(capability: DeviceCapability) -> Sequence[str]:
+    if capability.parameters and capability.parameters.get("instance"):
+        return (capability.parameters["instance"],)
+    if capability.type == "devices.capabilities.color_setting":
+        return ("rgb", "temperature_k")
+    default = DEFAULT_INSTANCES.get(capability.type)
+    return (default,) if default else ()
 
 
 async def get_device_state(device: Device) -> List[Dict[str, Any]]:
-    """Получает текущее состояние устройства"""
-    capabilities = get_device_capabilities(device.yandex_type)
+    """Получает текущее состояние устройства из state_store.
+
+    Capability, о которых ещё ничего не известно, в ответ не попадают.
+    """
     state = []
     
-    for capability in capabilities:
-        if capability.type == "devices.capabilities.on_off":
-            # Здесь должна быть логика получения реального состояния
-            # Для MVP возвращаем случайное состояние
-            import random
-            state.append({
-                "type": capability.type,
-                "state": {
-                    "instance": "on",
-                    "value": random.choice([True, False])
-                }
-            })
-        elif capability.type == "devices.capabilities.range":
-            instance = capability.parameters.get("instance", "brightness")
-            import random
-            state.append({
-                "type": capability.type,
-                "state": {
-                    "instance": instance,
-                    "value": random.randint(0, 100)
-                }
-            })
+    for capability in get_device_capabilities(device.yandex_type):
+        for instance in _state_instances(capability):
+            if state_store.has(device.id, capability.type, instance):
+                state.append({
+                    "type": capability.type,
+                    "state": {
+                        "instance": instance,
+                        "value": state_store.get(device.id, capability.type, instance)
+                    }
+                })
     
     return state
 
@@ -530,10 +436,34 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
     """Выполняет действие с устройством"""
     capability_type = capability["type"]
     state = capability.get("state", {})
+    instance = state.get("instance") or DEFAULT_INSTANCES.get(capability_type)
+
+    # Если для capability настроена привязка — выполняем её
+    binding = await binding_registry.resolve(device.id, capability_type, instance)
+    if binding is not None:
+        result = await binding.execute({
+            "type": capability_type,
+            "capability": capability_type,
+            "instance": instance,
+            "value": state.get("value"),
+            "device_id": device.id,
+        })
+        if not result.get("ok"):
+            error = result.get("error") or "Action failed"
+            return _action_error(capability, "ACTION_ERROR", error)
+        return {
+            "type": capability_type,
+            "state": {
+                "instance": instance,
+                "action_result": {
+                    "status": "DONE"
+                }
+            }
+        }
     
     if capability_type == "devices.capabilities.on_off":
         value = state.get("value", False)
-        logger.info(f"Device {device.id} on_off: {value}")
+        logger.debug("Device action on_off=%s", value, extra={"device_id": device.id})
         
         return {
             "type": capability_type,
@@ -548,7 +478,10 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
     elif capability_type == "devices.capabilities.range":
         instance = state.get("instance", "brightness")
         value = state.get("value", 50)
-        logger.info(f"Device {device.id} range {instance}: {value}")
+        logger.debug(
+            "Device action range %s=%s", instance, value,
+            extra={"device_id": device.id},
+        )
         
         return {
             "type": capability_type,
@@ -563,7 +496,10 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
     elif capability_type == "devices.capabilities.mode":
         instance = state.get("instance", "work_mode")
         value = state.get("value", "auto")
-        logger.info(f"Device {device.id} mode {instance}: {value}")
+        logger.debug(
+            "Device action mode %s=%s", instance, value,
+            extra={"device_id": device.id},
+        )
         
         return {
             "type": capability_type,
@@ -578,7 +514,10 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
     elif capability_type == "devices.capabilities.toggle":
         instance = state.get("instance", "pause")
         value = state.get("value", False)
-        logger.info(f"Device {device.id} toggle {instance}: {value}")
+        logger.debug(
+            "Device action toggle %s=%s", instance, value,
+            extra={"device_id": device.id},
+        )
         
         return {
             "type": capability_type,
@@ -594,7 +533,10 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
         # Поддерживаем как RGB, так и temperature_k
         if "rgb" in state:
             rgb = state["rgb"]
-            logger.info(f"Device {device.id} color_setting rgb: {rgb}")
+            logger.debug(
+                "Device action color_setting rgb=%s", rgb,
+                extra={"device_id": device.id},
+            )
             return {
                 "type": capability_type,
                 "state": {
@@ -606,7 +548,10 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
             }
         elif "temperature_k" in state:
             temp = state["temperature_k"]
-            logger.info(f"Device {device.id} color_setting temperature_k: {temp}")
+            logger.debug(
+                "Device action color_setting temperature_k=%s", temp,
+                extra={"device_id": device.id},
+            )
             return {
                 "type": capability_type,
                 "state": {
@@ -621,7 +566,7 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
     
     elif capability_type == "devices.capabilities.video_stream":
         # Для камер
-        logger.info(f"Device {device.id} video_stream action")
+        logger.debug("Device action video_stream", extra={"device_id": device.id})
         return {
             "type": capability_type,
             "state": {
@@ -633,7 +578,9 @@ async def execute_device_action(device: Device, capability: Dict[str, Any]) -> D
         }
     
     else:
-        logger.warning(f"Unknown capability type: {capability_type}, treating as on_off")
+        logger.warning(
+            "Unknown capability type %s, treating as on_off", capability_type
+        )
         # Fallback для неизвестных типов
         return {
             "type": capability_type,
@@ -1,7 +1,12 @@
+import asyncio
+import httpx
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-# For MVP we mimic yapi-like contract locally
+from services.http_clients import http_clients
+from services.oauth_yandex import get_provider_token
+from services.station_client import StationError, station_client
+from settings import settings
 
 
 router = APIRouter(prefix="/api/station", tags=["station"])
@@ -13,11 +18,43 @@ class StationCommand(BaseModel):
     text: str | None = None
     volume: float | None = None
     position: int | None = None
+    host: str | None = None
+    port: int | None = None
 
 
-@router.post("")
-async def station_command(body: StationCommand):
-    # Placeholder: integrate real LAN protocol later; for now we accept and return ok
-    return {"ok": True, "echo": body.model_dump()}
+async def send_via_yapi(payload: dict) -> dict:
+    try:
+        response = await http_clients.get("yapi").post("/", json=payload)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="yapi request timeout")
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="yapi container not available")
+    if response.status_code != 200:
+        detail = f"yapi error: {response.status_code} - {response.text}"
+        raise HTTPException(status_code=502, detail=detail)
+    return {"ok": True, "status": "SUCCESS"}
 
 
+@router.post("")
+async def station_command(body: StationCommand):
+    """Тот же путь, что у StationAction: по LAN при STATION_NATIVE, иначе yapi"""
+    payload = body.model_dump(exclude_none=True, exclude={"deviceId", "host", "port"})
+    if not settings.station_native:
+        return await send_via_yapi(payload)
+    token = await get_provider_token()
+    if not token:
+        raise HTTPException(status_code=401, detail="Yandex account is not linked")
+    try:
+        reply = await station_client.send(
+            body.deviceId, payload, token, host=body.host, port=body.port
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Station timeout")
+    except StationError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    return {"ok": True, "status": reply.get("status", "SUCCESS")}
+
+
+@router.get("/status")
+async def station_status():
+    return {"stations": station_client.status()}
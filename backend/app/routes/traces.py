@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from services.tracing import tracer
+
+
+router = APIRouter(prefix="/api/traces", tags=["traces"])
+
+
+@router.get("")
+async def recent_traces(limit: int = Query(50, ge=1, le=1000)):
+    """Последние трассы из кольцевого буфера, новые первыми"""
+    return {"traces": tracer.recent(limit)}
+
+
+@router.get("/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
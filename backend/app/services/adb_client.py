@@ -0,0 +1,247 @@
+import asyncio
+import contextlib
+import logging
+import struct
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from services.metrics import metrics
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# shell v2: [id:1][len:4 LE][data]
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+_SHELL_EXIT = 3
+
+Stream = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+adb_subprocesses = metrics.counter(
+    "y2m_adb_subprocesses_total", "adb processes spawned (start-server)"
+)
+adb_connections = metrics.counter(
+    "y2m_adb_server_connections_total", "Connections opened to the adb server"
+)
+adb_open = metrics.gauge(
+    "y2m_adb_server_connections_open", "Connections to the adb server currently open"
+)
+
+
+class ADBError(Exception):
+    """Ответ FAIL от adb-сервера или неожиданный обрыв протокола"""
+
+
+def is_device_error(exc: ADBError) -> bool:
+    """Ошибка из-за состояния устройства, а не из-за неподдерживаемой службы"""
+    message = str(exc)
+    return "not found" in message or "offline" in message or "unauthorized" in message
+
+
+class ADBClient:
+    """Асинхронный клиент протокола adb-сервера (``adb`` host protocol).
+
+    Говорит с локальным adb-сервером по TCP напрямую вместо запуска
+    процесса ``adb`` на каждую команду: ``host:connect``,
+    ``host:transport:<serial>`` + ``shell,v2,raw:`` и т.д. adb-сервер
+    закрывает сокет после каждой службы, поэтому «пул» здесь — это
+    ограниченное число одновременных сессий на serial. Если сервер не
+    запущен, один раз выполняется ``adb start-server``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5037,
+                 max_sessions_per_serial: int = 4) -> None:
+        self.host = host
+        self.port = port
+        self._max_sessions = max(1, max_sessions_per_serial)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._server_lock = asyncio.Lock()
+        # открытые соединения: gauge уменьшается ровно один раз на каждое
+        self._open_writers: Set[asyncio.StreamWriter] = set()
+
+    def _slot(self, serial: str) -> asyncio.Semaphore:
+        slot = self._slots.get(serial)
+        if slot is None:
+            slot = self._slots[serial] = asyncio.Semaphore(self._max_sessions)
+        return slot
+
+    async def _start_server(self) -> None:
+        async with self._server_lock:
+            logger.info("Starting adb server on port %s", self.port)
+            adb_subprocesses.inc()
+            proc = await asyncio.create_subprocess_exec(
+                "adb", "-P", str(self.port), "start-server",
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            await proc.wait()
+
+    async def _open(self) -> Stream:
+        try:
+            stream = await asyncio.open_connection(self.host, self.port)
+        except ConnectionRefusedError:
+            if self.host not in ("127.0.0.1", "localhost"):
+                raise
+            with contextlib.suppress(FileNotFoundError):
+                await self._start_server()
+            stream = await asyncio.open_connection(self.host, self.port)
+        adb_connections.inc()
+        adb_open.inc()
+        self._open_writers.add(stream[1])
+        return stream
+
+    @staticmethod
+    async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       request: str) -> None:
+        data = request.encode("utf-8")
+        writer.write(b"%04x" % len(data) + data)
+        await writer.drain()
+        status = await reader.readexactly(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise ADBError(await ADBClient._read_prefixed(reader))
+        raise ADBError(f"unexpected adb response: {status!r}")
+
+    @staticmethod
+    async def _read_prefixed(reader: asyncio.StreamReader) -> str:
+        try:
+            length = int(await reader.readexactly(4), 16)
+        except asyncio.IncompleteReadError:
+            return ""
+        return (await reader.readexactly(length)).decode("utf-8", errors="ignore")
+
+    async def _close(self, writer: asyncio.StreamWriter) -> None:
+        # после сброса соединения writer уже «закрывается», но учтён ещё не был
+        if writer in self._open_writers:
+            self._open_writers.discard(writer)
+            adb_open.dec()
+        writer.close()
+        with contextlib.suppress(Exception):
+            await writer.wait_closed()
+
+    async def host_command(self, request: str) -> str:
+        """Выполняет ``host:*`` запрос и возвращает его текстовый ответ"""
+        reader, writer = await self._open()
+        try:
+            await self._request(reader, writer, request)
+            return await self._read_prefixed(reader)
+        finally:
+            await self._close(writer)
+
+    async def version(self) -> int:
+        return int(await self.host_command("host:version"), 16)
+
+    async def connect(self, host: str, port: int = 5555) -> str:
+        message = await self.host_command(f"host:connect:{host}:{port}")
+        if "connected to" not in message:
+            raise ADBError(message or f"failed to connect to {host}:{port}")
+        return message
+
+    async def disconnect(self, serial: str) -> str:
+        return await self.host_command(f"host:disconnect:{serial}")
+
+    @staticmethod
+    def _parse_devices(out: str) -> List[Tuple[str, str]]:
+        result = []
+        for line in out.splitlines():
+            serial, _, state = line.partition("\t")
+            if serial:
+                result.append((serial, state.strip()))
+        return result
+
+    async def devices(self) -> List[Tuple[str, str]]:
+        """Список ``(serial, state)`` подключённых устройств"""
+        return self._parse_devices(await self.host_command("host:devices"))
+
+    async def track_devices(self) -> AsyncIterator[List[Tuple[str, str]]]:
+        """``host:track-devices``: полный список устройств при каждом изменении.
+
+        Первый список приходит сразу после подписки; итерация
+        заканчивается исключением, когда adb-сервер закрывает поток.
+        """
+        reader, writer = await self._open()
+        try:
+            await self._request(reader, writer, "host:track-devices")
+            while True:
+                length = int(await reader.readexactly(4), 16)
+                data = await reader.readexactly(length)
+                yield self._parse_devices(data.decode("utf-8", errors="ignore"))
+        finally:
+            await self._close(writer)
+
+    async def _open_transport(self, serial: str) -> Stream:
+        reader, writer = await self._open()
+        try:
+            await self._request(reader, writer, f"host:transport:{serial}")
+        except BaseException:
+            await self._close(writer)
+            raise
+        return reader, writer
+
+    async def open_service(self, serial: str, service: str) -> Stream:
+        """Открывает службу устройства (например, ``shell,v2,raw:sh``) и отдаёт поток"""
+        reader, writer = await self._open_transport(serial)
+        try:
+            await self._request(reader, writer, service)
+        except BaseException:
+            await self._close(writer)
+            raise
+        return reader, writer
+
+    async def close_stream(self, writer: asyncio.StreamWriter) -> None:
+        await self._close(writer)
+
+    async def _shell_v2(self, serial: str, command: str) -> Tuple[int, str, str]:
+        reader, writer = await self.open_service(serial, f"shell,v2,raw:{command}")
+        try:
+            stdout, stderr, code = bytearray(), bytearray(), 0
+            while True:
+                try:
+                    header = await reader.readexactly(5)
+                except asyncio.IncompleteReadError:
+                    break
+                packet_id, length = struct.unpack("<BI", header)
+                data = await reader.readexactly(length)
+                if packet_id == _SHELL_STDOUT:
+                    stdout += data
+                elif packet_id == _SHELL_STDERR:
+                    stderr += data
+                elif packet_id == _SHELL_EXIT:
+                    code = data[0] if data else 0
+                    break
+            return code, stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
+        finally:
+            await self._close(writer)
+
+    async def _shell_v1(self, serial: str, command: str) -> Tuple[int, str, str]:
+        reader, writer = await self.open_service(serial, f"shell:{command}")
+        try:
+            return 0, (await reader.read()).decode(errors="ignore"), ""
+        finally:
+            await self._close(writer)
+
+    async def shell(self, serial: str, command: str,
+                    timeout: Optional[float] = None) -> Tuple[int, str, str]:
+        """Выполняет команду на устройстве; возвращает ``(code, stdout, stderr)``.
+
+        Устройства без shell v2 обслуживаются через ``shell:`` — у них код
+        возврата всегда 0.
+        """
+        async def run() -> Tuple[int, str, str]:
+            async with self._slot(serial):
+                try:
+                    return await self._shell_v2(serial, command)
+                except ADBError as exc:
+                    if is_device_error(exc):
+                        raise
+                    return await self._shell_v1(serial, command)
+
+        timeout = timeout or settings.adb_command_timeout
+        return await asyncio.wait_for(run(), timeout=timeout)
+
+
+adb_client = ADBClient(
+    host=settings.adb_server_host,
+    port=settings.adb_server_port,
+    max_sessions_per_serial=settings.adb_max_sessions_per_device,
+)
@@ -1,61 +1,229 @@
 import asyncio
 import logging
 import contextlib
-from typing import Optional
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 from models.device import Device
+from services.adb_client import ADBError, adb_client
+from services.adb_tracker import adb_tracker
+from services.kv_store import adb_status
+from services.metrics import metrics
+from settings import settings
 
 logger = logging.getLogger(__name__)
 
+adb_reconnects = metrics.counter(
+    "y2m_adb_reconnects_total", "ADB reconnect attempts by outcome", ("outcome",)
+)
+adb_sweep_duration = metrics.histogram(
+    "y2m_adb_sweep_duration_seconds", "ADB autoconnect sweep time"
+)
 
-async def _run_cmd(cmd: list[str], timeout: float = 15.0) -> tuple[int, str, str]:
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+
+class _DeviceStatus:
+    __slots__ = (
+        "serial", "state", "last_seen", "failures", "next_attempt", "last_error",
     )
-    try:
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-    except asyncio.TimeoutError:
-        proc.kill()
-        return 124, "", "timeout"
-    return proc.returncode, stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
-
-
-async def ensure_connected(host: str, port: int) -> bool:
-    code, out, err = await _run_cmd(["adb", "connect", f"{host}:{port}"])
-    if code == 0:
-        logger.info("ADB connected to %s:%s -> %s", host, port, out.strip())
-        return True
-    logger.warning("ADB connect failed %s:%s -> %s %s", host, port, code, err or out)
-    return False
-
-
-async def background_autoconnect(stop_event: asyncio.Event, interval_sec: int = 60):
-    # periodically (re)connect to all devices with adb_host
-    while not stop_event.is_set():
-        try:
-            devices = await Device.filter(adb_host__not=None)
-            for d in devices:
-                if d.adb_host and d.adb_port:
-                    await ensure_connected(d.adb_host, d.adb_port)
-        except Exception as exc:  # pragma: no cover
-            logger.exception("ADB autoconnect loop error: %s", exc)
-        await asyncio.wait_for(stop_event.wait(), timeout=interval_sec)
+
+    def __init__(self, serial: str) -> None:
+        self.serial = serial
+        self.state = "unknown"
+        self.last_seen: Optional[float] = None  # time.time()
+        self.failures = 0
+        self.next_attempt = 0.0  # loop.time()
+        self.last_error: Optional[str] = None
+
+    def as_dict(self, now: float) -> dict:
+        last_seen = None
+        if self.last_seen is not None:
+            seen = datetime.fromtimestamp(self.last_seen, tz=timezone.utc)
+            last_seen = seen.isoformat()
+        retry_in = 0.0
+        if self.failures:
+            retry_in = round(max(0.0, self.next_attempt - now), 1)
+        return {
+            "serial": self.serial,
+            "state": self.state,
+            "last_seen": last_seen,
+            "failures": self.failures,
+            "retry_in": retry_in,
+            "last_error": self.last_error,
+        }
 
 
 class ADBPool:
+    """Фоновое переподключение ADB-устройств.
+
+    Раз в ``adb_reconnect_interval`` одним ``host:devices`` выясняется,
+    какие serial уже онлайн; переподключаются только отсутствующие —
+    параллельно, не больше ``adb_reconnect_concurrency`` одновременно.
+    Пока работает ``adb_tracker``, список берётся из него, а отвал
+    устройства обрабатывается сразу, не дожидаясь следующего прохода.
+    После каждой неудачи устройство ждёт экспоненциально растущую
+    паузу со случайным разбросом, чтобы не долбить выключенный TV.
+    """
+
     def __init__(self) -> None:
         self._stop_event: Optional[asyncio.Event] = None
         self._task: Optional[asyncio.Task] = None
+        self._status: Dict[str, _DeviceStatus] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._targets: Dict[str, Tuple[str, int]] = {}
+
+    def _entry(self, serial: str) -> _DeviceStatus:
+        entry = self._status.get(serial)
+        if entry is None:
+            entry = self._status[serial] = _DeviceStatus(serial)
+        return entry
+
+    @staticmethod
+    def _backoff(failures: int) -> float:
+        delay = settings.adb_backoff_base * 2 ** (failures - 1)
+        delay = min(settings.adb_backoff_max, delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    def status(self) -> List[dict]:
+        now = asyncio.get_running_loop().time()
+        return [self._status[serial].as_dict(now) for serial in sorted(self._status)]
+
+    async def publish(self) -> None:
+        """Кладёт статус в kv_store: пул работает только у лидера, а
+        ``/api/adb/status`` может прийти в любой воркер"""
+        if self._stop_event is None or self._stop_event.is_set():
+            return
+        try:
+            snapshot = {"devices": self.status(), "updated": time.time()}
+            await adb_status.set("pool", snapshot)
+        except Exception as exc:
+            logger.warning("ADB status publish failed: %s", exc)
+
+    async def connect(self, host: str, port: int) -> bool:
+        """Подключает устройство сейчас же, сбрасывая накопленную паузу"""
+        entry = self._entry(f"{host}:{port}")
+        entry.failures = 0
+        entry.next_attempt = 0.0
+        return await self._reconnect(host, port)
+
+    async def _reconnect(self, host: str, port: int) -> bool:
+        try:
+            return await self._connect(host, port)
+        finally:
+            await self.publish()
+
+    async def _connect(self, host: str, port: int) -> bool:
+        entry = self._entry(f"{host}:{port}")
+        if self._semaphore is None:
+            limit = max(1, settings.adb_reconnect_concurrency)
+            self._semaphore = asyncio.Semaphore(limit)
+        async with self._semaphore:
+            entry.state = "connecting"
+            try:
+                out = await asyncio.wait_for(
+                    adb_client.connect(host, port),
+                    timeout=settings.adb_reconnect_timeout,
+                )
+            except asyncio.TimeoutError:
+                error = "timeout"
+            except (ADBError, OSError) as exc:
+                error = str(exc) or exc.__class__.__name__
+            else:
+                entry.state = "online"
+                entry.last_seen = time.time()
+                entry.failures = 0
+                entry.last_error = None
+                adb_reconnects.labels("ok").inc()
+                logger.info("ADB connected to %s:%s -> %s", host, port, out.strip())
+                return True
+        adb_reconnects.labels("timeout" if error == "timeout" else "failed").inc()
+        entry.state = "offline"
+        entry.failures += 1
+        entry.last_error = error
+        delay = self._backoff(entry.failures)
+        entry.next_attempt = asyncio.get_running_loop().time() + delay
+        logger.warning(
+            "ADB connect failed %s:%s -> %s; next attempt in %.0fs",
+            host, port, error, delay,
+        )
+        return False
+
+    def _reconcile(self, listed: Dict[str, str]) -> None:
+        """Сверяет список adb-сервера с устройствами из БД, запускает переподключения"""
+        now = asyncio.get_running_loop().time()
+        for serial, (host, port) in self._targets.items():
+            entry = self._entry(serial)
+            if listed.get(serial) == "device":
+                entry.state = "online"
+                entry.last_seen = time.time()
+                entry.failures = 0
+                entry.last_error = None
+            elif serial not in self._inflight and entry.next_attempt <= now:
+                task = asyncio.create_task(self._reconnect(host, port))
+                self._inflight[serial] = task
+                task.add_done_callback(lambda _, s=serial: self._inflight.pop(s, None))
+            elif serial not in self._inflight:
+                entry.state = listed.get(serial) or "offline"
+
+    async def sweep(self) -> None:
+        """Один проход: список устройств с adb-сервера и переподключение недостающих"""
+        targets: Dict[str, Tuple[str, int]] = {}
+        rows = await Device.filter(adb_host__isnull=False).values_list(
+            "adb_host", "adb_port"
+        )
+        for host, port in rows:
+            if host:
+                targets[f"{host}:{port or 5555}"] = (host, port or 5555)
+        for serial in list(self._status):
+            if serial not in targets:
+                del self._status[serial]
+        self._targets = targets
+
+        if adb_tracker.live:
+            listed = adb_tracker.snapshot()
+        else:
+            try:
+                devices = await asyncio.wait_for(
+                    adb_client.devices(), timeout=settings.adb_reconnect_timeout
+                )
+                listed = dict(devices)
+            except (asyncio.TimeoutError, ADBError, OSError) as exc:
+                logger.warning("ADB device listing failed: %s", exc)
+                return
+        self._reconcile(listed)
+
+    async def _run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                await self.sweep()
+            except Exception as exc:  # pragma: no cover
+                logger.exception("ADB autoconnect loop error: %s", exc)
+            adb_sweep_duration.observe(time.perf_counter() - started)
+            await self.publish()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    stop_event.wait(), timeout=settings.adb_reconnect_interval
+                )
 
     async def start(self):
         if self._task and not self._task.done():
             return
         self._stop_event = asyncio.Event()
-        self._task = asyncio.create_task(background_autoconnect(self._stop_event))
+        # трекер работает в каждом воркере (ADBAction сразу отвечает
+        # «offline»), а переподключение по его событиям — только у лидера
+        adb_tracker.subscribe(self._reconcile)
+        self._task = asyncio.create_task(self._run(self._stop_event))
 
     async def stop(self):
+        # после снятия лидерства бывший лидер не должен переподключать устройства
+        adb_tracker.unsubscribe(self._reconcile)
         if self._stop_event:
             self._stop_event.set()
+        for task in list(self._inflight.values()):
+            task.cancel()
         if self._task:
             try:
                 await asyncio.wait_for(self._task, timeout=5.0)
@@ -63,8 +231,8 @@ class ADBPool:
                 self._task.cancel()
                 with contextlib.suppress(Exception):
                     await self._task
+        with contextlib.suppress(Exception):
+            await adb_status.delete("pool")
 
 
 adb_pool = ADBPool()
-
-
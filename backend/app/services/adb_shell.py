@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import re
+import struct
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.adb_client import ADBClient, ADBError, adb_client, is_device_error
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# shell v2: [id:1][len:4 LE][data]
+_SHELL_STDIN = 0
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+_SHELL_EXIT = 3
+_SHELL_CLOSE_STDIN = 4
+
+
+class ShellSession:
+    """Долгоживущий ``sh`` на устройстве поверх одного shell v2 потока.
+
+    Каждая команда оборачивается в ``{ <команда>\n}`` — перевод строки
+    закрывает ``#``-комментарий в её конце — и дописывается маркером
+    ``printf '\\n<sentinel> %d\\n' $?``, по которому из общего stdout
+    выделяется её вывод и код возврата; команды можно отправлять, не
+    дожидаясь ответов на предыдущие. В режиме ``batch`` все накопившиеся
+    в очереди команды уходят одной строкой, склеенной через ``;``.
+    """
+
+    def __init__(self, client: ADBClient, serial: str, batch: bool = False) -> None:
+        self.serial = serial
+        self.batch = batch
+        self._client = client
+        self._prefix = f"__Y2M_{uuid.uuid4().hex[:8]}"
+        self._counter = itertools.count(1)
+        prefix = re.escape(self._prefix.encode())
+        self._marker = re.compile(rb"\n(" + prefix + rb"_\d+__) (\d+)\n")
+        self._pending: Dict[bytes, asyncio.Future] = {}
+        self._outbox: List[Tuple[bytes, bytes]] = []  # (sentinel, строка)
+        self._flush_scheduled = False
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def open(self) -> None:
+        reader, writer = await self._client.open_service(self.serial, "shell,v2,raw:sh")
+        self._writer = writer
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        buffer = bytearray()
+        error: Exception = ADBError(f"shell session to {self.serial} closed")
+        try:
+            while True:
+                header = await reader.readexactly(5)
+                packet_id, length = struct.unpack("<BI", header)
+                data = await reader.readexactly(length)
+                if packet_id == _SHELL_EXIT:
+                    break
+                if packet_id not in (_SHELL_STDOUT, _SHELL_STDERR):
+                    continue
+                buffer += data
+                while True:
+                    match = self._marker.search(buffer)
+                    if not match:
+                        break
+                    sentinel, code = match.group(1), int(match.group(2))
+                    output = bytes(buffer[:match.start()])
+                    del buffer[:match.end()]
+                    future = self._pending.pop(sentinel, None)
+                    if future is not None and not future.done():
+                        future.set_result((code, output.decode(errors="ignore"), ""))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as exc:
+            error = ADBError(f"shell session to {self.serial} dropped: {exc}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    def _write(self, line: bytes) -> None:
+        self._writer.write(struct.pack("<BI", _SHELL_STDIN, len(line)) + line)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        queued, self._outbox = self._outbox, []
+        if not queued:
+            return
+        if not self.alive:
+            # поток закрылся, пока команды ждали отправки: ответа не будет
+            error = ADBError(f"shell session to {self.serial} is closed")
+            for sentinel, _ in queued:
+                future = self._pending.pop(sentinel, None)
+                if future is not None and not future.done():
+                    future.set_exception(error)
+            return
+        self._write(b"; ".join(line for _, line in queued) + b"\n")
+
+    async def run(self, command: str) -> Tuple[int, str, str]:
+        if not self.alive:
+            raise ADBError(f"shell session to {self.serial} is closed")
+        sentinel = f"{self._prefix}_{next(self._counter)}__".encode()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[sentinel] = future
+        body = command.encode().strip() or b":"
+        line = b"{ " + body + b"\n} 2>&1; printf '\\n%s %d\\n' " + sentinel + b" $?"
+        if self.batch:
+            # склеиваем всё, что накопится до следующей итерации цикла событий
+            self._outbox.append((sentinel, line))
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                asyncio.get_running_loop().call_soon(self._flush)
+        else:
+            self._write(line + b"\n")
+        try:
+            await self._writer.drain()
+            return await future
+        finally:
+            self._pending.pop(sentinel, None)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            with contextlib.suppress(Exception):
+                self._writer.write(struct.pack("<BI", _SHELL_CLOSE_STDIN, 0))
+            await self._client.close_stream(self._writer)
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._reader_task
+
+
+class ShellSessionManager:
+    """Одна постоянная shell-сессия на устройство.
+
+    Сессия открывается при первой команде и переоткрывается, если поток
+    оборвался. После таймаута команды сессия закрывается: зависшая
+    команда блокировала бы все следующие.
+    """
+
+    def __init__(self, client: ADBClient, batch: bool = False) -> None:
+        self._client = client
+        self._batch = batch
+        self._sessions: Dict[str, ShellSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._unsupported: Set[str] = set()
+
+    async def _session(self, serial: str) -> ShellSession:
+        session = self._sessions.get(serial)
+        if session is not None and session.alive:
+            return session
+        lock = self._locks.setdefault(serial, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(serial)
+            if session is None or not session.alive:
+                if session is not None:
+                    await session.close()
+                session = ShellSession(self._client, serial, batch=self._batch)
+                await session.open()
+                self._sessions[serial] = session
+                logger.info("Opened persistent adb shell to %s", serial)
+            return session
+
+    async def run(self, serial: str, command: str,
+                  timeout: Optional[float] = None) -> Tuple[int, str, str]:
+        timeout = timeout or settings.adb_command_timeout
+        if serial in self._unsupported:
+            return await self._client.shell(serial, command, timeout=timeout)
+        try:
+            session = await asyncio.wait_for(self._session(serial), timeout=timeout)
+        except ADBError as exc:
+            if is_device_error(exc):
+                raise
+            # нет shell v2 — дальше работаем одиночными командами
+            logger.info(
+                "Persistent shell unavailable for %s (%s), using one-shot commands",
+                serial, exc,
+            )
+            self._unsupported.add(serial)
+            return await self._client.shell(serial, command, timeout=timeout)
+        try:
+            return await asyncio.wait_for(session.run(command), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self.close(serial)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "sessions": sum(1 for session in self._sessions.values() if session.alive),
+            "one_shot": len(self._unsupported),
+        }
+
+    async def close(self, serial: str) -> None:
+        session = self._sessions.pop(serial, None)
+        if session is not None:
+            await session.close()
+
+    async def stop(self) -> None:
+        for serial in list(self._sessions):
+            await self.close(serial)
+
+
+shell_sessions = ShellSessionManager(adb_client, batch=settings.adb_shell_batch)
@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import logging
+from typing import Callable, Dict, List, Optional
+
+from services.adb_client import ADBClient, ADBError, adb_client
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[Dict[str, str]], None]
+
+
+class ADBTracker:
+    """Живая карта ``serial -> state`` по подписке ``host:track-devices``.
+
+    adb-сервер сам присылает новый список при каждом подключении или
+    отвале устройства, так что об отвале известно сразу, без опроса.
+    Пока подписки нет (сервер недоступен), карта считается неизвестной
+    и ``is_offline`` ничего не блокирует.
+    """
+
+    def __init__(self, client: ADBClient) -> None:
+        self._client = client
+        self._states: Dict[str, str] = {}
+        self._live = False
+        self._listeners: List[Listener] = []
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def live(self) -> bool:
+        return self._live
+
+    def snapshot(self) -> Dict[str, str]:
+        return dict(self._states)
+
+    def is_offline(self, serial: str) -> bool:
+        """True, если подписка активна и устройства нет в состоянии ``device``"""
+        return self._live and self._states.get(serial) != "device"
+
+    def subscribe(self, listener: Listener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _update(self, devices: Dict[str, str]) -> None:
+        previous, self._states = self._states, devices
+        for serial in previous.keys() - devices.keys():
+            logger.info("ADB device %s disappeared", serial)
+        for serial, state in devices.items():
+            if previous.get(serial) != state:
+                logger.info("ADB device %s is %s", serial, state)
+        for listener in self._listeners:
+            try:
+                listener(self.snapshot())
+            except Exception as exc:
+                logger.exception("ADB tracker listener failed: %s", exc)
+
+    async def _run(self, stop_event: asyncio.Event) -> None:
+        delay = 1.0
+        while not stop_event.is_set():
+            try:
+                async for devices in self._client.track_devices():
+                    self._live = True
+                    delay = 1.0
+                    self._update(dict(devices))
+            except (ADBError, OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                logger.warning(
+                    "ADB track-devices stream lost: %s; retrying in %.1fs", exc, delay
+                )
+            self._live = False
+            self._states = {}
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            delay = min(delay * 2, 30.0)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self._stop_event))
+
+    async def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+        self._live = False
+        self._states = {}
+
+
+adb_tracker = ADBTracker(adb_client)
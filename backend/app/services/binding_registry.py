@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from models.binding import Binding
+from modules.actions.adb import ADBAction
+from modules.actions.base import ActionResult
+from modules.actions.station import StationAction
+from services.cache_sync import cache_sync
+from services.metrics import metrics
+from services.mqtt_publisher import mqtt_publisher
+from services.oauth_yandex import get_provider_token
+from services.payload_template import MQTTMessageTemplate, TemplateError
+from services.state_store import DEFAULT_INSTANCES
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+Executor = Callable[["BindingEntry", Dict[str, Any]], Awaitable[ActionResult]]
+DispatchKey = Tuple[int, str, Optional[str]]  # (device_id, capability type, instance)
+
+
+action_duration = metrics.histogram(
+    "y2m_action_duration_seconds", "Binding action execution time by type and outcome",
+    ("action_type", "outcome"),
+)
+
+
+def parse_capability(capability: str) -> Tuple[str, Optional[str]]:
+    """Разбирает ``Binding.capability`` вида ``type`` или ``type:instance``"""
+    cap_type, _, instance = (capability or "").partition(":")
+    return cap_type, instance or DEFAULT_INSTANCES.get(cap_type)
+
+
+async def _execute_adb(entry: "BindingEntry", data: Dict[str, Any]) -> ActionResult:
+    return await ADBAction().execute({**entry.action_config, **data})
+
+
+async def _execute_station(entry: "BindingEntry", data: Dict[str, Any]) -> ActionResult:
+    payload = {**entry.action_config, **data}
+    if not payload.get("oauthToken"):
+        payload["oauthToken"] = await get_provider_token()
+    return await StationAction().execute(payload)
+
+
+async def _execute_mqtt(entry: "BindingEntry", data: Dict[str, Any]) -> ActionResult:
+    template = entry.template
+    if template is None:
+        return {"ok": False, "error": entry.template_error}
+    # переменные шаблона: поля invoke и значения по умолчанию из привязки
+    context = {
+        "capability": entry.capability,
+        "instance": entry.instance,
+        "device_id": entry.device_id,
+        **data,
+    }
+    try:
+        messages = template.render(context)
+    except TemplateError as exc:
+        return {"ok": False, "error": str(exc)}
+    for topic, message in messages:
+        await mqtt_publisher.publish(topic, message, qos=0, retain=False)
+    return {"ok": True}
+
+
+async def _execute_unknown(entry: "BindingEntry", data: Dict[str, Any]) -> ActionResult:
+    return {"ok": False, "error": f"Unknown action type: {entry.action_type}"}
+
+
+EXECUTORS: Dict[str, Executor] = {
+    "adb": _execute_adb,
+    "station": _execute_station,
+    "mqtt": _execute_mqtt,
+}
+
+
+def _merge_config(binding: Binding) -> Dict[str, Any]:
+    """Дополняет action_config значениями по умолчанию из устройства.
+
+    UI сохраняет ADB-команду в ``cmd`` и необязательные host/port, а
+    голосовую команду станции — в ``phrase``; здесь они приводятся к
+    полям, которые ожидают ADBAction и StationAction.
+    """
+    raw = binding.action_config or {}
+    config = {k: v for k, v in raw.items() if v not in (None, "")}
+    if binding.action_type == "adb":
+        device = binding.device
+        config.setdefault("host", device.adb_host)
+        config.setdefault("port", device.adb_port or 5555)
+        if "command" not in config and "cmd" in config:
+            config["command"] = config["cmd"]
+    elif binding.action_type == "station":
+        if "command" not in config and "phrase" in config:
+            config["command"] = "sendText"
+            config.setdefault("text", config["phrase"])
+    return config
+
+
+class BindingEntry:
+    __slots__ = (
+        "id", "device_id", "capability", "type", "instance", "action_type",
+        "action_config", "executor", "template", "template_error",
+    )
+
+    def __init__(self, binding: Binding) -> None:
+        self.id = binding.id
+        self.device_id = binding.device_id
+        self.capability = binding.capability
+        self.type, self.instance = parse_capability(binding.capability)
+        self.action_type = binding.action_type
+        self.action_config = _merge_config(binding)
+        self.executor = EXECUTORS.get(binding.action_type, _execute_unknown)
+        # шаблоны MQTT разбираются один раз, при загрузке привязки
+        self.template: Optional[MQTTMessageTemplate] = None
+        self.template_error: Optional[str] = None
+        if binding.action_type == "mqtt":
+            try:
+                self.template = MQTTMessageTemplate(self.action_config)
+            except TemplateError as exc:
+                self.template_error = str(exc)
+
+    async def execute(self, data: Dict[str, Any]) -> ActionResult:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracer.span(f"action.{self.action_type}", binding_id=self.id):
+                result = await self.executor(self, data)
+            outcome = "ok" if result.get("ok") else "failed"
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            action_duration.labels(self.action_type, outcome).observe(elapsed)
+
+
+class BindingRegistry:
+    """Индекс привязок в памяти: по id и по (device_id, type, instance).
+
+    Загружается одним запросом при первом обращении. CRUD-маршруты
+    вызывают ``invalidate()``, и следующий поиск перечитывает таблицу;
+    другие воркеры узнают об этом через ``cache_sync`` (``bindings``).
+    """
+
+    def __init__(self) -> None:
+        self._by_id: Dict[int, BindingEntry] = {}
+        self._by_key: Dict[DispatchKey, BindingEntry] = {}
+        self._generation = 0
+        self._loaded_generation = -1
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded_generation == self._generation:
+            return
+        async with self._lock:
+            generation = self._generation
+            if self._loaded_generation == generation:
+                return
+            by_id: Dict[int, BindingEntry] = {}
+            by_key: Dict[DispatchKey, BindingEntry] = {}
+            bindings = await Binding.all().order_by("id").prefetch_related("device")
+            for binding in bindings:
+                entry = BindingEntry(binding)
+                by_id[entry.id] = entry
+                by_key[(entry.device_id, entry.type, entry.instance)] = entry
+            self._by_id, self._by_key = by_id, by_key
+            self._loaded_generation = generation
+            logger.info("Loaded %d bindings into registry", len(by_id))
+
+    async def get(self, binding_id: int) -> Optional[BindingEntry]:
+        await self._ensure_loaded()
+        return self._by_id.get(binding_id)
+
+    async def resolve(self, device_id: int, cap_type: str,
+                      instance: Optional[str]) -> Optional[BindingEntry]:
+        """Привязка для capability устройства; без instance — как запасной вариант"""
+        await self._ensure_loaded()
+        entry = self._by_key.get((device_id, cap_type, instance))
+        if entry is None and instance is not None:
+            entry = self._by_key.get((device_id, cap_type, None))
+        return entry
+
+
+binding_registry = BindingRegistry()
+cache_sync.on_change("bindings", binding_registry.invalidate)
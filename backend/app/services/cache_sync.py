@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+import inspect
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from tortoise.exceptions import IntegrityError
+
+from models.cache_generation import CacheGeneration
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[], Union[None, Awaitable[None]]]
+
+
+class CacheSync:
+    """Инвалидация кэшей процесса во всех воркерах.
+
+    У каждой группы кэшей (``discovery``, ``bindings``, ``tokens``...)
+    есть строка в ``cache_generations`` со случайной меткой. Воркер,
+    изменивший данные, сбрасывает свои кэши сам и вызывает ``bump()``,
+    который пишет новую метку. Остальные раз в ``cache_sync_interval``
+    читают таблицу одним запросом и для каждой сменившейся метки
+    вызывают обработчики из ``on_change()``.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._seen: Dict[str, str] = {}
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.remote_changes = 0
+
+    def on_change(self, name: str, handler: Handler) -> None:
+        """``handler()`` — сбросить локальный кэш после изменения в другом воркере"""
+        self._handlers.setdefault(name, []).append(handler)
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "interval": settings.cache_sync_interval,
+            "generations": dict(self._seen),
+            "polls": self.polls,
+            "remote_changes": self.remote_changes,
+        }
+
+    async def bump(self, *names: str) -> None:
+        """Сообщает другим воркерам, что кэши ``names`` устарели"""
+        for name in names:
+            value = uuid.uuid4().hex
+            # своя метка: опрос не должен сбрасывать кэш этого воркера ещё раз
+            self._seen[name] = value
+            try:
+                if not await CacheGeneration.filter(name=name).update(value=value):
+                    try:
+                        await CacheGeneration.create(name=name, value=value)
+                    except IntegrityError:
+                        await CacheGeneration.filter(name=name).update(value=value)
+            except Exception as exc:
+                logger.error("Failed to bump cache generation %s: %s", name, exc)
+
+    async def _call(self, name: str) -> None:
+        for handler in self._handlers.get(name, ()):
+            try:
+                result: Any = handler()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as exc:
+                logger.exception("Cache %s invalidation handler failed: %s", name, exc)
+
+    async def poll(self) -> None:
+        """Сверяет метки с таблицей и сбрасывает кэши, изменённые другими"""
+        rows = await CacheGeneration.all().values_list("name", "value")
+        self.polls += 1
+        for name, value in rows:
+            if self._seen.get(name) == value:
+                continue
+            self._seen[name] = value
+            self.remote_changes += 1
+            await self._call(name)
+
+    async def _run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    stop_event.wait(), timeout=settings.cache_sync_interval
+                )
+            try:
+                await self.poll()
+            except Exception as exc:
+                logger.warning("Cache generation poll failed: %s", exc)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        # кэши ещё пусты: текущие метки просто запоминаются
+        try:
+            self._seen = dict(await CacheGeneration.all().values_list("name", "value"))
+        except Exception as exc:
+            logger.error("Failed to load cache generations: %s", exc)
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self._stop_event))
+
+    async def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+
+
+cache_sync = CacheSync()
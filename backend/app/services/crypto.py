@@ -1,12 +1,26 @@
-from cryptography.fernet import Fernet, InvalidToken
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from settings import settings
 
 
-def _get_fernet() -> Fernet | None:
-    if not settings.y2m_enc_key:
+def _keys(value: str | None) -> tuple:
+    """Ключи из Y2M_ENC_KEY: основной первым, затем старые через запятую"""
+    return tuple(k.strip() for k in (value or "").split(",") if k.strip())
+
+
+@lru_cache(maxsize=4)
+def _ciphers(keys: tuple) -> tuple[Fernet, MultiFernet]:
+    fernets = [Fernet(k.encode()) for k in keys]
+    return fernets[0], MultiFernet(fernets)
+
+
+def _get_fernet() -> MultiFernet | None:
+    """Шифр по текущим ключам; собирается один раз на набор ключей"""
+    keys = _keys(settings.y2m_enc_key)
+    if not keys:
         return None
-    key = settings.y2m_enc_key.encode()
-    return Fernet(key)
+    return _ciphers(keys)[1]
 
 
 def encrypt(text: str) -> str:
@@ -26,3 +40,24 @@ def decrypt(token: str) -> str:
         return token
 
 
+def rotate(token: str) -> str | None:
+    """Перешифровывает основным ключом значение, зашифрованное старым.
+
+    ``None`` — менять нечего: значение уже под основным ключом, ключей
+    нет или его не расшифровать ни одним ключом (например, открытый
+    текст из времени до включения шифрования).
+    """
+    keys = _keys(settings.y2m_enc_key)
+    if len(keys) < 2:
+        return None
+    primary, multi = _ciphers(keys)
+    data = token.encode()
+    try:
+        primary.decrypt(data)
+        return None
+    except InvalidToken:
+        pass
+    try:
+        return multi.rotate(data).decode()
+    except InvalidToken:
+        return None
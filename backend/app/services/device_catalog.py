@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "yandex_device_types.json"
+
+
+class DeviceCapability(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    type: str
+    retrievable: bool = True
+    reportable: bool = True
+    parameters: Optional[Dict[str, Any]] = None
+    description: Optional[str] = None
+
+
+# Описания capability на русском языке
+CAPABILITY_DESCRIPTIONS: Mapping[str, Any] = MappingProxyType({
+    "devices.capabilities.on_off": "Включение/выключение",
+    "devices.capabilities.range": MappingProxyType({
+        "brightness": "Яркость",
+        "volume": "Громкость",
+        "temperature": "Температура",
+        "channel": "Канал",
+        "humidity": "Влажность",
+        "pressure": "Давление",
+        "co2_level": "Уровень CO2",
+        "pm1_density": "Плотность PM1",
+        "pm2.5_density": "Плотность PM2.5",
+        "pm10_density": "Плотность PM10",
+        "tvoc": "Летучие органические соединения",
+        "water_level": "Уровень воды",
+        "open": "Открытие",
+        "battery_level": "Уровень заряда",
+        "co_level": "Уровень CO",
+        "smoke_level": "Уровень дыма",
+        "ammonia": "Аммиак",
+        "butane": "Бутан",
+        "propane": "Пропан",
+        "methane": "Метан",
+        "hydrogen": "Водород",
+        "oxygen": "Кислород",
+        "ozone": "Озон",
+        "formaldehyde": "Формальдегид",
+        "heater": "Нагрев",
+        "current": "Ток",
+        "voltage": "Напряжение",
+        "power": "Мощность",
+        "electricity_meter": "Счетчик электроэнергии",
+        "gas_meter": "Счетчик газа",
+        "water_meter": "Счетчик воды",
+        "heat_meter": "Счетчик тепла",
+    }),
+    "devices.capabilities.mode": MappingProxyType({
+        "work_mode": "Режим работы",
+        "thermostat": "Термостат",
+        "fan_speed": "Скорость вентилятора",
+        "heat": "Нагрев",
+        "swing": "Качание",
+        "input_source": "Источник сигнала",
+        "tea_mode": "Режим заваривания чая",
+        "program": "Программа",
+        "tank_filled": "Заполнение бака",
+        "pause": "Пауза",
+        "fan_mode": "Режим вентилятора",
+        "ionization": "Ионизация",
+        "backlight": "Подсветка",
+        "child_lock": "Блокировка от детей",
+        "sound": "Звук",
+        "oscillation": "Колебание",
+        "humidity": "Влажность",
+        "buzzer": "Зуммер",
+        "led": "Светодиод",
+        "keep_warm": "Подогрев",
+        "boil": "Кипячение",
+        "controls_locked": "Блокировка управления",
+        "mute": "Отключение звука",
+    }),
+    "devices.capabilities.toggle": MappingProxyType({
+        "backlight": "Подсветка",
+        "controls_locked": "Блокировка управления",
+        "mute": "Отключение звука",
+        "pause": "Пауза",
+        "keep_warm": "Подогрев",
+        "sound": "Звук",
+        "boil": "Кипячение",
+        "ionization": "Ионизация",
+        "oscillation": "Колебание",
+        "buzzer": "Зуммер",
+        "led": "Светодиод",
+        "child_lock": "Блокировка от детей",
+        "night_light": "Ночной режим",
+        "swing": "Качание",
+        "tank_filled": "Заполнение бака",
+    }),
+    "devices.capabilities.color_setting": "Настройка цвета",
+    "devices.capabilities.video_stream": "Видеопоток",
+})
+
+DEFAULT_CAPABILITIES: Tuple[DeviceCapability, ...] = (
+    DeviceCapability(
+        type="devices.capabilities.on_off", retrievable=True, reportable=True
+    ),
+)
+
+
+def get_capability_description(capability_type: str,
+                               instance: Optional[str] = None) -> str:
+    """Возвращает описание capability на русском языке"""
+    description = CAPABILITY_DESCRIPTIONS.get(capability_type)
+    if isinstance(description, str):
+        return description
+    if description is not None and instance:
+        return description.get(instance, instance)
+    return capability_type.split('.')[-1].replace('_', ' ').title()
+
+
+def _build_parameters(cap_type: str, instance: dict) -> Optional[Dict[str, Any]]:
+    function = instance["function"]
+    if cap_type == "devices.capabilities.range":
+        if function == "brightness":
+            return {
+                "instance": "brightness",
+                "range": {"min": 0, "max": 100, "precision": 1},
+                "unit": "unit.percent"
+            }
+        if function == "volume":
+            return {
+                "instance": "volume",
+                "range": {"min": 0, "max": 100, "precision": 1},
+                "unit": "unit.percent"
+            }
+        if function == "temperature":
+            return {
+                "instance": "temperature",
+                "range": {"min": 0, "max": 100, "precision": 1},
+                "unit": "unit.temperature.celsius"
+            }
+        if function == "channel":
+            return {
+                "instance": "channel",
+                "range": {"min": 1, "max": 999, "precision": 1}
+            }
+        return {"instance": function}
+    if cap_type == "devices.capabilities.mode":
+        if instance.get("values"):
+            return {
+                "instance": function,
+                "modes": [{"value": v} for v in instance["values"]]
+            }
+        return {"instance": function}
+    if cap_type == "devices.capabilities.toggle":
+        return {"instance": function}
+    if cap_type == "devices.capabilities.color_setting":
+        return {
+            "color_model": "rgb",
+            "temperature_k": {"min": 2000, "max": 9000}
+        }
+    return None
+
+
+def _build_capabilities(type_info: dict) -> Tuple[DeviceCapability, ...]:
+    capabilities = []
+    for cap in type_info.get("capabilities", []):
+        if not isinstance(cap, dict) or "type" not in cap:
+            continue
+        cap_type = cap["type"]
+        parameters = None
+        # Берем первый instance с function
+        for instance in cap.get("instances") or []:
+            if isinstance(instance, dict) and "function" in instance:
+                parameters = _build_parameters(cap_type, instance)
+                break
+        instance_name = parameters.get("instance") if parameters else None
+        description = get_capability_description(cap_type, instance_name)
+        capabilities.append(DeviceCapability(
+            type=cap_type,
+            retrievable=True,
+            reportable=True,
+            parameters=parameters,
+            description=description
+        ))
+    return tuple(capabilities)
+
+
+class _Snapshot:
+    __slots__ = ("mtime", "raw", "capabilities")
+
+    def __init__(self, mtime: float, raw: dict,
+                 capabilities: Mapping[str, Tuple[DeviceCapability, ...]]):
+        self.mtime = mtime
+        self.raw = raw
+        self.capabilities = capabilities
+
+
+class DeviceCatalog:
+    """Индекс типов устройств Яндекса, загружаемый из JSON один раз.
+
+    Файл перечитывается только при изменении mtime (проверка не чаще
+    ``check_interval`` секунд); новый индекс строится целиком и
+    подменяется одной ссылкой, поэтому читатели никогда не видят
+    частично загруженное состояние.
+    """
+
+    def __init__(self, path: Path = DATA_PATH, check_interval: float = 1.0) -> None:
+        self._path = path
+        self._check_interval = check_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, mtime: float) -> _Snapshot:
+        with self._path.open("r", encoding="utf-8") as f:
+            raw = json.load(f)
+        index = {}
+        for type_info in raw.get("types", []):
+            index[type_info["type"]] = _build_capabilities(type_info)
+        logger.info("Loaded %d device types from %s", len(index), self._path.name)
+        return _Snapshot(mtime, raw, MappingProxyType(index))
+
+    def _current(self) -> Optional[_Snapshot]:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self._check_interval:
+            return snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self._path).st_mtime
+                if self._snapshot is None or self._snapshot.mtime != mtime:
+                    self._snapshot = self._load(mtime)
+            except Exception as exc:
+                # оставляем последний успешно загруженный индекс
+                logger.error("Error loading device types from %s: %s", self._path, exc)
+            return self._snapshot
+
+    def capabilities(self, device_type: str) -> Tuple[DeviceCapability, ...]:
+        """Возвращает неизменяемый список возможностей для типа устройства"""
+        snapshot = self._current()
+        if snapshot is None:
+            return DEFAULT_CAPABILITIES
+        return snapshot.capabilities.get(device_type, DEFAULT_CAPABILITIES)
+
+    @property
+    def version(self) -> float:
+        """mtime загруженного файла; меняется при каждой перезагрузке"""
+        snapshot = self._current()
+        return snapshot.mtime if snapshot is not None else 0.0
+
+    def raw(self) -> dict:
+        """Исходное содержимое yandex_device_types.json"""
+        snapshot = self._current()
+        return snapshot.raw if snapshot is not None else {"types": []}
+
+
+device_catalog = DeviceCatalog()
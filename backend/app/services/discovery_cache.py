@@ -0,0 +1,57 @@
+import itertools
+import threading
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+from services.cache_sync import cache_sync
+
+
+class DiscoveryCache:
+    """Кэш сериализованного ответа /v1.0/user/devices.
+
+    Запись привязана к пользователю и номеру поколения конфигурации.
+    Любое изменение списка устройств вызывает ``bump()``, после чего все
+    ранее сохранённые ответы считаются устаревшими. Хранится только
+    ``payload``; ``request_id`` подставляется в готовые байты при отдаче.
+    """
+
+    def __init__(self) -> None:
+        self._counter = itertools.count(1)
+        self._generation = next(self._counter)
+        self._entries: Dict[str, Tuple[Tuple[int, float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def bump(self) -> int:
+        """Инвалидирует все закэшированные ответы"""
+        with self._lock:
+            self._generation = next(self._counter)
+            self._entries.clear()
+            return self._generation
+
+    def get(self, user_id: str, key: Tuple[int, float]) -> Optional[bytes]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1]
+
+    def put(self, user_id: str, key: Tuple[int, float], payload: dict) -> bytes:
+        body = orjson.dumps(payload)
+        with self._lock:
+            # не сохраняем ответ, собранный до очередного bump()
+            if key[0] == self._generation:
+                self._entries[user_id] = (key, body)
+        return body
+
+    @staticmethod
+    def render(request_id: str, body: bytes) -> bytes:
+        head = b'{"request_id":' + orjson.dumps(request_id)
+        return head + b',"payload":' + body + b"}"
+
+
+discovery_cache = DiscoveryCache()
+cache_sync.on_change("discovery", discovery_cache.bump)
@@ -0,0 +1,100 @@
+from typing import Any, Dict, Optional
+
+import httpx
+
+from settings import settings
+
+
+class _UpstreamStats:
+    __slots__ = ("requests", "connections")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0  # новые TCP-соединения
+
+    def as_dict(self) -> dict:
+        reused = max(0, self.requests - self.connections)
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reused": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+def _upstreams() -> Dict[str, Dict[str, Any]]:
+    timeout = settings.http_timeout
+    return {
+        "yapi": {"base_url": settings.yapi_url, "timeout": settings.yapi_timeout},
+        "yandex_oauth": {"base_url": settings.yandex_oauth_url, "timeout": timeout},
+        "yandex_login": {"base_url": settings.yandex_login_url, "timeout": timeout},
+        "quasar": {"base_url": settings.quasar_url, "timeout": timeout},
+        "yandex_dialogs": {"base_url": settings.yandex_dialogs_url, "timeout": timeout},
+    }
+
+
+class HTTPClients:
+    """Общие ``httpx.AsyncClient`` с keep-alive пулом на каждый апстрим.
+
+    Клиенты создаются в ``start()`` (или при первом обращении) и
+    закрываются в ``stop()``. Для тестов ``start(transport=...)``
+    подставляет транспорт, например ``httpx.MockTransport``.
+    """
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, _UpstreamStats] = {}
+        self._transport: Optional[httpx.AsyncBaseTransport] = None
+
+    def _tracer(self, stats: _UpstreamStats):
+        async def trace(event: str, info: dict) -> None:
+            if event == "connection.connect_tcp.complete":
+                stats.connections += 1
+        return trace
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        config = _upstreams()[name]
+        stats = self._stats.setdefault(name, _UpstreamStats())
+        trace = self._tracer(stats)
+
+        async def on_request(request: httpx.Request) -> None:
+            stats.requests += 1
+            request.extensions["trace"] = trace
+
+        client = httpx.AsyncClient(
+            base_url=config["base_url"],
+            timeout=config["timeout"],
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            transport=self._transport,
+            event_hooks={"request": [on_request]},
+        )
+        self._clients[name] = client
+        return client
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+        return client
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    async def start(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        if transport is not None or self._transport is not None:
+            await self.stop()
+            self._transport = transport
+        for name in _upstreams():
+            self.get(name)
+
+    async def stop(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HTTPClients()
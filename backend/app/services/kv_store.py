@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.kv_entry import KVEntry
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class KVStore(ABC):
+    """Короткоживущее хранилище ключ-значение с истечением по TTL.
+
+    ``pop`` атомарно забирает значение: одноразовый ключ (например,
+    OAuth-код) получит только один из конкурирующих запросов.
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def pop(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def items(self) -> Dict[str, Any]:
+        """Все живые ключи пространства имён"""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryKVStore(KVStore):
+    """Хранилище в памяти процесса.
+
+    Сроки истечения лежат в куче: просроченные ключи снимаются с её
+    вершины при каждой записи, а при переполнении вытесняются ключи,
+    которые истекут раньше всех.
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int) -> None:
+        super().__init__(namespace, ttl, maxsize)
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evict(self, now: float) -> None:
+        heap = self._heap
+        while heap and (heap[0][0] <= now or len(self._data) >= self.maxsize):
+            expires_at, _, key = heapq.heappop(heap)
+            current = self._data.get(key)
+            # в куче могут остаться устаревшие записи перезаписанных ключей
+            if current is not None and current[0] == expires_at:
+                del self._data[key]
+
+    def _compact(self) -> None:
+        """Перестраивает кучу по актуальным ключам, без сроков перезаписанных"""
+        self._heap = [
+            (expires_at, next(self._seq), key)
+            for key, (expires_at, _) in self._data.items()
+        ]
+        heapq.heapify(self._heap)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        self._data.pop(key, None)
+        self._evict(now)
+        expires_at = now + (ttl or self.ttl)
+        self._data[key] = (expires_at, value)
+        heapq.heappush(self._heap, (expires_at, next(self._seq), key))
+        # частые перезаписи одного ключа копят в куче старые сроки
+        if len(self._heap) > 2 * len(self._data) + 16:
+            self._compact()
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.time():
+            del self._data[key]
+            return None
+        return item[1]
+
+    async def pop(self, key: str) -> Optional[Any]:
+        item = self._data.pop(key, None)
+        if item is None or item[0] <= time.time():
+            return None
+        return item[1]
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def items(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            key: value
+            for key, (expires_at, value) in self._data.items()
+            if expires_at > now
+        }
+
+
+class DBKVStore(KVStore):
+    """Хранилище в таблице ``kv_entries``, общее для всех воркеров.
+
+    Просроченные строки не возвращаются и периодически удаляются
+    фоновой задачей; она же срезает самые старые записи сверх
+    ``maxsize``.
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int,
+                 sweep_interval: float = 60.0) -> None:
+        super().__init__(namespace, ttl, maxsize)
+        self.sweep_interval = sweep_interval
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await KVEntry.update_or_create(
+            namespace=self.namespace, key=key,
+            defaults={"value": value, "expires_at": time.time() + (ttl or self.ttl)},
+        )
+
+    async def get(self, key: str) -> Optional[Any]:
+        row = await KVEntry.get_or_none(
+            namespace=self.namespace, key=key, expires_at__gt=time.time()
+        )
+        return row.value if row is not None else None
+
+    async def pop(self, key: str) -> Optional[Any]:
+        row = await KVEntry.get_or_none(
+            namespace=self.namespace, key=key, expires_at__gt=time.time()
+        )
+        if row is None:
+            return None
+        # значение достаётся тому, чей DELETE действительно удалил строку
+        deleted = await KVEntry.filter(id=row.id).delete()
+        return row.value if deleted else None
+
+    async def delete(self, key: str) -> None:
+        await KVEntry.filter(namespace=self.namespace, key=key).delete()
+
+    async def items(self) -> Dict[str, Any]:
+        rows = await KVEntry.filter(
+            namespace=self.namespace, expires_at__gt=time.time()
+        ).values_list("key", "value")
+        return dict(rows)
+
+    async def sweep(self) -> int:
+        removed = await KVEntry.filter(
+            namespace=self.namespace, expires_at__lte=time.time()
+        ).delete()
+        count = await KVEntry.filter(namespace=self.namespace).count()
+        if count > self.maxsize:
+            ids = await (
+                KVEntry.filter(namespace=self.namespace)
+                .order_by("expires_at")
+                .limit(count - self.maxsize)
+                .values_list("id", flat=True)
+            )
+            removed += await KVEntry.filter(id__in=list(ids)).delete()
+        return removed
+
+    async def _run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.debug("Swept %d expired %s entries", removed, self.namespace)
+            except Exception as exc:
+                logger.error("Failed to sweep %s entries: %s", self.namespace, exc)
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=self.sweep_interval)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self._stop_event))
+
+    async def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+
+
+def create_kv_store(namespace: str, ttl: float, maxsize: int) -> KVStore:
+    """Хранилище по ``Settings.kv_backend``: ``memory`` или ``db``"""
+    if settings.kv_backend == "memory":
+        return MemoryKVStore(namespace, ttl, maxsize)
+    return DBKVStore(namespace, ttl, maxsize, sweep_interval=settings.kv_sweep_interval)
+
+
+# Одноразовые коды авторизации навыка (/dialog/authorize -> /token)
+oauth_codes = create_kv_store(
+    "oauth_codes", ttl=settings.oauth_code_ttl, maxsize=settings.oauth_code_maxsize
+)
+# Последние счётчики каждой реплики потребителя MQTT (/api/mqtt/replicas)
+replica_stats = create_kv_store(
+    "mqtt_replicas", ttl=max(settings.mqtt_stats_interval, 1.0) * 3, maxsize=1000
+)
+# Состояние переподключений ADB, которое публикует лидер (/api/adb/status)
+adb_status = create_kv_store(
+    "adb_status", ttl=max(settings.adb_reconnect_interval, 1.0) * 3, maxsize=1
+)
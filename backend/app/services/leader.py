@@ -0,0 +1,145 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    """Выбор одного воркера для фоновых служб-одиночек.
+
+    На Postgres лидер держит session-level advisory lock на отдельном
+    соединении и раз в ``leader_heartbeat_interval`` проверяет его
+    запросом. Если соединение пропало или не ответило вовремя, воркер
+    сам снимает с себя роль; остальные пытаются взять блокировку с тем
+    же интервалом, так что при падении лидера его место занимают
+    примерно через один интервал. На других БД (SQLite в разработке)
+    процесс считается единственным и сразу становится лидером.
+
+    С несколькими ключами это аренда слотов: воркер держит первый
+    свободный ключ, ``slot`` — его номер. Так N воркеров делят N слотов,
+    а лишние ждут в резерве, пока какой-нибудь слот не освободится.
+    """
+
+    def __init__(self, lock_keys: Sequence[int], name: str = "leader") -> None:
+        self.lock_keys = list(lock_keys)
+        self.name = name
+        self.role = "follower"
+        self.slot: Optional[int] = None
+        self.since = time.time()
+        self._elected: List[Callback] = []
+        self._demoted: List[Callback] = []
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def backend(self) -> str:
+        postgres = settings.database_url.startswith(("postgres://", "postgresql://"))
+        return "postgres" if postgres else "local"
+
+    @property
+    def is_leader(self) -> bool:
+        return self.role == "leader"
+
+    def on_elected(self, callback: Callback) -> None:
+        self._elected.append(callback)
+
+    def on_demoted(self, callback: Callback) -> None:
+        self._demoted.append(callback)
+
+    def status(self) -> dict:
+        status = {
+            "pid": os.getpid(),
+            "role": self.role,
+            "backend": self.backend,
+            "since": datetime.fromtimestamp(self.since, tz=timezone.utc).isoformat(),
+        }
+        if len(self.lock_keys) > 1:
+            status["slot"] = self.slot
+        return status
+
+    async def _become(self, role: str, slot: Optional[int] = None) -> None:
+        if role == self.role:
+            return
+        self.role = role
+        self.slot = slot
+        self.since = time.time()
+        logger.info(
+            "Worker %s is now %s %s (slot %s)", os.getpid(), self.name, role, slot
+        )
+        for callback in self._elected if role == "leader" else self._demoted:
+            try:
+                await callback()
+            except Exception as exc:
+                logger.exception("Leader %s callback failed: %s", role, exc)
+
+    async def _wait(self, stop_event: asyncio.Event, timeout: float) -> None:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop_event.wait(), timeout=timeout)
+
+    async def _run_postgres(self, stop_event: asyncio.Event) -> None:
+        import asyncpg
+
+        interval = settings.leader_heartbeat_interval
+        while not stop_event.is_set():
+            conn = None
+            try:
+                conn = await asyncpg.connect(
+                    settings.database_url, timeout=interval * 2
+                )
+                while not stop_event.is_set():
+                    if not self.is_leader:
+                        for slot, key in enumerate(self.lock_keys):
+                            locked = await conn.fetchval(
+                                "SELECT pg_try_advisory_lock($1)", key, timeout=interval
+                            )
+                            if locked:
+                                await self._become("leader", slot)
+                                break
+                    else:
+                        await conn.fetchval("SELECT 1", timeout=interval)
+                    await self._wait(stop_event, interval)
+            except Exception as exc:
+                logger.warning("%s lease lost: %s", self.name.capitalize(), exc)
+            finally:
+                # без соединения блокировки нет: уступаем роль до того,
+                # как её сможет взять другой воркер
+                await self._become("follower")
+                if conn is not None:
+                    with contextlib.suppress(Exception):
+                        await conn.close(timeout=interval)
+            await self._wait(stop_event, interval)
+
+    async def _run_local(self, stop_event: asyncio.Event) -> None:
+        await self._become("leader", 0)
+        await stop_event.wait()
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event = asyncio.Event()
+        runner = self._run_postgres if self.backend == "postgres" else self._run_local
+        self._task = asyncio.create_task(runner(self._stop_event))
+
+    async def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await self._task
+        await self._become("follower")
+
+
+leader = LeaderElection([settings.leader_lock_key])
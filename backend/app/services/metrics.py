@@ -0,0 +1,331 @@
+import contextvars
+import functools
+import math
+import sys
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import (
+    Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union,
+)
+
+from services.tracing import tracer
+
+# Границы по умолчанию (секунды): от долей миллисекунды до таймаутов действий
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[LabelValues, float]
+Collector = Callable[[], Union[float, Iterable[Sample]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    @abstractmethod
+    def _render_children(self) -> List[str]:
+        """Строки значений без заголовков HELP/TYPE"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_children())
+        return lines
+
+
+class _LabeledMetric(_Metric):
+    """Метрика со значениями, которые процесс хранит сам, по наборам меток"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._children: Dict[LabelValues, Any] = {}
+        self._lookup: Dict[tuple, Any] = {}
+
+    @abstractmethod
+    def _new_child(self) -> Any:
+        """Хранилище значения для нового набора меток"""
+
+    def labels(self, *values: Any) -> Any:
+        child = self._lookup.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            key = tuple(str(v) for v in values)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            # поиск по исходным значениям (например, int-статусу) без str()
+            self._lookup[values] = child
+        return child
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_LabeledMetric):
+    """Монотонный счётчик; ``inc`` — одно сложение без блокировок"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_children(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, k)} {_number(c.value)}"
+            for k, c in self._children.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_LabeledMetric):
+    """Гистограмма с фиксированными границами (le — включительно)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> _Buckets:
+        return _Buckets(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_children(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                bucket_labels = _labels(self.label_names, key, le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _Callback(_Metric):
+    """Значение читается при выдаче /metrics из ``stats()`` служб"""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Collector,
+                 labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def _render_children(self) -> List[str]:
+        result = self.fn()
+        samples = [((), result)] if isinstance(result, (int, float)) else result
+        return [
+            f"{self.name}{_labels(self.label_names, k)} {_number(float(v))}"
+            for k, v in samples
+        ]
+
+
+class MetricsRegistry:
+    """Метрики процесса в формате Prometheus text 0.0.4, без внешних зависимостей.
+
+    Каждый воркер uvicorn считает свои метрики; все изменения идут из
+    event loop, поэтому блокировок нет.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, fn: Collector,
+                 kind: str = "gauge", labels: Sequence[str] = ()) -> None:
+        self._register(_Callback(name, help, kind, fn, labels))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as exc:
+                lines.append(f"# {metric.name} collection failed: {_escape(str(exc))}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# HTTP
+
+http_duration = metrics.histogram(
+    "y2m_http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status"),
+)
+http_db_queries = metrics.histogram(
+    "y2m_http_request_db_queries", "DB queries per HTTP request by route",
+    ("route",), buckets=COUNT_BUCKETS,
+)
+db_queries = metrics.counter("y2m_db_queries_total", "DB queries executed", ("method",))
+db_duration = metrics.histogram("y2m_db_query_duration_seconds", "DB query latency")
+
+_request_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "request_queries", default=None
+)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка и число запросов к БД по шаблону маршрута"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_duration.labels(scope["method"], path, status[0]).observe(elapsed)
+            http_db_queries.labels(path).observe(queries[0])
+
+
+_DB_METHODS = (
+    "execute_insert", "execute_many", "execute_query", "execute_query_dict",
+    "execute_script",
+)
+
+
+def _instrument(method: Callable, name: str) -> Callable:
+    counter = db_queries.labels(name)
+    span_name = f"db.{name}"
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            db_duration.observe(finished - started)
+            tracer.record(span_name, started, finished)
+            counter.inc()
+            queries = _request_queries.get()
+            if queries is not None:
+                queries[0] += 1
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_db(connection: Any) -> None:
+    """Оборачивает методы выполнения запросов у класса соединения Tortoise"""
+    classes = [type(connection)]
+    module = sys.modules.get(type(connection).__module__)
+    wrapper_class = getattr(module, "TransactionWrapper", None)
+    if wrapper_class is not None:
+        classes.append(wrapper_class)
+    for cls in classes:
+        for name in _DB_METHODS:
+            method = cls.__dict__.get(name)
+            if method is None and cls is classes[0]:
+                method = getattr(cls, name, None)
+            if method is None or getattr(method, "__instrumented__", False):
+                continue
+            setattr(cls, name, _instrument(method, name))
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import logging
+from typing import NamedTuple, Optional
+
+import aiomqtt
+
+from services.tracing import tracer
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PublishQueueFull(Exception):
+    """Очередь публикации заполнена дольше, чем допускает таймаут"""
+
+
+class _Outgoing(NamedTuple):
+    topic: str
+    payload: str | bytes
+    qos: int
+    retain: bool
+
+
+class MQTTPublisher:
+    """Одно постоянное подключение к брокеру для исходящих сообщений.
+
+    ``publish()`` кладёт сообщение в ограниченную очередь; фоновая задача
+    держит соединение, переподключается при обрыве и отправляет сообщения
+    по порядку. Если очередь полна, ``publish()`` ждёт освобождения места
+    не дольше ``timeout`` и затем поднимает ``PublishQueueFull``.
+    """
+
+    def __init__(self, maxsize: int = 1000, reconnect_delay: float = 1.0,
+                 max_reconnect_delay: float = 30.0) -> None:
+        self._maxsize = maxsize
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        # до start() сообщения копятся в очереди и уйдут после подключения
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    async def publish(
+        self,
+        topic: str,
+        payload: str | bytes,
+        qos: int = 0,
+        retain: bool = False,
+        timeout: Optional[float] = None,
+    ) -> None:
+        item = _Outgoing(topic, payload, qos, retain)
+        with tracer.span("mqtt.publish", topic=topic):
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                wait = settings.mqtt_publish_timeout if timeout is None else timeout
+                try:
+                    await asyncio.wait_for(self._queue.put(item), timeout=wait)
+                except asyncio.TimeoutError:
+                    raise PublishQueueFull(
+                        f"MQTT publish queue is full ({self._maxsize})"
+                    ) from None
+
+    async def _run(self, stop_event: asyncio.Event) -> None:
+        delay = self._reconnect_delay
+        pending: Optional[_Outgoing] = None
+        while not stop_event.is_set():
+            try:
+                async with aiomqtt.Client(
+                    hostname=settings.mqtt_host, port=settings.mqtt_port
+                ) as client:
+                    self.connected = True
+                    delay = self._reconnect_delay
+                    logger.info(
+                        "MQTT publisher connected to %s:%s",
+                        settings.mqtt_host, settings.mqtt_port,
+                    )
+                    while True:
+                        if pending is None:
+                            pending = await self._queue.get()
+                        await client.publish(
+                            pending.topic, pending.payload,
+                            qos=pending.qos, retain=pending.retain,
+                        )
+                        pending = None
+            except aiomqtt.MqttError as exc:
+                logger.warning(
+                    "MQTT publisher disconnected: %s; reconnecting in %.1fs", exc, delay
+                )
+            finally:
+                self.connected = False
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            delay = min(delay * 2, self._max_reconnect_delay)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self._stop_event))
+
+    async def stop(self, drain_timeout: float = 2.0) -> None:
+        if self.connected:
+            # даём отправить то, что уже в очереди
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + drain_timeout
+            while not self._queue.empty() and self.connected and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+
+
+mqtt_publisher = MQTTPublisher(maxsize=settings.mqtt_publish_queue_size)
@@ -1,74 +1,368 @@
 import asyncio
+import contextlib
 import json
-from typing import Callable
+import logging
+import os
+import socket
+import time
+from collections import deque
+from typing import NamedTuple
 
 import aiomqtt
 
 from settings import settings
-from models.binding import Binding
-from modules.actions.adb import ADBAction
-from modules.actions.station import StationAction
-
-
-async def run_mqtt(stop_event: asyncio.Event):
-    async with aiomqtt.Client(hostname=settings.mqtt_host, port=settings.mqtt_port) as client:
-        topic = "y2m/bindings/+/invoke"
-        await client.subscribe(topic)
-
-        async with client.messages() as messages:
-            async for message in messages:
-                if stop_event.is_set():
-                    break
-                payload = message.payload.decode("utf-8", errors="ignore")
-                try:
-                    data = json.loads(payload) if payload else {}
-                except Exception:
-                    data = {}
-
-                # bindingId from topic
-                parts = message.topic.value.split("/")
-                binding_id = int(parts[2]) if len(parts) >= 4 else None
-                if not binding_id:
-                    continue
-                b = await Binding.get_or_none(id=binding_id)
-                if not b:
-                    continue
-
-                result = {"ok": False}
-                if b.action_type == "adb":
-                    result = await ADBAction().execute({**(b.action_config or {}), **data})
-                elif b.action_type == "station":
-                    result = await StationAction().execute({**(b.action_config or {}), **data})
-
-                state_topic = f"y2m/devices/{b.device_id}/state"
-                await client.publish(state_topic, json.dumps({
-                    "bindingId": b.id,
-                    "capability": b.capability,
-                    "result": result
-                }), qos=0, retain=False)
+from services.binding_registry import BindingEntry, binding_registry
+from services.kv_store import replica_stats
+from services.leader import LeaderElection
+from services.metrics import metrics
+from services.mqtt_publisher import PublishQueueFull, mqtt_publisher
+from services.state_store import state_store
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+INVOKE_TOPIC = "y2m/bindings/+/invoke"
+STATE_TOPIC = "y2m/devices/+/state"
+
+
+mqtt_messages = metrics.counter(
+    "y2m_mqtt_messages_total", "MQTT messages consumed by topic kind", ("kind",)
+)
+mqtt_queue_wait = metrics.histogram(
+    "y2m_mqtt_queue_wait_seconds", "Time an invoke waited in a worker queue"
+)
+mqtt_lag = metrics.histogram(
+    "y2m_mqtt_processing_lag_seconds", "Time from invoke receipt to completion"
+)
+
+
+class _Rate:
+    """Число событий в секунду за скользящее окно"""
+
+    def __init__(self, window: int = 60) -> None:
+        self._window = window
+        self._buckets: deque = deque()
+
+    def _trim(self, now: int) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self._window:
+            self._buckets.popleft()
+
+    def add(self, count: int = 1) -> None:
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += count
+        else:
+            self._buckets.append([now, count])
+            self._trim(now)
+
+    def per_second(self) -> float:
+        self._trim(int(time.monotonic()))
+        return sum(count for _, count in self._buckets) / self._window
+
+
+class _Job(NamedTuple):
+    binding: BindingEntry
+    data: dict
+    received_at: float
+
+
+async def handle_invoke(binding: BindingEntry, data: dict) -> None:
+    """Выполняет привязку и публикует результат в y2m/devices/{id}/state"""
+    result = await binding.execute(data)
+
+    state_topic = f"y2m/devices/{binding.device_id}/state"
+    state_message = {
+        "bindingId": binding.id,
+        "capability": binding.capability,
+        "result": result
+    }
+    # Значение capability Яндекса, если invoke пришёл от провайдера
+    if "type" in data and "value" in data:
+        state_message.update(
+            type=data["type"], instance=data.get("instance"), value=data["value"]
+        )
+    if data.get("traceId"):
+        state_message["traceId"] = data["traceId"]
+    try:
+        await mqtt_publisher.publish(
+            state_topic, json.dumps(state_message), qos=0, retain=False
+        )
+    except PublishQueueFull:
+        logger.warning(
+            "Dropped state message for device %s: publish queue is full",
+            binding.device_id,
+        )
 
 
 class MQTTService:
-    def __init__(self) -> None:
+    """Потребитель ``y2m/bindings/+/invoke``.
+
+    Читатель только разбирает сообщения и раскладывает их по очередям
+    воркеров по ``device_id``: команды одного устройства выполняются
+    строго по порядку, разные устройства — параллельно. Очереди
+    ограничены, так что при перегрузке читатель притормаживает.
+
+    ``y2m/devices/+/state`` читают все воркеры (состояние нужно каждому).
+    Кто читает invoke, задаёт ``Settings.mqtt_invoke_mode``: только
+    лидер (``set_invokes`` из main), все реплики через общую подписку
+    MQTT 5 или все реплики, каждая со своей долей устройств.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 100) -> None:
+        self._workers = max(1, workers)
+        self._queue_size = queue_size
+        self._queues: list[asyncio.Queue] = []
         self._stop: asyncio.Event | None = None
         self._task: asyncio.Task | None = None
+        self._report_task: asyncio.Task | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._client: aiomqtt.Client | None = None
+        self._invokes = False
+        self._slots: LeaderElection | None = None
+        self.mode = settings.mqtt_invoke_mode
+        self.replicas = max(1, settings.mqtt_replicas)
+        self.replica_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.received = 0
+        self.skipped = 0
+        self.processed = 0
+        self.failed = 0
+        self._throughput = _Rate()
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @property
+    def invoke_filter(self) -> str:
+        if self.mode == "shared":
+            return f"$share/{settings.mqtt_share_group}/{INVOKE_TOPIC}"
+        return INVOKE_TOPIC
+
+    @property
+    def replica_index(self) -> int | None:
+        if settings.mqtt_replica_index >= 0:
+            return settings.mqtt_replica_index
+        return self._slots.slot if self._slots else None
+
+    def owns(self, device_id: int) -> bool:
+        """Выполняет ли эта реплика invoke устройства"""
+        if self.mode != "affinity":
+            return True
+        return self.replica_index == device_id % self.replicas
+
+    def stats(self) -> dict:
+        depths = [q.qsize() for q in self._queues]
+        handled = self.processed + self.failed
+        return {
+            "replica": self.replica_id,
+            "mode": self.mode,
+            "subscription": self.invoke_filter if self._invokes else None,
+            "replica_index": self.replica_index if self.mode == "affinity" else None,
+            "running": bool(self._task and not self._task.done()),
+            "invokes": self._invokes,
+            "workers": self._workers,
+            "queue_depth": sum(depths),
+            "queue_depths": depths,
+            "received": self.received,
+            "skipped": self.skipped,
+            "processed": self.processed,
+            "failed": self.failed,
+            "throughput_per_sec": round(self._throughput.per_second(), 2),
+            "latency_avg_ms": (
+                round(self._latency_total / handled * 1000, 2) if handled else 0.0
+            ),
+            "latency_max_ms": round(self._latency_max * 1000, 2),
+        }
+
+    async def replicas_stats(self) -> dict:
+        """Счётчики всех живых реплик (свои — всегда свежие)"""
+        replicas = await replica_stats.items()
+        replicas[self.replica_id] = self.stats()
+        return replicas
+
+    async def _dispatch(self, message: aiomqtt.Message) -> None:
+        payload = message.payload.decode("utf-8", errors="ignore")
+        try:
+            data = json.loads(payload) if payload else {}
+        except Exception:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+
+        parts = message.topic.value.split("/")
+        if message.topic.matches(STATE_TOPIC):
+            mqtt_messages.labels("state").inc()
+            if len(parts) >= 4 and parts[2].isdigit():
+                state_store.apply_message(int(parts[2]), data)
+            return
+
+        mqtt_messages.labels("invoke").inc()
+        if not self._invokes:
+            return  # подписка уже снята, сообщение пришло вдогонку
+        # bindingId from topic
+        binding_id = int(parts[2]) if len(parts) >= 4 and parts[2].isdigit() else None
+        if not binding_id:
+            return
+        b = await binding_registry.get(binding_id)
+        if not b:
+            return
+        if not self.owns(b.device_id):
+            self.skipped += 1
+            return
+        self.received += 1
+        # в affinity у реплики только device_id одного остатка по replicas:
+        # делим частное, иначе часть очередей простаивала бы
+        key = b.device_id // self.replicas if self.mode == "affinity" else b.device_id
+        queue = self._queues[key % self._workers]
+        await queue.put(_Job(b, data, time.monotonic()))
+
+    async def _reader(self, stop_event: asyncio.Event) -> None:
+        delay = 1.0
+        # общие подписки — часть MQTT 5; остальные режимы работают и на 3.1.1
+        protocol = aiomqtt.ProtocolVersion.V311
+        if self.mode == "shared":
+            protocol = aiomqtt.ProtocolVersion.V5
+        while not stop_event.is_set():
+            try:
+                async with aiomqtt.Client(
+                    hostname=settings.mqtt_host,
+                    port=settings.mqtt_port,
+                    identifier=f"y2m-{self.replica_id}",
+                    protocol=protocol,
+                ) as client:
+                    # клиент виден set_invokes до подписки: иначе включение
+                    # invoke во время подключения потерялось бы
+                    self._client = client
+                    if self._invokes:
+                        await client.subscribe(self.invoke_filter)
+                    await client.subscribe(STATE_TOPIC)
+                    delay = 1.0
+                    async for message in client.messages:
+                        if stop_event.is_set():
+                            break
+                        try:
+                            await self._dispatch(message)
+                        except Exception as exc:
+                            logger.exception(
+                                "Failed to dispatch MQTT message on %s: %s",
+                                message.topic.value, exc,
+                            )
+            except aiomqtt.MqttError as exc:
+                logger.warning(
+                    "MQTT consumer disconnected: %s; reconnecting in %.1fs", exc, delay
+                )
+            finally:
+                self._client = None
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job: _Job = await queue.get()
+            waited = time.monotonic() - job.received_at
+            mqtt_queue_wait.observe(waited)
+            try:
+                await self._invoke(job, waited)
+                self.processed += 1
+            except Exception as exc:
+                self.failed += 1
+                logger.exception("Binding %s invoke failed: %s", job.binding.id, exc)
+            finally:
+                latency = time.monotonic() - job.received_at
+                mqtt_lag.observe(latency)
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+                self._throughput.add()
+                queue.task_done()
+
+    @staticmethod
+    async def _invoke(job: _Job, waited: float) -> None:
+        """Выполняет invoke, продолжая трассу из ``traceId``, если он есть"""
+        trace_id = job.data.get("traceId")
+        if not trace_id or not settings.trace_enabled:
+            await handle_invoke(job.binding, job.data)
+            return
+        with tracer.start(
+            "mqtt.invoke", trace_id=str(trace_id), binding_id=job.binding.id
+        ):
+            now = time.perf_counter()
+            tracer.record("queue.wait", now - waited, now)
+            await handle_invoke(job.binding, job.data)
+
+    async def _report(self, stop_event: asyncio.Event) -> None:
+        interval = settings.mqtt_stats_interval
+        while not stop_event.is_set():
+            try:
+                await replica_stats.set(self.replica_id, self.stats())
+            except Exception as exc:
+                logger.warning("Failed to report MQTT replica stats: %s", exc)
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        with contextlib.suppress(Exception):
+            await replica_stats.delete(self.replica_id)
+
+    async def set_invokes(self, enabled: bool) -> None:
+        """Включает или снимает подписку на invoke у работающего потребителя"""
+        if enabled == self._invokes:
+            return
+        self._invokes = enabled
+        client = self._client
+        if client is None:
+            return  # подпишемся при следующем подключении
+        try:
+            if enabled:
+                await client.subscribe(self.invoke_filter)
+            else:
+                await client.unsubscribe(self.invoke_filter)
+        except aiomqtt.MqttError as exc:
+            action = "subscribe" if enabled else "unsubscribe"
+            logger.warning("Failed to %s invoke topic: %s", action, exc)
 
     async def start(self) -> None:
         if self._task and not self._task.done():
             return
+        # в режиме leader подписку на invoke включает лидер через set_invokes
+        self._invokes = self.mode == "shared" or (
+            self.mode == "affinity" and settings.mqtt_replica_index >= 0
+        )
         self._stop = asyncio.Event()
-        self._task = asyncio.create_task(run_mqtt(self._stop))
+        self._queues = [
+            asyncio.Queue(maxsize=self._queue_size) for _ in range(self._workers)
+        ]
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(q)) for q in self._queues
+        ]
+        self._task = asyncio.create_task(self._reader(self._stop))
+        if self.mode == "affinity" and settings.mqtt_replica_index < 0:
+            # слот i: ключ leader_lock_key + 1 + i; без слота реплика в резерве
+            self._slots = LeaderElection(
+                [settings.leader_lock_key + 1 + i for i in range(self.replicas)],
+                name="mqtt replica",
+            )
+            self._slots.on_elected(lambda: self.set_invokes(True))
+            self._slots.on_demoted(lambda: self.set_invokes(False))
+            await self._slots.start()
+        if self.mode != "leader" and settings.mqtt_stats_interval > 0:
+            self._report_task = asyncio.create_task(self._report(self._stop))
 
     async def stop(self) -> None:
+        if self._slots:
+            await self._slots.stop()
+            self._slots = None
         if self._stop:
             self._stop.set()
-        if self._task:
-            try:
-                await asyncio.wait_for(self._task, timeout=5)
-            except asyncio.TimeoutError:
-                self._task.cancel()
-
-
-mqtt_service = MQTTService()
+        if self._report_task:
+            with contextlib.suppress(asyncio.TimeoutError, Exception):
+                await asyncio.wait_for(self._report_task, timeout=2.0)
+            self._report_task = None
+        tasks = [t for t in [self._task, *self._worker_tasks] if t]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+        self._worker_tasks = []
 
 
+mqtt_service = MQTTService(
+    workers=settings.mqtt_workers, queue_size=settings.mqtt_queue_size
+)
@@ -1,13 +1,11 @@
-import httpx
 from urllib.parse import urlencode
 from settings import settings
+from services.cache_sync import cache_sync
 from services.crypto import encrypt
+from services.http_clients import http_clients
+from services.provider_tokens import provider_tokens
+from services.token_cache import hash_token, token_cache
 from models.user_token import UserToken
-import hashlib
-
-
-AUTH_URL = "https://oauth.yandex.ru/authorize"
-TOKEN_URL = "https://oauth.yandex.ru/token"
 
 
 def build_auth_url(state: str = "") -> str:
@@ -18,30 +16,40 @@ def build_auth_url(state: str = "") -> str:
         "force_confirm": "true",
         "state": state,
     }
-    return f"{AUTH_URL}?{urlencode(params)}"
+    return f"{settings.yandex_oauth_url}/authorize?{urlencode(params)}"
 
 
 async def exchange_code(code: str) -> dict:
-    async with httpx.AsyncClient(timeout=15) as client:
-        data = {
-            "grant_type": "authorization_code",
-            "code": code,
-            "client_id": settings.ya_client_id,
-            "client_secret": settings.ya_client_secret,
-            "redirect_uri": settings.ya_redirect_uri,
-        }
-        resp = await client.post(TOKEN_URL, data=data)
-        resp.raise_for_status()
-        return resp.json()
+    data = {
+        "grant_type": "authorization_code",
+        "code": code,
+        "client_id": settings.ya_client_id,
+        "client_secret": settings.ya_client_secret,
+        "redirect_uri": settings.ya_redirect_uri,
+    }
+    resp = await http_clients.get("yandex_oauth").post("/token", data=data)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def refresh_access_token(refresh_token: str) -> dict:
+    data = {
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+        "client_id": settings.ya_client_id,
+        "client_secret": settings.ya_client_secret,
+    }
+    resp = await http_clients.get("yandex_oauth").post("/token", data=data)
+    resp.raise_for_status()
+    return resp.json()
 
 
 async def get_user_info(access_token: str) -> dict:
     """Получает информацию о пользователе из Яндекс OAuth API"""
-    async with httpx.AsyncClient(timeout=15) as client:
-        headers = {"Authorization": f"OAuth {access_token}"}
-        resp = await client.get("https://login.yandex.ru/info", headers=headers)
-        resp.raise_for_status()
-        return resp.json()
+    headers = {"Authorization": f"OAuth {access_token}"}
+    resp = await http_clients.get("yandex_login").get("/info", headers=headers)
+    resp.raise_for_status()
+    return resp.json()
 
 
 async def save_tokens(token_payload: dict) -> int:
@@ -58,7 +66,7 @@ async def save_tokens(token_payload: dict) -> int:
         user_id = "unknown"
     
     # Хэш токена (для поиска по Bearer без хранения открытого значения)
-    access_token_hash = hashlib.sha256(access_token.encode("utf-8")).hexdigest() if access_token else None
+    access_token_hash = hash_token(access_token) if access_token else None
 
     # For MVP we store one record
     rec = await UserToken.create(
@@ -69,6 +77,12 @@ async def save_tokens(token_payload: dict) -> int:
         refresh_token=encrypt(refresh_token) if refresh_token else None,
         expires_at=None,
     )
+    token_cache.invalidate_user(user_id)
+    provider_tokens.invalidate("yandex")
+    await cache_sync.bump("tokens")
     return rec.id
 
 
+async def get_provider_token() -> str | None:
+    """Возвращает расшифрованный OAuth-токен Яндекса (любой активный)"""
+    return await provider_tokens.get("yandex")
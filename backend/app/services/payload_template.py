@@ -0,0 +1,297 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# {{ name[:type][|transform[:arg...]]... }}
+_PLACEHOLDER = re.compile(r"\{\{\s*([^{}]*?)\s*\}\}")
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class TemplateError(ValueError):
+    """Ошибка в шаблоне MQTT-сообщения"""
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "on", "yes")
+    return bool(value)
+
+
+def _to_int(value: Any) -> int:
+    return int(round(float(value)))
+
+
+_TYPES: Dict[str, Callable[[Any], Any]] = {
+    "int": _to_int,
+    "float": float,
+    "bool": _to_bool,
+    "str": str,
+}
+
+
+def _number(arg: str) -> float:
+    try:
+        return float(arg)
+    except ValueError:
+        raise TemplateError(f"expected a number, got {arg!r}") from None
+
+
+def _scale(args: List[str]) -> Callable[[Any], Any]:
+    if len(args) != 4:
+        raise TemplateError(
+            "scale expects 4 arguments: scale:from_min:from_max:to_min:to_max"
+        )
+    a, b, c, d = (_number(x) for x in args)
+    if a == b:
+        raise TemplateError("scale source range is empty")
+    low, high = min(c, d), max(c, d)
+
+    def apply(value: Any) -> Any:
+        if value is None:
+            return None
+        return min(high, max(low, c + (float(value) - a) * (d - c) / (b - a)))
+    return apply
+
+
+def _round(args: List[str]) -> Callable[[Any], Any]:
+    digits = int(_number(args[0])) if args else 0
+
+    def apply(value: Any) -> Any:
+        if value is None:
+            return None
+        return round(float(value), digits) if digits else int(round(float(value)))
+    return apply
+
+
+def _clamp(args: List[str]) -> Callable[[Any], Any]:
+    if len(args) != 2:
+        raise TemplateError("clamp expects 2 arguments: clamp:min:max")
+    low, high = _number(args[0]), _number(args[1])
+    return lambda value: None if value is None else min(high, max(low, float(value)))
+
+
+def _default(args: List[str]) -> Callable[[Any], Any]:
+    fallback = ":".join(args)
+    return lambda value: fallback if value is None or value == "" else value
+
+
+def _key(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _map(args: List[str]) -> Callable[[Any], Any]:
+    # map:on=ON,off=OFF — ключи сравниваются с текстом значения (true/false для bool)
+    table: Dict[str, str] = {}
+    for pair in ":".join(args).split(","):
+        key, sep, mapped = pair.partition("=")
+        if not sep:
+            raise TemplateError(f"map entry {pair!r} must look like key=value")
+        table[key.strip()] = mapped.strip()
+    return lambda value: table.get(_key(value), value)
+
+
+_TRANSFORMS: Dict[str, Callable[[List[str]], Callable[[Any], Any]]] = {
+    "scale": _scale,
+    "round": _round,
+    "clamp": _clamp,
+    "default": _default,
+    "map": _map,
+    "upper": lambda args: lambda value: None if value is None else str(value).upper(),
+    "lower": lambda args: lambda value: None if value is None else str(value).lower(),
+}
+
+
+_NEEDS_ESCAPE = re.compile(r'["\\\x00-\x1f\x7f]')
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _json_string(value: Any) -> str:
+    # содержимое JSON-строки без кавычек; экранируем только при необходимости
+    if value is None:
+        return ""
+    text = value if isinstance(value, str) else str(value)
+    if not _NEEDS_ESCAPE.search(text):
+        return text
+    return json.dumps(text, ensure_ascii=False)[1:-1]
+
+
+def _json_literal(value: Any) -> str:
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+class Placeholder:
+    """Переменная шаблона, уже разобранная: имя, преобразования, тип и контекст"""
+
+    __slots__ = ("name", "transforms", "convert", "quoted", "source", "format")
+
+    def __init__(self, source: str, quoted: bool) -> None:
+        self.source = source
+        self.quoted = quoted
+        self.format: Callable[[Any], str] = _text
+        head, *chain = [part.strip() for part in source.split("|")]
+        name, _, type_name = head.partition(":")
+        name, type_name = name.strip(), type_name.strip()
+        if not _NAME.match(name):
+            raise TemplateError(f"invalid variable name in {{{{{source}}}}}")
+        if type_name and type_name not in _TYPES:
+            raise TemplateError(f"unknown type {type_name!r} in {{{{{source}}}}}")
+        self.name = name
+        self.convert = _TYPES.get(type_name)
+        self.transforms: Tuple[Callable[[Any], Any], ...] = ()
+        for item in chain:
+            transform, *args = item.split(":")
+            factory = _TRANSFORMS.get(transform.strip())
+            if factory is None:
+                raise TemplateError(
+                    f"unknown transform {transform!r} in {{{{{source}}}}}"
+                )
+            self.transforms += (factory(args),)
+
+    def value(self, context: Dict[str, Any]) -> Any:
+        value = context.get(self.name)
+        for transform in self.transforms:
+            value = transform(value)
+        if self.convert is not None and value is not None:
+            try:
+                value = self.convert(value)
+            except (TypeError, ValueError):
+                raise TemplateError(
+                    f"cannot convert {value!r} for {{{{{self.source}}}}}"
+                ) from None
+        return value
+
+    def render(self, context: Dict[str, Any]) -> str:
+        if not self.transforms and self.convert is None:
+            return self.format(context.get(self.name))
+        return self.format(self.value(context))
+
+
+Part = Union[str, Placeholder]
+
+
+class CompiledTemplate:
+    """Шаблон, разобранный один раз; ``render`` — один проход по частям.
+
+    Если шаблон с подставленными переменными — JSON-объект или массив,
+    значения подставляются по правилам JSON: внутри строки экранируются,
+    вне строки становятся литералами (``50``, ``true``, ``null``,
+    ``"text"``). Иначе шаблон считается текстом: ``str(value)``, пустая
+    строка вместо ``None``.
+    """
+
+    __slots__ = ("source", "parts", "json")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.parts: Tuple[Part, ...] = tuple(_parse(source))
+        placeholders = [p for p in self.parts if isinstance(p, Placeholder)]
+        probe = "".join(
+            p if isinstance(p, str) else ("" if p.quoted else "0") for p in self.parts
+        )
+        try:
+            self.json = isinstance(json.loads(probe), (dict, list))
+        except ValueError:
+            self.json = False
+        if self.json:
+            for placeholder in placeholders:
+                quoted = placeholder.quoted
+                placeholder.format = _json_string if quoted else _json_literal
+
+    def render(self, context: Dict[str, Any]) -> str:
+        return "".join([
+            part if part.__class__ is str else part.render(context)
+            for part in self.parts
+        ])
+
+
+def _parse(source: str) -> List[Part]:
+    parts: List[Part] = []
+    position = 0
+    in_string = False
+    for match in _PLACEHOLDER.finditer(source):
+        literal = source[position:match.start()]
+        in_string = _string_state(literal, in_string)
+        if literal:
+            parts.append(literal)
+        parts.append(Placeholder(match.group(1), quoted=in_string))
+        position = match.end()
+    if position < len(source):
+        parts.append(source[position:])
+    return parts
+
+
+def _string_state(literal: str, in_string: bool) -> bool:
+    """Внутри ли JSON-строки окажется конец литерала"""
+    escaped = False
+    for char in literal:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = in_string
+        elif char == '"':
+            in_string = not in_string
+    return in_string
+
+
+@lru_cache(maxsize=1024)
+def compile_template(source: str) -> CompiledTemplate:
+    """Разобранный шаблон; одинаковые шаблоны привязок разбираются один раз"""
+    return CompiledTemplate(source)
+
+
+class MQTTMessageTemplate:
+    """Сообщения MQTT-привязки: пары (топик, нагрузка) из ``action_config``.
+
+    ``topic`` + ``payload`` — основной вариант; ``topics`` — словарь
+    ``{топик: шаблон}`` для публикации в несколько топиков со своими
+    шаблонами. Переменные допустимы и в самих топиках.
+    """
+
+    __slots__ = ("messages",)
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        pairs: List[Tuple[str, Any]] = []
+        if config.get("topic"):
+            pairs.append((config["topic"], config.get("payload", "{}")))
+        topics = config.get("topics") or {}
+        if not isinstance(topics, dict):
+            raise TemplateError("topics must be an object {topic: payload}")
+        pairs.extend(topics.items())
+        if not pairs:
+            raise TemplateError("MQTT topic not configured")
+        self.messages = [
+            (compile_template(str(topic)), compile_template(_as_text(payload)))
+            for topic, payload in pairs
+        ]
+
+    def render(self, context: Dict[str, Any]) -> List[Tuple[str, str]]:
+        return [
+            (topic.render(context), payload.render(context))
+            for topic, payload in self.messages
+        ]
+
+
+def _as_text(payload: Any) -> str:
+    # UI сохраняет нагрузку строкой, API может прислать готовый объект
+    if isinstance(payload, str):
+        return payload
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def validate_mqtt_config(config: Optional[Dict[str, Any]]) -> None:
+    """Поднимает TemplateError, если шаблоны привязки не разбираются"""
+    MQTTMessageTemplate(config or {})
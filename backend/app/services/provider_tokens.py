@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from models.user_token import UserToken
+from services.cache_sync import cache_sync
+from services.crypto import decrypt, rotate
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderTokens:
+    """Расшифрованные OAuth-токены провайдеров в памяти процесса.
+
+    Токен живёт ``provider_token_ttl`` секунд, так что invoke станций не
+    ходит ни в БД, ни в шифр; одновременные промахи ждут один запрос.
+    Сохранение, обновление и удаление токенов сбрасывают кэш сразу, в
+    других воркерах — через ``cache_sync`` (группа ``tokens``).
+
+    Фоновая задача перешифровывает основным ключом записи, зашифрованные
+    старыми ключами ``Y2M_ENC_KEY``: после того как она прошла, старый
+    ключ можно убрать из списка.
+    """
+
+    def __init__(self, ttl: float = 60.0) -> None:
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.rotated = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rotated": self.rotated,
+        }
+
+    def invalidate(self, provider: Optional[str] = None) -> None:
+        if provider is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(provider, None)
+
+    async def _load(self, provider: str) -> Optional[str]:
+        record = await UserToken.filter(provider=provider).first()
+        if not record:
+            return None
+        try:
+            return decrypt(record.access_token)
+        except Exception:
+            return record.access_token
+
+    async def get(self, provider: str = "yandex") -> Optional[str]:
+        entry = self._entries.get(provider)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        loading = self._loading.get(provider)
+        if loading is not None:
+            return await asyncio.shield(loading)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[provider] = future
+        try:
+            token = await self._load(provider)
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # ожидающих может не быть
+            raise
+        else:
+            # пустой результат не кэшируем: токен может появиться в любой момент
+            if token is not None:
+                self._entries[provider] = (token, time.monotonic() + self.ttl)
+            future.set_result(token)
+            return token
+        finally:
+            self._loading.pop(provider, None)
+
+    async def reencrypt(self) -> int:
+        """Перешифровывает основным ключом токены под старыми ключами"""
+        changed = 0
+        rows = await UserToken.all().values("id", "access_token", "refresh_token")
+        for row in rows:
+            for field in ("access_token", "refresh_token"):
+                value = row[field]
+                new_value = rotate(value) if value else None
+                if new_value is None:
+                    continue
+                # условие по старому значению: не затираем токен,
+                # обновлённый параллельно
+                changed += await UserToken.filter(
+                    id=row["id"], **{field: value}
+                ).update(**{field: new_value})
+        self.rotated += changed
+        return changed
+
+    async def _run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                changed = await self.reencrypt()
+                if changed:
+                    logger.info(
+                        "Re-encrypted %d provider token field(s) with the primary key",
+                        changed,
+                    )
+            except Exception as exc:
+                logger.error("Failed to re-encrypt provider tokens: %s", exc)
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    stop_event.wait(), timeout=settings.secret_rotation_interval
+                )
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self._stop_event))
+
+    async def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+
+
+provider_tokens = ProviderTokens(ttl=settings.provider_token_ttl)
+cache_sync.on_change("tokens", provider_tokens.invalidate)
@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from models.device import Device
+from models.device_state import DeviceState
+from services.cache_sync import cache_sync
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+StateKey = Tuple[int, str, str]  # (device_id, capability type, instance)
+Listener = Callable[[int, str, str, Any], None]
+
+# instance по умолчанию для capability без параметра instance
+DEFAULT_INSTANCES = {
+    "devices.capabilities.on_off": "on",
+    "devices.capabilities.video_stream": "get_stream",
+}
+
+
+class _Entry:
+    __slots__ = ("value", "updated_at")
+
+    def __init__(self, value: Any, updated_at: float) -> None:
+        self.value = value
+        self.updated_at = updated_at
+
+
+class StateStore:
+    """Последнее известное состояние capability устройств.
+
+    Хранится в памяти процесса по ключу ``(device_id, type, instance)`` и
+    периодически сбрасывается в таблицу ``device_states``, чтобы после
+    перезапуска состояние не начиналось с нуля.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[StateKey, _Entry] = {}
+        self._dirty: Set[StateKey] = set()
+        self._listeners: List[Listener] = []
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, device_id: int, cap_type: str, instance: str) -> Optional[Any]:
+        entry = self._entries.get((device_id, cap_type, instance))
+        return entry.value if entry is not None else None
+
+    def has(self, device_id: int, cap_type: str, instance: str) -> bool:
+        return (device_id, cap_type, instance) in self._entries
+
+    def subscribe(self, listener: Listener) -> None:
+        """``listener(device_id, type, instance, value)`` на каждое изменение"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def set(self, device_id: int, cap_type: str, instance: Optional[str],
+            value: Any) -> None:
+        instance = instance or DEFAULT_INSTANCES.get(cap_type)
+        if not instance:
+            return
+        key = (int(device_id), cap_type, instance)
+        entry = self._entries.get(key)
+        if entry is not None and entry.value == value:
+            entry.updated_at = time.time()
+            return
+        self._entries[key] = _Entry(value, time.time())
+        self._dirty.add(key)
+        for listener in self._listeners:
+            listener(*key, value)
+
+    def apply_message(self, device_id: int, data: Dict[str, Any]) -> None:
+        """Обновляет состояние по сообщению из ``y2m/devices/{id}/state``.
+
+        Учитываются сообщения с полями ``type``/``instance``/``value``;
+        если есть ``result``, состояние меняется только при ``ok``.
+        """
+        result = data.get("result")
+        if isinstance(result, dict) and not result.get("ok"):
+            return
+        cap_type = data.get("type")
+        if not cap_type or "value" not in data:
+            return
+        self.set(device_id, cap_type, data.get("instance"), data["value"])
+
+    def forget(self, device_ids: Iterable[int]) -> None:
+        """Удаляет состояние удалённых устройств"""
+        ids = {int(d) for d in device_ids}
+        for key in [k for k in self._entries if k[0] in ids]:
+            del self._entries[key]
+            self._dirty.discard(key)
+        if ids:
+            asyncio.create_task(self._delete_persisted(ids))
+
+    async def prune(self) -> None:
+        """Удаляет состояние устройств, удалённых в другом воркере"""
+        known = set(await Device.all().values_list("id", flat=True))
+        for key in [k for k in self._entries if k[0] not in known]:
+            del self._entries[key]
+            self._dirty.discard(key)
+
+    async def _delete_persisted(self, ids: Set[int]) -> None:
+        try:
+            await DeviceState.filter(device_id__in=ids).delete()
+        except Exception as exc:
+            logger.error("Failed to delete persisted state for %s: %s", ids, exc)
+
+    async def load(self) -> None:
+        rows = await DeviceState.all()
+        for row in rows:
+            entry = _Entry(row.value, row.updated_at.timestamp())
+            self._entries[(row.device_id, row.type, row.instance)] = entry
+        logger.info("Loaded %d device state entries", len(rows))
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        objects = [
+            DeviceState(
+                device_id=key[0], type=key[1], instance=key[2],
+                value=self._entries[key].value,
+            )
+            for key in dirty if key in self._entries
+        ]
+        try:
+            await DeviceState.bulk_create(
+                objects,
+                on_conflict=["device_id", "type", "instance"],
+                update_fields=["value", "updated_at"],
+            )
+        except Exception as exc:
+            # вернём ключи, чтобы сохранить их при следующем проходе
+            self._dirty |= dirty
+            logger.error("Failed to persist device state: %s", exc)
+
+    async def _run(self, stop_event: asyncio.Event, interval_sec: float) -> None:
+        while not stop_event.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=interval_sec)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        try:
+            await self.load()
+        except Exception as exc:
+            logger.error("Failed to load device state snapshot: %s", exc)
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(
+            self._run(self._stop_event, settings.state_flush_interval)
+        )
+
+    async def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                with contextlib.suppress(Exception):
+                    await self._task
+        await self.flush()
+
+
+state_store = StateStore()
+cache_sync.on_change("discovery", state_store.prune)
@@ -0,0 +1,306 @@
+import asyncio
+import contextlib
+import json
+import logging
+import ssl
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+from websockets.asyncio.client import connect
+
+from services.http_clients import http_clients
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StationError(Exception):
+    """Станция недоступна или отклонила команду"""
+
+
+@lru_cache(maxsize=64)
+def pinned_ssl_context(certificate: str) -> ssl.SSLContext:
+    """TLS-контекст, доверяющий только самоподписанному сертификату станции.
+
+    Сертификат приходит из glagol device_list. Он выписан на id станции,
+    а не на её адрес в LAN, поэтому имя хоста не сверяется, но цепочка
+    проверяется: чужой сертификат по тому же адресу будет отвергнут.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_REQUIRED
+    # самоподписанный сертификат — сам себе якорь доверия
+    context.verify_flags |= ssl.VERIFY_X509_PARTIAL_CHAIN
+    context.load_verify_locations(cadata=certificate)
+    return context
+
+
+def _server_certificate(info: Dict[str, Any]) -> Optional[str]:
+    return ((info.get("glagol") or {}).get("security") or {}).get("server_certificate")
+
+
+async def fetch_station_info(device_id: str, oauth_token: str) -> Dict[str, Any]:
+    """Платформа и локальный адрес станции из glagol device_list"""
+    client = http_clients.get("quasar")
+    resp = await client.get(
+        "/glagol/device_list", headers={"Authorization": f"Oauth {oauth_token}"}
+    )
+    resp.raise_for_status()
+    for device in resp.json().get("devices", []):
+        if device.get("id") == device_id:
+            return device
+    raise StationError(f"station {device_id} not found in account")
+
+
+async def fetch_conversation_token(
+    device_id: str, platform: str, oauth_token: str
+) -> str:
+    client = http_clients.get("quasar")
+    resp = await client.get(
+        "/glagol/token",
+        params={"device_id": device_id, "platform": platform},
+        headers={"Authorization": f"Oauth {oauth_token}"},
+    )
+    resp.raise_for_status()
+    token = resp.json().get("token")
+    if not token:
+        raise StationError(f"no conversation token for station {device_id}")
+    return token
+
+
+class _Command:
+    __slots__ = ("payload", "future")
+
+    def __init__(self, payload: Dict[str, Any], future: asyncio.Future) -> None:
+        self.payload = payload
+        self.future = future
+
+
+class StationConnection:
+    """Постоянное WebSocket-подключение к одной станции (протокол glagol).
+
+    Команды складываются в очередь станции и отправляются по уже
+    открытому сокету одна за другой; ответ сопоставляется по
+    ``requestId``. Сокет держится ping-ами websockets и переоткрывается
+    с нарастающей паузой; при отказе в авторизации токен беседы
+    запрашивается заново.
+    """
+
+    def __init__(self, device_id: str, oauth_token: str,
+                 host: Optional[str] = None, port: Optional[int] = None) -> None:
+        self.device_id = device_id
+        self.oauth_token = oauth_token
+        self.host = host
+        self.port = port
+        self.platform: Optional[str] = None
+        self.certificate: Optional[str] = None
+        self.connected = False
+        self.last_state: Dict[str, Any] = {}
+        self.last_error: Optional[str] = None
+        self._token: Optional[str] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.station_queue_size)
+        self._pending: Dict[str, _Command] = {}
+        self._retry: List[_Command] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+        error = StationError(f"station {self.device_id} client stopped")
+        self._fail_pending(error, drain_queue=True)
+
+    def _fail_pending(self, error: Exception, drain_queue: bool = False) -> None:
+        """Отменяет отправленные команды без ответа; очередь — только при остановке"""
+        for command in self._pending.values():
+            if not command.future.done():
+                command.future.set_exception(error)
+        self._pending.clear()
+        while drain_queue and not self._queue.empty():
+            command = self._queue.get_nowait()
+            if not command.future.done():
+                command.future.set_exception(error)
+
+    async def _resolve(self) -> Tuple[str, int, str]:
+        trusted = self.certificate or not settings.station_tls
+        if self.host and self.platform and self._token and trusted:
+            return self.host, self.port or settings.station_port, self._token
+        info = await fetch_station_info(self.device_id, self.oauth_token)
+        self.platform = info.get("platform") or self.platform
+        self.certificate = _server_certificate(info) or self.certificate
+        if settings.station_tls and not self.certificate:
+            raise StationError(
+                f"station {self.device_id} has no server certificate in device_list"
+            )
+        network = info.get("networkInfo") or {}
+        if not self.host:
+            addresses = network.get("ip_addresses") or []
+            if not addresses:
+                raise StationError(f"station {self.device_id} has no local address")
+            self.host = addresses[0]
+        if not self.port:
+            self.port = network.get("external_port") or settings.station_port
+        if not self._token:
+            self._token = await fetch_conversation_token(
+                self.device_id, self.platform or "", self.oauth_token
+            )
+        return self.host, self.port, self._token
+
+    async def send(
+        self, payload: Dict[str, Any], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Ставит команду в очередь станции и ждёт ответ"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(_Command(payload, future))
+        except asyncio.QueueFull:
+            raise StationError(f"station {self.device_id} command queue is full")
+        timeout = timeout or settings.station_command_timeout
+        return await asyncio.wait_for(future, timeout=timeout)
+
+    async def _sender(self, ws, token: str) -> None:
+        while True:
+            if self._retry:
+                command = self._retry.pop(0)
+            else:
+                command = await self._queue.get()
+            if command.future.done():
+                continue  # вызвавший уже не ждёт (таймаут)
+            message_id = str(uuid.uuid4())
+            self._pending[message_id] = command
+            command.future.add_done_callback(
+                lambda _, m=message_id: self._pending.pop(m, None)
+            )
+            await ws.send(json.dumps({
+                "conversationToken": token,
+                "id": message_id,
+                "sentTime": int(time.time() * 1000),
+                "payload": command.payload,
+            }))
+
+    async def _receiver(self, ws) -> None:
+        async for raw in ws:
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(message.get("state"), dict):
+                self.last_state = message["state"]
+            command = self._pending.pop(message.get("requestId"), None)
+            if command is None or command.future.done():
+                continue
+            future = command.future
+            status = message.get("status", "SUCCESS")
+            if status == "SUCCESS":
+                future.set_result(message)
+            else:
+                error = StationError(f"station {self.device_id} replied {status}")
+                future.set_exception(error)
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                host, port, token = await self._resolve()
+                scheme = "wss" if settings.station_tls else "ws"
+                ssl_context = None
+                if settings.station_tls:
+                    ssl_context = pinned_ssl_context(self.certificate)
+                async with connect(
+                    f"{scheme}://{host}:{port}",
+                    ssl=ssl_context,
+                    ping_interval=settings.station_ping_interval,
+                    ping_timeout=settings.station_ping_interval,
+                    open_timeout=settings.station_command_timeout,
+                ) as ws:
+                    self.connected = True
+                    self.last_error = None
+                    delay = 1.0
+                    logger.info(
+                        "Connected to station %s at %s:%s", self.device_id, host, port
+                    )
+                    sender = asyncio.create_task(self._sender(ws, token))
+                    try:
+                        await self._receiver(ws)
+                    finally:
+                        sender.cancel()
+                        with contextlib.suppress(asyncio.CancelledError):
+                            await sender
+            except websockets.ConnectionClosed as exc:
+                self.last_error = f"connection closed: {exc}"
+                if exc.rcvd and exc.rcvd.code == 4000:
+                    # токен беседы отклонён: команды не выполнены, повторим с новым
+                    self._token = None
+                    self._retry.extend(self._pending.values())
+                    self._pending.clear()
+            except (StationError, OSError, asyncio.TimeoutError,
+                    websockets.WebSocketException) as exc:
+                self.last_error = str(exc) or exc.__class__.__name__
+            except Exception as exc:
+                # ошибки облака (device_list/token) — токен мог устареть
+                self.last_error = str(exc) or exc.__class__.__name__
+                self._token = None
+            self.connected = False
+            self._fail_pending(StationError(
+                f"station {self.device_id} disconnected: {self.last_error}"
+            ))
+            logger.warning(
+                "Station %s unavailable: %s; reconnecting in %.1fs",
+                self.device_id, self.last_error, delay,
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "device_id": self.device_id,
+            "host": self.host,
+            "port": self.port,
+            "connected": self.connected,
+            "queue_size": self._queue.qsize(),
+            "last_error": self.last_error,
+        }
+
+
+class StationClient:
+    """Одно подключение на станцию; создаётся при первой команде"""
+
+    def __init__(self) -> None:
+        self._connections: Dict[str, StationConnection] = {}
+
+    def connection(self, device_id: str, oauth_token: str,
+                   host: Optional[str] = None,
+                   port: Optional[int] = None) -> StationConnection:
+        conn = self._connections.get(device_id)
+        if conn is None:
+            conn = StationConnection(device_id, oauth_token, host, port)
+            self._connections[device_id] = conn
+        else:
+            conn.oauth_token = oauth_token
+        return conn
+
+    async def send(self, device_id: str, payload: Dict[str, Any], oauth_token: str,
+                   host: Optional[str] = None, port: Optional[int] = None,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+        conn = self.connection(device_id, oauth_token, host, port)
+        return await conn.send(payload, timeout=timeout)
+
+    def status(self) -> list:
+        return [conn.status() for conn in self._connections.values()]
+
+    async def stop(self) -> None:
+        connections, self._connections = self._connections, {}
+        for conn in connections.values():
+            await conn.stop()
+
+
+station_client = StationClient()
@@ -0,0 +1,67 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from services.cache_sync import cache_sync
+from settings import settings
+
+
+def hash_token(token: str) -> str:
+    """SHA-256 bearer-токена — так он хранится в user_tokens.access_token_hash"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """Ограниченный TTL/LRU кэш проверенных bearer-токенов.
+
+    Ключ — SHA-256 токена, значение — ``user_id``. Открытые токены в
+    кэше не хранятся.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[token_hash]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token_hash: str, user_id: str) -> None:
+        with self._lock:
+            self._entries[token_hash] = (user_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for key in [k for k, (uid, _) in self._entries.items() if uid == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(
+    maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl
+)
+# токен отозван в другом воркере: проверенные токены перепроверяются по БД
+cache_sync.on_change("tokens", token_cache.clear)
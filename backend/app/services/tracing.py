@@ -0,0 +1,207 @@
+import contextvars
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from settings import settings
+
+
+class Span:
+    __slots__ = ("name", "parent", "start", "end", "attrs")
+
+    def __init__(self, name: str, parent: int, start: float,
+                 attrs: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+
+class Trace:
+    """Один запрос: плоский список span-ов со ссылкой на родителя"""
+
+    __slots__ = ("trace_id", "name", "started_at", "t0", "spans", "dropped")
+
+    def __init__(self, trace_id: str, name: str) -> None:
+        self.trace_id = trace_id
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def add(self, name: str, parent: int, start: float,
+            attrs: Optional[Dict[str, Any]] = None) -> int:
+        if len(self.spans) >= settings.trace_max_spans:
+            self.dropped += 1
+            return -1
+        self.spans.append(Span(name, parent, start, attrs))
+        return len(self.spans) - 1
+
+    def as_dict(self) -> dict:
+        ends = [s.end for s in self.spans if s.end is not None]
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((max(ends) - self.t0) * 1000, 3) if ends else None,
+            "dropped_spans": self.dropped,
+            "spans": [
+                {
+                    "id": index,
+                    "parent": span.parent if span.parent >= 0 else None,
+                    "name": span.name,
+                    "start_ms": round((span.start - self.t0) * 1000, 3),
+                    "duration_ms": (
+                        round((span.end - span.start) * 1000, 3)
+                        if span.end is not None else None
+                    ),
+                    **({"attrs": span.attrs} if span.attrs else {}),
+                }
+                for index, span in enumerate(self.spans)
+            ],
+        }
+
+
+# (трассировка, индекс текущего span-а) в контексте задачи
+_current: contextvars.ContextVar[Optional[Tuple[Trace, int]]] = contextvars.ContextVar(
+    "trace", default=None
+)
+
+
+class Tracer:
+    """Лёгкая трассировка запросов с кольцевым буфером последних трасс.
+
+    Трасса начинается на HTTP-запросе провайдера (id — ``X-Request-Id``)
+    или на invoke из MQTT с ``traceId`` в payload и живёт в contextvar,
+    так что вложенные ``span()`` — БД, публикация, ожидание в очереди,
+    выполнение действия — находят её без передачи аргументов. Вне
+    трассы ``span()`` ничего не делает.
+    """
+
+    def __init__(self, size: int = 200) -> None:
+        self.size = size
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+
+    @staticmethod
+    def current_id() -> Optional[str]:
+        current = _current.get()
+        return current[0].trace_id if current else None
+
+    def start(self, name: str, trace_id: Optional[str] = None,
+              **attrs: Any) -> "_SpanScope":
+        """Корневой span; с тем же ``trace_id`` дописывает в уже идущую трассу"""
+        trace_id = trace_id or uuid.uuid4().hex
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = self._traces[trace_id] = Trace(trace_id, name)
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+        else:
+            self._traces.move_to_end(trace_id)
+        return _SpanScope(trace, -1, name, attrs)
+
+    def span(self, name: str, **attrs: Any) -> "_SpanScope":
+        current = _current.get()
+        if current is None:
+            return _NOOP
+        return _SpanScope(current[0], current[1], name, attrs)
+
+    def record(self, name: str, start: float, end: float, **attrs: Any) -> None:
+        """Span, измеренный снаружи (например, ожидание в очереди до начала трассы)"""
+        current = _current.get()
+        if current is None:
+            return
+        trace, parent = current
+        index = trace.add(name, parent, start, attrs or None)
+        if index >= 0:
+            trace.spans[index].end = end
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        traces = list(self._traces.values())[-limit:]
+        return [trace.as_dict() for trace in reversed(traces)]
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        trace = self._traces.get(trace_id)
+        return trace.as_dict() if trace else None
+
+
+class _SpanScope:
+    __slots__ = ("trace", "parent", "name", "attrs", "index", "token")
+
+    def __init__(self, trace: Trace, parent: int, name: str,
+                 attrs: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs or None
+        self.index = -1
+        self.token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def __enter__(self) -> "_SpanScope":
+        started = time.perf_counter()
+        self.index = self.trace.add(self.name, self.parent, started, self.attrs)
+        if self.index >= 0:
+            self.token = _current.set((self.trace, self.index))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.index < 0:
+            return
+        span = self.trace.spans[self.index]
+        span.end = time.perf_counter()
+        if exc_type is not None:
+            span.attrs = {**(span.attrs or {}), "error": exc_type.__name__}
+        _current.reset(self.token)
+
+
+class _NoopScope:
+    trace_id = None
+
+    def __enter__(self) -> "_NoopScope":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP = _NoopScope()
+
+tracer = Tracer(size=settings.trace_buffer_size)
+
+
+class TracingMiddleware:
+    """Трасса на каждый запрос с путём из ``Settings.trace_paths``"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.prefixes = tuple(settings.trace_paths)
+
+    async def __call__(self, scope, receive, send) -> None:
+        traced = scope["type"] == "http" and settings.trace_enabled
+        if not traced or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        name = f'{scope["method"]} {scope["path"]}'
+        for key, value in scope["headers"]:
+            if key == b"x-request-id":
+                with tracer.start(name, trace_id=value.decode("latin-1")):
+                    await self.app(scope, receive, send)
+                return
+
+        # без X-Request-Id id трассы возвращается в ответе
+        with tracer.start(name) as root:
+            header = (b"x-request-id", root.trace_id.encode())
+
+            async def send_wrapper(message) -> None:
+                if message["type"] == "http.response.start":
+                    message["headers"] = [*message.get("headers", ()), header]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
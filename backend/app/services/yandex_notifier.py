@@ -0,0 +1,187 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from models.user_token import UserToken
+from services.cache_sync import cache_sync
+from services.http_clients import http_clients
+from services.state_store import state_store
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _RateLimiter:
+    """Не чаще ``rate`` запросов в секунду"""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+
+    async def acquire(self) -> None:
+        if not self._interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_at)
+        self._next_at = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class YandexNotifier:
+    """Уведомления Яндекса об изменениях через callback API навыка.
+
+    Изменения состояния (из MQTT и выполненных действий, через
+    ``state_store``) копятся ``yandex_push_window`` секунд; повторные
+    значения одной capability схлопываются в последнее. Затем всё
+    уходит пачками в ``/callback/state``. Изменение списка устройств
+    отправляет ``/callback/discovery``, но не чаще, чем раз в
+    ``yandex_discovery_debounce`` секунд после последнего изменения.
+
+    Работает только у лидера. Состояние до него доходит через
+    ``y2m/devices/+/state``, который читают все воркеры, а изменения
+    списка устройств в других воркерах — через ``cache_sync``.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, Dict[Tuple[str, str], Any]] = {}
+        self._wake = asyncio.Event()
+        self._discovery_at: Optional[float] = None
+        self._discovery_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._limiter = _RateLimiter(settings.yandex_push_rate)
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.yandex_skill_id and settings.yandex_callback_token)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending_devices": len(self._pending),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+    def state_changed(self, device_id: int, cap_type: str, instance: str,
+                      value: Any) -> None:
+        if not self._task or not self.enabled:
+            return
+        self._pending.setdefault(str(device_id), {})[(cap_type, instance)] = value
+        self._wake.set()
+
+    def devices_changed(self) -> None:
+        if not self._task or not self.enabled:
+            return
+        self._discovery_at = time.monotonic() + settings.yandex_discovery_debounce
+        if self._discovery_task is None or self._discovery_task.done():
+            self._discovery_task = asyncio.create_task(self._discovery_loop())
+
+    async def _user_ids(self) -> List[str]:
+        return await UserToken.filter(provider="yandex").distinct().values_list(
+            "user_id", flat=True
+        )
+
+    async def _post(self, path: str, body: dict) -> bool:
+        client = http_clients.get("yandex_dialogs")
+        headers = {"Authorization": f"OAuth {settings.yandex_callback_token}"}
+        url = f"/api/v1/skills/{settings.yandex_skill_id}/callback/{path}"
+        delay = 0.5
+        for attempt in range(settings.yandex_push_retries + 1):
+            await self._limiter.acquire()
+            try:
+                resp = await client.post(url, json=body, headers=headers)
+            except httpx.HTTPError as exc:
+                error = str(exc) or exc.__class__.__name__
+            else:
+                if resp.status_code < 300:
+                    self.sent += 1
+                    return True
+                error = f"{resp.status_code} {resp.text[:200]}"
+                if resp.status_code not in _RETRY_STATUSES:
+                    break
+            if attempt < settings.yandex_push_retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+        self.failed += 1
+        logger.warning("Yandex callback %s failed: %s", path, error)
+        return False
+
+    async def flush(self) -> None:
+        """Отправляет накопленные изменения состояния"""
+        pending, self._pending = self._pending, {}
+        if not pending or not self.enabled:
+            return
+        devices = [
+            {
+                "id": device_id,
+                "capabilities": [
+                    {"type": cap_type, "state": {"instance": instance, "value": value}}
+                    for (cap_type, instance), value in caps.items()
+                ],
+            }
+            for device_id, caps in pending.items()
+        ]
+        user_ids = await self._user_ids()
+        size = max(1, settings.yandex_push_batch)
+        for user_id in user_ids:
+            for i in range(0, len(devices), size):
+                await self._post("state", {
+                    "ts": time.time(),
+                    "payload": {"user_id": user_id, "devices": devices[i:i + size]},
+                })
+
+    async def _discovery_loop(self) -> None:
+        while self._discovery_at is not None:
+            delay = self._discovery_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._discovery_at = None
+            try:
+                for user_id in await self._user_ids():
+                    body = {"ts": time.time(), "payload": {"user_id": user_id}}
+                    await self._post("discovery", body)
+            except Exception as exc:
+                logger.exception("Yandex discovery callback failed: %s", exc)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            # окно, в котором изменения одного устройства схлопываются
+            await asyncio.sleep(settings.yandex_push_window)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.exception("Yandex state callback failed: %s", exc)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        state_store.subscribe(self.state_changed)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, self._discovery_task) if t]
+        self._task = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+        with contextlib.suppress(Exception):
+            await self.flush()
+
+
+yandex_notifier = YandexNotifier()
+cache_sync.on_change("discovery", yandex_notifier.devices_changed)
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest_asyncio
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# модули приложения импортируются от app/, fake-серверы лежат в backend/
+sys.path[:0] = [APP_DIR, os.path.dirname(APP_DIR)]
+os.environ.setdefault("DATABASE_URL", "sqlite://:memory:")
+
+
+@pytest_asyncio.fixture
+async def db():
+    from db import close_db, init_db
+
+    await init_db()
+    yield
+    await close_db()
+
+
+TOKEN = "test-bearer-token"
+
+
+@pytest_asyncio.fixture
+async def api(db):
+    """Клиент приложения (как в main) с пользователем провайдера и пустым парком"""
+    import hashlib
+
+    import httpx
+    from fastapi import FastAPI
+
+    from models.binding import Binding
+    from models.device import Device
+    from models.user_token import UserToken
+    from routes import api_router
+    from services.binding_registry import binding_registry
+    from services.token_cache import token_cache
+    from services.tracing import TracingMiddleware
+
+    await Binding.all().delete()
+    await Device.all().delete()
+    await UserToken.all().delete()
+    await UserToken.create(
+        user_id="u1",
+        provider="yandex",
+        access_token="secret",
+        access_token_hash=hashlib.sha256(TOKEN.encode()).hexdigest(),
+    )
+    token_cache.clear()
+    binding_registry.invalidate()
+
+    app = FastAPI()
+    app.include_router(api_router)
+    app.add_middleware(TracingMiddleware)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        client.headers["Authorization"] = f"Bearer {TOKEN}"
+        yield client
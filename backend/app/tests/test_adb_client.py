@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from fake_adb_server import FakeADBServer
+from services.adb_client import ADBClient, ADBError
+
+SERIAL = "10.0.0.1:5555"
+
+
+@pytest_asyncio.fixture
+async def server():
+    server = await FakeADBServer().start()
+    server.set_state(SERIAL, "device")
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture
+async def legacy_server():
+    server = await FakeADBServer(shell_v2=False).start()
+    server.set_state(SERIAL, "device")
+    yield server
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_host_commands(server):
+    client = ADBClient(port=server.port)
+    assert await client.version() == 41
+    assert await client.connect("10.0.0.2", 5555) == "connected to 10.0.0.2:5555"
+    assert await client.devices() == [(SERIAL, "device"), ("10.0.0.2:5555", "device")]
+
+    server.unreachable.add("10.0.0.3:5555")
+    with pytest.raises(ADBError, match="Connection refused"):
+        await client.connect("10.0.0.3", 5555)
+
+
+@pytest.mark.asyncio
+async def test_shell_v2_returns_output_and_exit_code(server):
+    client = ADBClient(port=server.port)
+    assert await client.shell(SERIAL, "echo hello") == (0, "hello\n", "")
+    assert await client.shell(SERIAL, "exit 3") == (3, "", "")
+    assert server.commands == [(SERIAL, "echo hello"), (SERIAL, "exit 3")]
+
+
+@pytest.mark.asyncio
+async def test_shell_falls_back_to_v1(legacy_server):
+    client = ADBClient(port=legacy_server.port)
+    assert await client.shell(SERIAL, "echo hello") == (0, "hello\n", "")
+    # у shell v1 нет кода возврата
+    assert await client.shell(SERIAL, "exit 3") == (0, "", "")
+
+
+@pytest.mark.asyncio
+async def test_device_error_is_not_retried_over_v1(server):
+    client = ADBClient(port=server.port)
+    with pytest.raises(ADBError, match="not found"):
+        await client.shell("10.0.0.9:5555", "echo hello")
+    assert server.commands == []
+
+
+@pytest.mark.asyncio
+async def test_track_devices_streams_changes(server):
+    client = ADBClient(port=server.port)
+    updates = client.track_devices()
+    assert await updates.__anext__() == [(SERIAL, "device")]
+    server.set_state(SERIAL, "offline")
+    assert await asyncio.wait_for(updates.__anext__(), 1.0) == [(SERIAL, "offline")]
+    await updates.aclose()
+
+
+@pytest.mark.asyncio
+async def test_starts_adb_server_when_refused(monkeypatch):
+    started = []
+    servers = []
+    client = ADBClient(port=0)
+
+    class Process:
+        async def wait(self):
+            return 0
+
+    async def fake_exec(*argv, **kwargs):
+        started.append(argv)
+        servers.append(await FakeADBServer(port=client.port).start())
+        return Process()
+
+    # свободный порт, на котором ещё никто не слушает
+    probe = await FakeADBServer().start()
+    client.port = probe.port
+    await probe.stop()
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    assert await client.version() == 41
+    assert started == [("adb", "-P", str(client.port), "start-server")]
+    # сервер уже запущен: второй раз adb не вызывается
+    assert await client.version() == 41
+    assert len(started) == 1
+    await servers[0].stop()
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from fake_adb_server import FakeADBServer
+from services.adb_client import ADBClient, ADBError
+from services.adb_shell import ShellSession, ShellSessionManager
+
+SERIAL = "10.0.0.1:5555"
+
+
+async def start_server(**kwargs):
+    server = await FakeADBServer(**kwargs).start()
+    server.set_state(SERIAL, "device")
+    return server
+
+
+@pytest_asyncio.fixture(params=[False, True], ids=["single", "batch"])
+async def shell(request):
+    server = await start_server()
+    manager = ShellSessionManager(ADBClient(port=server.port), batch=request.param)
+    yield server, manager
+    await manager.stop()
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_output_and_exit_code(shell):
+    server, manager = shell
+    assert await manager.run(SERIAL, "echo hello") == (0, "hello\n", "")
+    assert await manager.run(SERIAL, "printf abc") == (0, "abc", "")
+    assert await manager.run(SERIAL, "sh -c 'exit 3'") == (3, "", "")
+    assert await manager.run(SERIAL, "echo oops >&2; false") == (1, "oops\n", "")
+    assert server.sessions_opened == 1
+
+
+@pytest.mark.asyncio
+async def test_output_containing_blank_lines(shell):
+    _, manager = shell
+    assert await manager.run(SERIAL, "printf 'a\\n\\nb\\n\\n'") == (0, "a\n\nb\n\n", "")
+
+
+@pytest.mark.asyncio
+async def test_command_ending_in_comment(shell):
+    _, manager = shell
+    result = await manager.run(SERIAL, "echo hello # comment", timeout=2)
+    assert result == (0, "hello\n", "")
+    assert await manager.run(SERIAL, "echo next", timeout=2) == (0, "next\n", "")
+
+
+@pytest.mark.asyncio
+async def test_pipelined_commands_get_their_own_output(shell):
+    server, manager = shell
+    commands = [manager.run(SERIAL, f"echo {i}") for i in range(20)]
+    results = await asyncio.gather(*commands)
+    assert results == [(0, f"{i}\n", "") for i in range(20)]
+    assert server.sessions_opened == 1
+
+
+@pytest.mark.asyncio
+async def test_session_reopens_after_exit(shell):
+    server, manager = shell
+    with pytest.raises(Exception):
+        await manager.run(SERIAL, "exit 0", timeout=2)
+    assert await manager.run(SERIAL, "echo again") == (0, "again\n", "")
+    assert server.sessions_opened == 2
+
+
+@pytest.mark.asyncio
+async def test_queued_batch_fails_when_session_is_gone():
+    server = await start_server()
+    session = ShellSession(ADBClient(port=server.port), SERIAL, batch=True)
+    await session.open()
+    await session.close()
+    commands = len(server.commands)
+
+    # команда попала в очередь пакета, а поток закрылся до отправки
+    future = asyncio.get_running_loop().create_future()
+    session._pending[b"sentinel"] = future
+    session._outbox.append((b"sentinel", b"echo late"))
+    session._flush()
+    try:
+        with pytest.raises(ADBError):
+            await asyncio.wait_for(future, 1)
+        assert session._pending == {} and session._outbox == []
+        assert len(server.commands) == commands
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_one_shot_without_shell_v2():
+    server = await start_server(shell_v2=False)
+    manager = ShellSessionManager(ADBClient(port=server.port))
+    try:
+        assert await manager.run(SERIAL, "echo hello") == (0, "hello\n", "")
+        assert manager.stats() == {"sessions": 0, "one_shot": 1}
+    finally:
+        await manager.stop()
+        await server.stop()
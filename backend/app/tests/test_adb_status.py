@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from services.adb_pool import ADBPool, adb_pool
+from services.kv_store import adb_status
+from services.leader import leader
+
+
+@pytest.mark.asyncio
+async def test_follower_reads_status_published_by_leader(api, monkeypatch):
+    monkeypatch.setattr(leader, "role", "follower")
+    response = await api.get("/api/adb/status")
+    assert response.json()["devices"] is None
+
+    pool = ADBPool()
+    # пул лидера без фонового прохода: публикуем его состояние вручную
+    pool._stop_event = asyncio.Event()
+    pool._entry("10.0.0.1:5555").state = "online"
+    await pool.publish()
+    body = (await api.get("/api/adb/status")).json()
+    assert body["leader"] is False
+    assert [d["serial"] for d in body["devices"]] == ["10.0.0.1:5555"]
+    assert body["devices"][0]["state"] == "online"
+
+    await pool.stop()
+    # снятый с лидерства пул убирает свой снимок
+    assert await adb_status.get("pool") is None
+
+
+@pytest.mark.asyncio
+async def test_leader_answers_from_its_own_pool(api, monkeypatch):
+    monkeypatch.setattr(leader, "role", "leader")
+    monkeypatch.setattr(adb_pool, "_status", {})
+    adb_pool._entry("10.0.0.2:5555")
+    body = (await api.get("/api/adb/status")).json()
+    assert body["leader"] is True
+    assert body["devices"][0]["serial"] == "10.0.0.2:5555"
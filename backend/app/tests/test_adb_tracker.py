@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from fake_adb_server import FakeADBServer
+from modules.actions import adb as adb_action
+from modules.actions.adb import ADBAction
+from services.adb_client import ADBClient
+from services.adb_tracker import ADBTracker
+
+SERIAL = "10.0.0.1:5555"
+
+
+async def eventually(check, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not check():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest_asyncio.fixture
+async def tracked():
+    server = await FakeADBServer().start()
+    server.set_state(SERIAL, "device")
+    tracker = ADBTracker(ADBClient(port=server.port))
+    await tracker.start()
+    await eventually(lambda: tracker.live)
+    yield server, tracker
+    await tracker.stop()
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_offline_as_soon_as_device_drops(tracked):
+    server, tracker = tracked
+    assert not tracker.is_offline(SERIAL)
+    assert tracker.is_offline("10.0.0.9:5555")
+
+    server.set_state(SERIAL, "offline")
+    await eventually(lambda: tracker.is_offline(SERIAL))
+    server.set_state(SERIAL, "device")
+    await eventually(lambda: not tracker.is_offline(SERIAL))
+
+
+@pytest.mark.asyncio
+async def test_unsubscribed_listener_is_not_called(tracked):
+    server, tracker = tracked
+    calls = []
+    tracker.subscribe(calls.append)
+    server.set_state("10.0.0.2:5555", "device")
+    await eventually(lambda: calls)
+
+    tracker.unsubscribe(calls.append)
+    count = len(calls)
+    server.set_state("10.0.0.2:5555", None)
+    await eventually(lambda: "10.0.0.2:5555" not in tracker.snapshot())
+    assert len(calls) == count
+    # карта остаётся живой и без подписчиков
+    assert tracker.live
+
+
+@pytest.mark.asyncio
+async def test_action_fails_fast_for_offline_device(tracked, monkeypatch):
+    server, tracker = tracked
+    monkeypatch.setattr(adb_action, "adb_tracker", tracker)
+    server.set_state(SERIAL, "offline")
+    await eventually(lambda: tracker.is_offline(SERIAL))
+
+    host, port = SERIAL.split(":")
+    payload = {"host": host, "port": int(port), "command": "echo hi"}
+    result = await asyncio.wait_for(ADBAction().execute(payload), 0.5)
+    assert result == {"ok": False, "error": f"device {SERIAL} is offline"}
+    assert server.commands == []
+
+
+@pytest.mark.asyncio
+async def test_stopped_tracker_blocks_nothing(tracked):
+    _, tracker = tracked
+    await tracker.stop()
+    assert not tracker.live
+    assert not tracker.is_offline("10.0.0.9:5555")
@@ -0,0 +1,72 @@
+import pytest
+import pytest_asyncio
+
+from models.cache_generation import CacheGeneration
+from services.cache_sync import CacheSync, cache_sync
+from services.token_cache import token_cache
+
+
+@pytest_asyncio.fixture
+async def clean(db):
+    await CacheGeneration.all().delete()
+    yield
+    await cache_sync.stop()
+
+
+@pytest.mark.asyncio
+async def test_remote_bump_runs_handlers(clean):
+    local, remote = CacheSync(), CacheSync()
+    calls = []
+    local.on_change("discovery", lambda: calls.append("discovery"))
+    local.on_change("bindings", lambda: calls.append("bindings"))
+    await local.start()
+    await remote.start()
+
+    await remote.bump("discovery")
+    await local.poll()
+    assert calls == ["discovery"]
+
+    # повторный опрос без новых изменений ничего не сбрасывает
+    await local.poll()
+    assert calls == ["discovery"]
+    await local.stop()
+    await remote.stop()
+
+
+@pytest.mark.asyncio
+async def test_own_bump_is_not_replayed(clean):
+    sync = CacheSync()
+    calls = []
+    sync.on_change("bindings", lambda: calls.append("bindings"))
+    await sync.start()
+    await sync.bump("bindings")
+    await sync.poll()
+    assert calls == []
+    await sync.stop()
+
+
+@pytest.mark.asyncio
+async def test_async_handler_is_awaited(clean):
+    local, remote = CacheSync(), CacheSync()
+    calls = []
+
+    async def handler():
+        calls.append("tokens")
+
+    local.on_change("tokens", handler)
+    await local.start()
+    await remote.bump("tokens")
+    await local.poll()
+    assert calls == ["tokens"]
+    await local.stop()
+
+
+@pytest.mark.asyncio
+async def test_token_revoked_in_other_worker_is_dropped(clean):
+    await cache_sync.start()
+    token_cache.put("hash", "user-1")
+    assert token_cache.get("hash") == "user-1"
+
+    await CacheSync().bump("tokens")
+    await cache_sync.poll()
+    assert token_cache.get("hash") is None
@@ -0,0 +1,74 @@
+import pytest
+from cryptography.fernet import Fernet
+
+from models.user_token import UserToken
+from services.crypto import decrypt, encrypt, rotate
+from services.provider_tokens import ProviderTokens
+from settings import settings
+
+OLD = Fernet.generate_key().decode()
+NEW = Fernet.generate_key().decode()
+
+
+def use_keys(monkeypatch, *keys):
+    monkeypatch.setattr(settings, "y2m_enc_key", ",".join(keys))
+
+
+def test_old_key_still_decrypts_after_rotation(monkeypatch):
+    use_keys(monkeypatch, OLD)
+    token = encrypt("secret")
+    assert token != "secret"
+
+    use_keys(monkeypatch, NEW, OLD)
+    assert decrypt(token) == "secret"
+    # новые значения шифруются основным ключом
+    fresh = encrypt("other")
+    use_keys(monkeypatch, NEW)
+    assert decrypt(fresh) == "other"
+
+
+def test_rotate_reencrypts_with_primary_key(monkeypatch):
+    use_keys(monkeypatch, OLD)
+    token = encrypt("secret")
+
+    use_keys(monkeypatch, NEW, OLD)
+    rotated = rotate(token)
+    assert rotated is not None and rotated != token
+    assert rotate(rotated) is None
+
+    use_keys(monkeypatch, NEW)
+    assert decrypt(rotated) == "secret"
+
+
+def test_nothing_to_rotate(monkeypatch):
+    use_keys(monkeypatch, NEW)
+    assert rotate(encrypt("secret")) is None  # один ключ
+
+    use_keys(monkeypatch, NEW, OLD)
+    assert rotate("plain text") is None
+    assert decrypt("plain text") == "plain text"
+
+
+def test_without_keys_values_stay_plain(monkeypatch):
+    monkeypatch.setattr(settings, "y2m_enc_key", None)
+    assert encrypt("secret") == "secret"
+    assert decrypt("secret") == "secret"
+
+
+@pytest.mark.asyncio
+async def test_reencrypt_moves_stored_tokens_to_primary_key(db, monkeypatch):
+    use_keys(monkeypatch, OLD)
+    await UserToken.all().delete()
+    await UserToken.create(
+        user_id="u1", provider="yandex",
+        access_token=encrypt("access"), refresh_token=encrypt("refresh"),
+    )
+
+    use_keys(monkeypatch, NEW, OLD)
+    assert await ProviderTokens().reencrypt() == 2
+    assert await ProviderTokens().reencrypt() == 0
+
+    use_keys(monkeypatch, NEW)
+    row = await UserToken.get(user_id="u1")
+    assert decrypt(row.access_token) == "access"
+    assert decrypt(row.refresh_token) == "refresh"
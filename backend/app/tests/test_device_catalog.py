@@ -0,0 +1,62 @@
+import json
+import os
+
+from services.device_catalog import DEFAULT_CAPABILITIES, DeviceCatalog
+
+LIGHT = "devices.types.light"
+ON_OFF = "devices.capabilities.on_off"
+RANGE = "devices.capabilities.range"
+
+
+def write(path, capabilities, mtime):
+    types = [{"type": LIGHT, "capabilities": capabilities}]
+    path.write_text(json.dumps({"types": types}), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def catalog_at(tmp_path):
+    return tmp_path / "types.json", DeviceCatalog(tmp_path / "types.json", 0.0)
+
+
+def test_reloads_when_mtime_changes(tmp_path):
+    path, catalog = catalog_at(tmp_path)
+    write(path, [{"type": ON_OFF}], mtime=1000)
+    assert [c.type for c in catalog.capabilities(LIGHT)] == [ON_OFF]
+    assert catalog.version == 1000
+
+    brightness = {"type": RANGE, "instances": [{"function": "brightness"}]}
+    write(path, [{"type": ON_OFF}, brightness], mtime=2000)
+    capabilities = catalog.capabilities(LIGHT)
+    assert [c.type for c in capabilities] == [ON_OFF, RANGE]
+    assert capabilities[1].parameters["instance"] == "brightness"
+    assert catalog.version == 2000
+
+
+def test_same_mtime_is_not_reread(tmp_path):
+    path, catalog = catalog_at(tmp_path)
+    write(path, [{"type": ON_OFF}], mtime=1000)
+    first = catalog.capabilities(LIGHT)
+
+    write(path, [{"type": RANGE}], mtime=1000)
+    assert catalog.capabilities(LIGHT) is first
+
+
+def test_broken_json_keeps_last_good_index(tmp_path):
+    path, catalog = catalog_at(tmp_path)
+    write(path, [{"type": ON_OFF}], mtime=1000)
+    good = catalog.capabilities(LIGHT)
+
+    path.write_text('{"types": [', encoding="utf-8")
+    os.utime(path, (2000, 2000))
+    assert catalog.capabilities(LIGHT) is good
+    assert catalog.version == 1000
+
+    # исправленный файл подхватывается на следующей проверке
+    write(path, [{"type": RANGE}], mtime=3000)
+    assert [c.type for c in catalog.capabilities(LIGHT)] == [RANGE]
+
+
+def test_missing_file_falls_back_to_defaults(tmp_path):
+    _, catalog = catalog_at(tmp_path)
+    assert catalog.capabilities(LIGHT) == DEFAULT_CAPABILITIES
+    assert catalog.raw() == {"types": []}
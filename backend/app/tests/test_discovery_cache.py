@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from models.device import Device
+from services.device_catalog import DeviceCatalog
+from services.discovery_cache import DiscoveryCache, discovery_cache
+
+LIGHT = "devices.types.light"
+
+
+def test_bump_drops_cached_payloads():
+    cache = DiscoveryCache()
+    key = (cache.generation, 1000.0)
+    body = cache.put("u1", key, {"devices": []})
+    assert cache.get("u1", key) == body
+
+    cache.bump()
+    assert cache.get("u1", key) is None
+    assert cache.get("u1", (cache.generation, 1000.0)) is None
+
+
+def test_catalog_version_is_part_of_the_key():
+    cache = DiscoveryCache()
+    cache.put("u1", (cache.generation, 1000.0), {"devices": []})
+    assert cache.get("u1", (cache.generation, 2000.0)) is None
+
+
+def test_payload_built_before_bump_is_not_stored():
+    cache = DiscoveryCache()
+    stale = (cache.generation, 1000.0)
+    cache.bump()
+    cache.put("u1", stale, {"devices": []})
+    assert cache.get("u1", stale) is None
+    assert cache.get("u1", (cache.generation, 1000.0)) is None
+
+
+def test_render_wraps_payload_with_request_id():
+    body = DiscoveryCache().put("u1", (1, 0.0), {"user_id": "u1", "devices": []})
+    rendered = json.loads(DiscoveryCache.render('req "1"', body))
+    assert rendered == {
+        "request_id": 'req "1"', "payload": {"user_id": "u1", "devices": []},
+    }
+
+
+async def device_names(api):
+    response = await api.get("/v1.0/user/devices")
+    return [d["name"] for d in response.json()["payload"]["devices"]]
+
+
+@pytest.mark.asyncio
+async def test_device_change_invalidates_discovery(api):
+    discovery_cache.bump()
+    await Device.create(name="lamp", yandex_type=LIGHT)
+    assert await device_names(api) == ["lamp"]
+
+    # запись в обход API кэш не сбрасывает
+    await Device.create(name="hidden", yandex_type=LIGHT)
+    assert await device_names(api) == ["lamp"]
+
+    response = await api.post("/api/devices", json={"name": "tv", "yandex_type": LIGHT})
+    assert response.status_code == 200
+    assert await device_names(api) == ["lamp", "hidden", "tv"]
+
+
+@pytest.mark.asyncio
+async def test_catalog_reload_invalidates_discovery(api, monkeypatch):
+    discovery_cache.bump()
+    await Device.create(name="lamp", yandex_type=LIGHT)
+    assert await device_names(api) == ["lamp"]
+    await Device.create(name="tv", yandex_type=LIGHT)
+
+    monkeypatch.setattr(DeviceCatalog, "version", property(lambda self: -1.0))
+    assert await device_names(api) == ["lamp", "tv"]
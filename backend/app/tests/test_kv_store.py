@@ -0,0 +1,67 @@
+import pytest
+
+from services import kv_store as kv_store_module
+from services.kv_store import DBKVStore, MemoryKVStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(kv_store_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.asyncio
+async def test_memory_values_expire_after_ttl(clock):
+    store = MemoryKVStore("test", ttl=10.0, maxsize=100)
+    await store.set("a", 1)
+    await store.set("b", 2, ttl=30.0)
+    assert await store.items() == {"a": 1, "b": 2}
+
+    clock[0] += 10.0
+    assert await store.get("a") is None
+    assert await store.pop("a") is None
+    assert await store.items() == {"b": 2}
+
+    clock[0] += 20.0
+    assert await store.get("b") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_overwrite_leaves_no_stale_heap_entries(clock):
+    store = MemoryKVStore("test", ttl=60.0, maxsize=100)
+    for i in range(1000):
+        await store.set("a", i)
+        clock[0] += 0.01
+    assert await store.get("a") == 999
+    assert len(store) == 1
+    assert len(store._heap) <= 2 * len(store) + 16
+
+    # старый срок перезаписанного ключа не удаляет свежее значение
+    clock[0] += 55.0
+    await store.set("b", "x")
+    assert await store.get("a") == 999
+
+
+@pytest.mark.asyncio
+async def test_memory_full_store_evicts_earliest_expiry(clock):
+    store = MemoryKVStore("test", ttl=60.0, maxsize=2)
+    await store.set("long", 1, ttl=100.0)
+    await store.set("short", 2, ttl=10.0)
+    await store.set("new", 3)
+    assert await store.items() == {"long": 1, "new": 3}
+
+
+@pytest.mark.asyncio
+async def test_db_values_expire_and_are_swept(db, clock):
+    store = DBKVStore("test", ttl=10.0, maxsize=100)
+    await store.set("a", {"v": 1})
+    await store.set("b", {"v": 2}, ttl=30.0)
+    assert await store.get("a") == {"v": 1}
+
+    clock[0] += 10.0
+    assert await store.get("a") is None
+    assert await store.items() == {"b": {"v": 2}}
+    assert await store.sweep() == 1
+    assert await store.pop("b") == {"v": 2}
+    assert await store.pop("b") is None
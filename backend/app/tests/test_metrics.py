@@ -0,0 +1,77 @@
+import pytest
+
+from services.metrics import MetricsRegistry
+
+
+def test_counter_and_gauge_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "Requests", ("method", "code"))
+    requests.labels("GET", 200).inc()
+    requests.labels("GET", 200).inc(2)
+    requests.labels("POST", 500).inc(0.5)
+    queue = registry.gauge("app_queue", "Queue size")
+    queue.set(7)
+    queue.dec()
+
+    assert registry.render() == (
+        "# HELP app_requests_total Requests\n"
+        "# TYPE app_requests_total counter\n"
+        'app_requests_total{method="GET",code="200"} 3\n'
+        'app_requests_total{method="POST",code="500"} 0.5\n'
+        "# HELP app_queue Queue size\n"
+        "# TYPE app_queue gauge\n"
+        "app_queue 6\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'app_latency_seconds_bucket{le="0.1"} 2',
+        'app_latency_seconds_bucket{le="1"} 3',
+        'app_latency_seconds_bucket{le="+Inf"} 4',
+        "app_latency_seconds_sum 3.65",
+        "app_latency_seconds_count 4",
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("app_errors_total", "Errors", ("error",)).labels('a "b"\\\n').inc()
+    assert 'app_errors_total{error="a \\"b\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_callbacks_and_failures_are_rendered():
+    registry = MetricsRegistry()
+    registry.callback("app_up", "Up", lambda: 1)
+    registry.callback(
+        "app_items", "Items by kind", lambda: [(("a",), 2), (("b",), 0.25)],
+        labels=("kind",),
+    )
+    registry.callback("app_broken", "Broken", lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+    assert "app_up 1" in lines
+    assert 'app_items{kind="a"} 2' in lines
+    assert 'app_items{kind="b"} 0.25' in lines
+    assert "# app_broken collection failed: division by zero" in lines
+
+
+def test_same_name_returns_the_registered_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("app_total", "Total")
+    assert registry.counter("app_total", "Total") is first
+    with pytest.raises(ValueError):
+        first.labels("unexpected")
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(api):
+    response = await api.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE y2m_leader gauge" in response.text
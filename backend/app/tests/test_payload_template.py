@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from services.payload_template import (
+    MQTTMessageTemplate, TemplateError, compile_template, validate_mqtt_config,
+)
+
+
+def render(source, **context):
+    return compile_template(source).render(context)
+
+
+def test_json_literals_outside_strings():
+    source = '{"on": {{value}}, "level": {{level}}, "name": {{name}}, "x": {{missing}}}'
+    out = render(source, value=True, level=50, name="Лампа")
+    assert json.loads(out) == {"on": True, "level": 50, "name": "Лампа", "x": None}
+    assert '"Лампа"' in out  # без \u-последовательностей
+
+
+def test_values_inside_json_strings_are_escaped():
+    source = '{"text": "say: {{text}}", "id": "{{device_id}}"}'
+    out = render(source, text='a "quoted"\\ line\nnext', device_id=7)
+    assert json.loads(out) == {"text": 'say: a "quoted"\\ line\nnext', "id": "7"}
+
+
+def test_escaped_quote_does_not_end_the_string():
+    out = render('{"text": "\\"{{text}}\\""}', text='x"y')
+    assert json.loads(out) == {"text": '"x"y"'}
+
+
+def test_plain_text_template_substitutes_as_is():
+    assert render("turn {{state}} {{missing}}", state='"on"') == 'turn "on" '
+    assert render("y2m/{{device_id}}/set", device_id=3) == "y2m/3/set"
+
+
+def test_types_and_transforms():
+    source = (
+        '{"b": {{brightness|scale:0:100:0:255|round}},'
+        ' "on": {{value:bool}}, "mode": "{{mode|map:heat=H,cool=C|upper}}"}'
+    )
+    out = render(source, brightness=50, value="on", mode="cool")
+    assert json.loads(out) == {"b": 128, "on": True, "mode": "C"}
+    assert render("{{value|default:off}}", value=None) == "off"
+
+
+@pytest.mark.parametrize("source", [
+    "{{1bad}}",
+    "{{value:complex}}",
+    "{{value|nope}}",
+    "{{value|scale:0:1}}",
+    "{{value|clamp:a:b}}",
+])
+def test_invalid_templates_are_rejected(source):
+    with pytest.raises(TemplateError):
+        compile_template(source)
+
+
+def test_bad_conversion_is_a_template_error():
+    with pytest.raises(TemplateError):
+        render("{{value:int}}", value="abc")
+
+
+def test_message_template_renders_every_topic():
+    template = MQTTMessageTemplate({
+        "topic": "home/{{device_id}}/set",
+        "payload": {"state": "{{value}}"},
+        "topics": {"home/log": "{{capability}}"},
+    })
+    messages = template.render({"device_id": 1, "value": "ON", "capability": "c"})
+    assert messages == [("home/1/set", '{"state": "ON"}'), ("home/log", "c")]
+
+    with pytest.raises(TemplateError):
+        validate_mqtt_config({"payload": "{}"})
@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from models.device import Device
+from routes import provider
+from routes.provider import ACTION_TIMEOUT_CODE, run_device_actions
+from settings import settings
+
+ON_OFF = "devices.capabilities.on_off"
+
+
+def capability(instance, value=True):
+    return {"type": ON_OFF, "state": {"instance": instance, "value": value}}
+
+
+def job(device_id, *instances):
+    capabilities = [capability(instance) for instance in instances]
+    return SimpleNamespace(id=device_id), capabilities, [None] * len(capabilities)
+
+
+@pytest.mark.asyncio
+async def test_capabilities_of_one_device_run_in_order(monkeypatch):
+    calls = []
+
+    async def execute(device, capability):
+        instance = capability["state"]["instance"]
+        calls.append((device.id, instance))
+        # первая команда медленнее второй: порядок держит не скорость
+        await asyncio.sleep(0.02 if instance == "first" else 0)
+        return {"type": ON_OFF, "state": {"instance": instance}}
+
+    monkeypatch.setattr(provider, "execute_device_action", execute)
+    jobs = [job(1, "first", "second", "third"), job(2, "first", "second")]
+    await run_device_actions(jobs, timeout=1.0)
+
+    assert [i for d, i in calls if d == 1] == ["first", "second", "third"]
+    assert [i for d, i in calls if d == 2] == ["first", "second"]
+    slots = jobs[0][2]
+    assert [s["state"]["instance"] for s in slots] == ["first", "second", "third"]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "action_concurrency", 2)
+    running = peak = 0
+
+    async def execute(device, capability):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"type": ON_OFF, "state": {"instance": "on"}}
+
+    monkeypatch.setattr(provider, "execute_device_action", execute)
+    jobs = [job(i, "on") for i in range(6)]
+    await run_device_actions(jobs, timeout=1.0)
+
+    assert peak == 2
+    assert all(slots[0] is not None for _, _, slots in jobs)
+
+
+@pytest.mark.asyncio
+async def test_unfinished_devices_report_timeout(api, monkeypatch):
+    monkeypatch.setattr(settings, "action_deadline", 0.1)
+    fast = await Device.create(name="fast", yandex_type="devices.types.light")
+    slow = await Device.create(name="slow", yandex_type="devices.types.light")
+
+    async def execute(device, capability):
+        if device.id == slow.id:
+            await asyncio.sleep(5)
+        instance = capability["state"]["instance"]
+        return {
+            "type": ON_OFF,
+            "state": {"instance": instance, "action_result": {"status": "ERROR"}},
+        }
+
+    monkeypatch.setattr(provider, "execute_device_action", execute)
+    body = {"devices": [
+        {"id": str(fast.id), "capabilities": [capability("on")]},
+        {"id": str(slow.id), "capabilities": [capability("on")]},
+    ]}
+    response = await asyncio.wait_for(
+        api.post("/v1.0/user/devices/action", json=body), 1.0
+    )
+    devices = response.json()["payload"]["devices"]
+
+    fast_result = devices[0]["capabilities"][0]["state"]["action_result"]
+    assert fast_result == {"status": "ERROR"}
+    slow_result = devices[1]["capabilities"][0]["state"]["action_result"]
+    assert slow_result["error_code"] == ACTION_TIMEOUT_CODE
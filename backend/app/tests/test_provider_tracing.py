@@ -0,0 +1,61 @@
+import json
+
+import pytest
+import pytest_asyncio
+
+from models.device import Device
+from services.mqtt_publisher import mqtt_publisher
+
+ON_OFF = "devices.capabilities.on_off"
+
+
+@pytest_asyncio.fixture
+async def published(monkeypatch):
+    messages = []
+
+    async def publish(topic, payload, **kwargs):
+        messages.append((topic, json.loads(payload)))
+
+    monkeypatch.setattr(mqtt_publisher, "publish", publish)
+    return messages
+
+
+def turn_on(device_id):
+    capability = {"type": ON_OFF, "state": {"instance": "on", "value": True}}
+    return {"devices": [{"id": str(device_id), "capabilities": [capability]}]}
+
+
+@pytest.mark.asyncio
+async def test_one_request_id_without_header(api, published):
+    device = await Device.create(name="lamp", yandex_type="devices.types.light")
+
+    response = await api.post("/v1.0/user/devices/action", json=turn_on(device.id))
+    request_id = response.json()["request_id"]
+    assert response.headers["x-request-id"] == request_id
+
+    trace = (await api.get(f"/api/traces/{request_id}")).json()
+    assert "state.publish" in [span["name"] for span in trace["spans"]]
+    assert published == [(
+        f"y2m/devices/{device.id}/state",
+        {"type": ON_OFF, "instance": "on", "value": True, "traceId": request_id},
+    )]
+
+
+@pytest.mark.asyncio
+async def test_yandex_request_id_reaches_state_message(api, published):
+    device = await Device.create(name="lamp", yandex_type="devices.types.light")
+
+    response = await api.post(
+        "/v1.0/user/devices/action",
+        json=turn_on(device.id),
+        headers={"X-Request-Id": "yandex-req-1"},
+    )
+    assert response.json()["request_id"] == "yandex-req-1"
+    assert (await api.get("/api/traces/yandex-req-1")).status_code == 200
+    assert published[0][1]["traceId"] == "yandex-req-1"
+
+
+@pytest.mark.asyncio
+async def test_discovery_request_id_matches_header(api):
+    response = await api.get("/v1.0/user/devices")
+    assert response.json()["request_id"] == response.headers["x-request-id"]
@@ -0,0 +1,163 @@
+import asyncio
+import datetime
+import ssl
+
+import pytest
+import pytest_asyncio
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from fake_station_server import FakeStationServer
+from services import station_client
+from services.station_client import StationConnection, StationError
+from settings import settings
+
+DEVICE_ID = "station-1"
+
+
+def self_signed(tmp_path, name):
+    """Самоподписанный сертификат, как у станции: (PEM, путь к cert, путь к key)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    cert_path, key_path = tmp_path / f"{name}.crt", tmp_path / f"{name}.key"
+    cert_path.write_text(pem)
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    return pem, cert_path, key_path
+
+
+class Cloud:
+    """Ответы glagol device_list/token вместо облака Яндекса"""
+
+    def __init__(self, port, tokens, certificate=None):
+        self.port = port
+        self.tokens = list(tokens)
+        self.certificate = certificate
+        self.token_requests = 0
+
+    async def fetch_station_info(self, device_id, oauth_token):
+        info = {
+            "id": device_id,
+            "platform": "yandexstation",
+            "networkInfo": {"ip_addresses": ["127.0.0.1"], "external_port": self.port},
+        }
+        if self.certificate:
+            info["glagol"] = {"security": {"server_certificate": self.certificate}}
+        return info
+
+    async def fetch_conversation_token(self, device_id, platform, oauth_token):
+        self.token_requests += 1
+        return self.tokens.pop(0) if len(self.tokens) > 1 else self.tokens[0]
+
+
+def use_cloud(monkeypatch, cloud):
+    monkeypatch.setattr(station_client, "fetch_station_info", cloud.fetch_station_info)
+    monkeypatch.setattr(
+        station_client, "fetch_conversation_token", cloud.fetch_conversation_token,
+    )
+
+
+@pytest_asyncio.fixture
+async def station(monkeypatch):
+    monkeypatch.setattr(settings, "station_tls", False)
+    server = await FakeStationServer(token="good").start()
+    conn = StationConnection(DEVICE_ID, "oauth")
+    yield server, conn
+    await conn.stop()
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_replies_are_matched_by_request_id(station, monkeypatch):
+    server, conn = station
+    use_cloud(monkeypatch, Cloud(server.port, ["good"]))
+
+    volumes = [round(0.1 * i, 1) for i in range(1, 9)]
+    replies = await asyncio.gather(*(
+        conn.send({"command": "setVolume", "volume": volume}) for volume in volumes
+    ))
+    # станция отвечает состоянием после своей команды
+    assert [reply["state"]["volume"] for reply in replies] == volumes
+    assert server.connections == 1
+    assert conn.status()["connected"]
+
+
+@pytest.mark.asyncio
+async def test_error_status_fails_only_that_command(station, monkeypatch):
+    server, conn = station
+    use_cloud(monkeypatch, Cloud(server.port, ["good"]))
+
+    bad, good = await asyncio.gather(
+        conn.send({"command": "selfDestruct"}),
+        conn.send({"command": "play"}),
+        return_exceptions=True,
+    )
+    assert isinstance(bad, StationError)
+    assert "UNSUPPORTED" in str(bad)
+    assert good["status"] == "SUCCESS"
+
+
+@pytest.mark.asyncio
+async def test_rejected_token_is_refreshed_and_command_retried(station, monkeypatch):
+    server, conn = station
+    cloud = Cloud(server.port, ["stale", "good"])
+    use_cloud(monkeypatch, cloud)
+
+    reply = await conn.send({"command": "play"}, timeout=5)
+    assert reply["status"] == "SUCCESS"
+    assert cloud.token_requests == 2
+    assert server.commands == [{"command": "play"}]
+    assert server.connections == 2
+
+
+@pytest.mark.asyncio
+async def test_tls_trusts_only_the_station_certificate(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "station_tls", True)
+    pem, cert_path, key_path = self_signed(tmp_path, "station")
+    other_pem, _, _ = self_signed(tmp_path, "other")
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server = await FakeStationServer(token="good", ssl_context=context).start()
+    try:
+        use_cloud(monkeypatch, Cloud(server.port, ["good"], certificate=pem))
+        conn = StationConnection(DEVICE_ID, "oauth")
+        reply = await conn.send({"command": "play"}, timeout=5)
+        assert reply["status"] == "SUCCESS"
+        await conn.stop()
+
+        use_cloud(monkeypatch, Cloud(server.port, ["good"], certificate=other_pem))
+        conn = StationConnection(DEVICE_ID, "oauth")
+        with pytest.raises(asyncio.TimeoutError):
+            await conn.send({"command": "play"}, timeout=0.5)
+        assert "CERTIFICATE_VERIFY_FAILED" in conn.last_error
+        await conn.stop()
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_tls_without_certificate_does_not_connect(monkeypatch):
+    monkeypatch.setattr(settings, "station_tls", True)
+    use_cloud(monkeypatch, Cloud(1, ["good"]))
+    conn = StationConnection(DEVICE_ID, "oauth")
+    with pytest.raises(asyncio.TimeoutError):
+        await conn.send({"command": "play"}, timeout=0.3)
+    assert "no server certificate" in conn.last_error
+    await conn.stop()
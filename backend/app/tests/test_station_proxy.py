@@ -0,0 +1,66 @@
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from services.http_clients import http_clients
+from services.station_client import station_client
+from settings import settings
+
+
+@pytest_asyncio.fixture
+async def yapi():
+    requests = []
+    statuses = []  # коды ответов по порядку, дальше — 200
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(statuses.pop(0) if statuses else 200, text="busy")
+
+    await http_clients.start(transport=httpx.MockTransport(handler))
+    yield requests, statuses
+    await http_clients.start()
+    await http_clients.stop()
+
+
+@pytest.mark.asyncio
+async def test_goes_through_yapi_unless_native(api, yapi, monkeypatch):
+    requests, statuses = yapi
+    monkeypatch.setattr(settings, "station_native", False)
+
+    async def native(*args, **kwargs):
+        raise AssertionError("native path must stay off")
+
+    monkeypatch.setattr(station_client, "send", native)
+    body = {"deviceId": "st1", "command": "sendText", "text": "hi", "host": "h"}
+    response = await api.post("/api/station", json=body)
+    assert response.json() == {"ok": True, "status": "SUCCESS"}
+    assert requests == [{"command": "sendText", "text": "hi"}]
+
+    statuses.append(500)
+    response = await api.post("/api/station", json=body)
+    assert response.status_code == 502
+    assert response.json()["detail"] == "yapi error: 500 - busy"
+
+
+@pytest.mark.asyncio
+async def test_native_sends_over_lan(api, yapi, monkeypatch):
+    requests, _ = yapi
+    monkeypatch.setattr(settings, "station_native", True)
+    sent = []
+
+    async def token():
+        return "oauth"
+
+    async def native(device_id, payload, oauth_token, host=None, port=None):
+        sent.append((device_id, payload, oauth_token, host))
+        return {"status": "SUCCESS"}
+
+    monkeypatch.setattr("routes.station_proxy.get_provider_token", token)
+    monkeypatch.setattr(station_client, "send", native)
+    body = {"deviceId": "st1", "command": "stop", "host": "h"}
+    response = await api.post("/api/station", json=body)
+    assert response.json() == {"ok": True, "status": "SUCCESS"}
+    assert sent == [("st1", {"command": "stop"}, "oauth", "h")]
+    assert requests == []
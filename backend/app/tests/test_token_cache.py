@@ -0,0 +1,51 @@
+import pytest
+
+from models.user_token import UserToken
+from services import token_cache as token_cache_module
+from services.token_cache import TokenCache, token_cache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(token_cache_module.time, "monotonic", lambda: now[0])
+    cache = TokenCache(maxsize=10, ttl=5.0)
+    cache.put("h1", "u1")
+    assert cache.get("h1") == "u1"
+
+    now[0] += 5.0
+    assert cache.get("h1") is None
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 1}
+
+
+def test_least_recently_used_is_evicted():
+    cache = TokenCache(maxsize=2, ttl=60.0)
+    cache.put("h1", "u1")
+    cache.put("h2", "u2")
+    assert cache.get("h1") == "u1"
+    cache.put("h3", "u3")
+    assert cache.get("h2") is None
+    assert cache.get("h1") == "u1"
+    assert cache.get("h3") == "u3"
+
+
+def test_invalidate_user_drops_only_their_tokens():
+    cache = TokenCache()
+    cache.put("h1", "u1")
+    cache.put("h2", "u1")
+    cache.put("h3", "u2")
+    cache.invalidate_user("u1")
+    assert cache.get("h1") is None
+    assert cache.get("h2") is None
+    assert cache.get("h3") == "u2"
+
+
+@pytest.mark.asyncio
+async def test_unlinked_token_is_rejected(api):
+    assert (await api.get("/v1.0/user/devices")).status_code == 200
+    hits = token_cache.hits
+    assert (await api.get("/v1.0/user/devices")).status_code == 200
+    assert token_cache.hits == hits + 1
+
+    assert (await api.post("/v1.0/user/unlink")).status_code == 200
+    assert await UserToken.filter(user_id="u1").count() == 0
+    assert (await api.get("/v1.0/user/devices")).status_code == 401
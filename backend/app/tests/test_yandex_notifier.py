@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from models.user_token import UserToken
+from services.http_clients import http_clients
+from services.state_store import state_store
+from services.yandex_notifier import YandexNotifier
+from settings import settings
+
+
+async def wait_for_requests(requests, count, timeout=3.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while len(requests) < count and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    return requests
+
+
+@pytest_asyncio.fixture
+async def callbacks(db, monkeypatch):
+    monkeypatch.setattr(settings, "yandex_skill_id", "skill")
+    monkeypatch.setattr(settings, "yandex_callback_token", "cb-token")
+    monkeypatch.setattr(settings, "yandex_push_window", 0.05)
+    monkeypatch.setattr(settings, "yandex_push_batch", 2)
+    monkeypatch.setattr(settings, "yandex_push_rate", 0.0)
+    monkeypatch.setattr(settings, "yandex_discovery_debounce", 0.1)
+    await UserToken.all().delete()
+    await UserToken.create(user_id="u1", provider="yandex", access_token="secret")
+
+    requests = []
+    statuses = []  # коды ответов по порядку, дальше — 202
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        auth = request.headers["authorization"]
+        requests.append((request.url.path, auth, json.loads(request.content)))
+        return httpx.Response(statuses.pop(0) if statuses else 202)
+
+    await http_clients.start(transport=httpx.MockTransport(handler))
+    notifier = YandexNotifier()
+    await notifier.start()
+    yield notifier, requests, statuses
+    await notifier.stop()
+    await http_clients.start()
+    await http_clients.stop()
+
+
+@pytest.mark.asyncio
+async def test_state_changes_are_coalesced_and_batched(callbacks):
+    notifier, requests, _ = callbacks
+    for value in range(10):
+        state_store.set(1, "devices.capabilities.range", "volume", value)
+    state_store.set(2, "devices.capabilities.on_off", None, True)
+    state_store.set(3, "devices.capabilities.on_off", None, False)
+
+    await wait_for_requests(requests, 2)
+    await asyncio.sleep(0.1)
+    assert len(requests) == 2
+    path, auth, body = requests[0]
+    assert path == "/api/v1/skills/skill/callback/state"
+    assert auth == "OAuth cb-token"
+    assert body["payload"]["user_id"] == "u1"
+    devices = [d for _, _, b in requests for d in b["payload"]["devices"]]
+    assert [d["id"] for d in devices] == ["1", "2", "3"]
+    # из десяти значений громкости уходит только последнее
+    assert devices[0]["capabilities"] == [
+        {
+            "type": "devices.capabilities.range",
+            "state": {"instance": "volume", "value": 9},
+        },
+    ]
+    assert notifier.stats()["sent"] == 2
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limited_callback(callbacks):
+    notifier, requests, statuses = callbacks
+    statuses.extend([429, 503])
+    notifier.state_changed(1, "devices.capabilities.on_off", "on", True)
+
+    await wait_for_requests(requests, 3)
+    assert len(requests) == 3
+    assert notifier.stats()["sent"] == 1
+    assert notifier.stats()["failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_retried(callbacks):
+    notifier, requests, statuses = callbacks
+    statuses.append(400)
+    notifier.state_changed(1, "devices.capabilities.on_off", "on", True)
+
+    await wait_for_requests(requests, 1)
+    await asyncio.sleep(0.7)
+    assert len(requests) == 1
+    assert notifier.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_discovery_is_debounced(callbacks):
+    notifier, requests, _ = callbacks
+    for _ in range(5):
+        notifier.devices_changed()
+        await asyncio.sleep(0.02)
+
+    await wait_for_requests(requests, 1)
+    await asyncio.sleep(0.2)
+    paths = [path for path, _, _ in requests]
+    assert paths == ["/api/v1/skills/skill/callback/discovery"]
+
+
+@pytest.mark.asyncio
+async def test_stopped_notifier_ignores_changes(callbacks):
+    notifier, requests, _ = callbacks
+    await notifier.stop()
+    notifier.state_changed(1, "devices.capabilities.on_off", "on", True)
+    notifier.devices_changed()
+    await asyncio.sleep(0.2)
+    assert requests == []
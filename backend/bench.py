@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк провайдерского API и выполнения действий.
+
+Приложение FastAPI работает в этом же процессе (httpx.ASGITransport) на
+SQLite во временном каталоге; вместо брокера — брокер в памяти, к
+которому публикатор и потребитель MQTT подключаются через подменённый
+``aiomqtt.Client``; вместо adb — ``fake_adb_server.FakeADBServer``.
+Сеть и настоящие устройства не нужны.
+
+Сценарии на каждый размер парка:
+  token_cached / token_uncached — проверка bearer-токена (кэш / запрос в БД)
+  capabilities                  — get_device_capabilities по типам парка
+  devices                       — GET /v1.0/user/devices
+  query                         — POST /v1.0/user/devices/query (``--batch`` устройств)
+  action                        — POST /v1.0/user/devices/action (MQTT и ADB вперемешку)
+  invoke_binding                — POST /api/bindings/{id}/invoke (ADB), только HTTP
+  invoke_roundtrip              — от invoke до сообщения состояния с тем же traceId
+
+Результат — JSON (``--output``); ``--compare`` сравнивает с прошлым
+прогоном и с ``--max-regression`` завершается с кодом 1, если p99
+какого-то сценария вырос больше допустимого.
+
+Запуск: python bench.py --sizes 10,200,2000 --requests 500 --output bench.json
+        python bench.py --compare bench-main.json --max-regression 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BACKEND = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND / "app"))
+
+TOKEN = "bench-bearer-token"
+USER_ID = "bench-user"
+ON_OFF = "devices.capabilities.on_off"
+# (тип устройства, тип привязки on_off) — парк собирается циклом по списку
+FLEET = [
+    ("devices.types.light", "mqtt"),
+    ("devices.types.socket", "mqtt"),
+    ("devices.types.media_device.tv", "adb"),
+    ("devices.types.light.lamp", "mqtt"),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _prepare_env(workdir: str, adb_port: int) -> None:
+    """Настройки читаются при импорте модулей приложения — задаём их заранее"""
+    from cryptography.fernet import Fernet
+
+    os.environ["DATABASE_URL"] = f"sqlite://{workdir}/bench.sqlite3"
+    os.environ["ADB_SERVER_PORT"] = str(adb_port)
+    os.environ.setdefault("Y2M_ENC_KEY", Fernet.generate_key().decode())
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _summary(latencies: List[float], errors: int, wall: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / wall, 1) if wall > 0 else None,
+        "mean_ms": round(sum(latencies) / count * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+async def measure(call: Callable[[int], Awaitable[bool]], requests: int, concurrency: int,
+                  warmup: int) -> Dict[str, Any]:
+    """``requests`` вызовов в ``concurrency`` параллельных потоков; ``call`` возвращает успех"""
+    for i in range(warmup):
+        await call(i)
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker() -> None:
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summary(latencies, errors, time.perf_counter() - started)
+
+
+def measure_sync(call: Callable[[int], Any], requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - t0)
+    return _summary(latencies, 0, time.perf_counter() - started)
+
+
+class FakeBroker:
+    """Брокер MQTT в памяти процесса.
+
+    ``client()`` подменяет ``aiomqtt.Client``: публикатор и потребитель
+    приложения подключаются к нему как к настоящему брокеру, так что
+    invoke и состояния проходят обычный путь через очередь публикации и
+    читателя. Сообщения состояния с ``traceId`` будят ожидающие
+    ``wait_state``.
+    """
+
+    def __init__(self) -> None:
+        self.published = 0
+        self.clients: List["FakeMQTTClient"] = []
+        self._waiters: Dict[str, asyncio.Future] = {}
+
+    def client(self, *args: Any, **kwargs: Any) -> "FakeMQTTClient":
+        return FakeMQTTClient(self)
+
+    def wait_state(self, trace_id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[trace_id] = future
+        return future
+
+    def route(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        import aiomqtt
+
+        self.published += 1
+        if topic.startswith("y2m/devices/") and topic.endswith("/state"):
+            data = json.loads(payload)
+            future = self._waiters.pop(str(data.get("traceId")), None)
+            if future is not None and not future.done():
+                future.set_result(data)
+        for client in self.clients:
+            if any(aiomqtt.Topic(topic).matches(f) for f in client.filters):
+                client.queue.put_nowait(aiomqtt.Message(topic, payload, qos, retain, mid=0, properties=None))
+
+
+class FakeMQTTClient:
+    """То подмножество ``aiomqtt.Client``, которым пользуется приложение"""
+
+    def __init__(self, broker: FakeBroker) -> None:
+        self.broker = broker
+        self.filters: set = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self) -> "FakeMQTTClient":
+        self.broker.clients.append(self)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.broker.clients.remove(self)
+
+    @staticmethod
+    def _filter(topic: str) -> str:
+        # общая подписка: $share/<группа>/<фильтр>; потребитель здесь один
+        if topic.startswith("$share/"):
+            return topic.split("/", 2)[2]
+        return topic
+
+    async def subscribe(self, topic: str, *args: Any, **kwargs: Any) -> None:
+        self.filters.add(self._filter(topic))
+
+    async def unsubscribe(self, topic: str, *args: Any, **kwargs: Any) -> None:
+        self.filters.discard(self._filter(topic))
+
+    async def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False,
+                      **kwargs: Any) -> None:
+        payload = payload.encode() if isinstance(payload, str) else payload
+        self.broker.route(topic, payload or b"", qos, retain)
+
+    @property
+    def messages(self):
+        async def iterate():
+            while True:
+                yield await self.queue.get()
+        return iterate()
+
+
+async def seed(size: int, adb_hosts: int) -> Dict[str, Any]:
+    """Пользователь, ``size`` устройств с привязкой on_off и известным состоянием"""
+    import hashlib
+
+    from models.binding import Binding
+    from models.device import Device
+    from models.user_token import UserToken
+    from services.crypto import encrypt
+    from services.state_store import state_store
+
+    await UserToken.create(
+        user_id=USER_ID, provider="yandex", access_token=encrypt(TOKEN),
+        access_token_hash=hashlib.sha256(TOKEN.encode()).hexdigest(),
+    )
+    await Device.bulk_create([
+        Device(
+            name=f"bench-{i}", yandex_type=FLEET[i % len(FLEET)][0],
+            adb_host=f"10.0.0.{i % adb_hosts}" if FLEET[i % len(FLEET)][1] == "adb" else None,
+            adb_port=5555 if FLEET[i % len(FLEET)][1] == "adb" else None,
+        )
+        for i in range(size)
+    ])
+    devices = await Device.all().order_by("id")
+    bindings = []
+    for i, device in enumerate(devices):
+        if FLEET[i % len(FLEET)][1] == "adb":
+            config = {"command": "echo keyevent 26"}
+        else:
+            config = {"topic": "bench/{{device_id}}/set", "payload": '{"state": "{{value|map:true=ON,false=OFF}}"}'}
+        bindings.append(Binding(device_id=device.id, capability=ON_OFF, action_type=FLEET[i % len(FLEET)][1],
+                                action_config=config))
+        state_store.set(device.id, ON_OFF, "on", False)
+    await Binding.bulk_create(bindings)
+    adb_bindings = await Binding.filter(action_type="adb").order_by("id").values_list("id", flat=True)
+    return {
+        "device_ids": [str(device.id) for device in devices],
+        "device_types": sorted({device.yandex_type for device in devices}),
+        "adb_bindings": list(adb_bindings),
+    }
+
+
+async def run_size(client, broker: FakeBroker, size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from fastapi.security import HTTPAuthorizationCredentials
+    from tortoise import Tortoise, connections
+
+    from db import TORTOISE_ORM
+    from routes.provider import get_device_capabilities, get_user_from_token
+    from services.binding_registry import binding_registry
+    from services.discovery_cache import discovery_cache
+    from services.metrics import instrument_db
+    from services.token_cache import token_cache
+    from settings import settings
+
+    db_path = Path(args.workdir) / f"fleet-{size}.sqlite3"
+    await Tortoise.init(config={**TORTOISE_ORM, "connections": {"default": f"sqlite://{db_path}"}})
+    await Tortoise.generate_schemas()
+    instrument_db(connections.get("default"))
+    # у каждого размера своя БД: кэши предыдущего парка сбрасываем
+    binding_registry.invalidate()
+    discovery_cache.bump()
+    token_cache.invalidate_user(USER_ID)
+    try:
+        fleet = await seed(size, args.adb_hosts)
+        ids = fleet["device_ids"]
+        batch = min(args.batch, size)
+        headers = {"Authorization": f"Bearer {TOKEN}"}
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=TOKEN)
+
+        def devices_batch(i: int) -> List[str]:
+            start = (i * batch) % size
+            return (ids[start:] + ids[:start])[:batch]
+
+        async def token_cached(i: int) -> bool:
+            return await get_user_from_token(credentials) == USER_ID
+
+        async def token_uncached(i: int) -> bool:
+            token_cache.invalidate_user(USER_ID)
+            return await get_user_from_token(credentials) == USER_ID
+
+        # ответ discovery разбираем один раз: на больших парках разбор JSON
+        # на стороне клиента занял бы больше, чем сам запрос
+        response = await client.get("/v1.0/user/devices", headers=headers)
+        if response.status_code != 200 or len(response.json()["payload"]["devices"]) != size:
+            raise RuntimeError(f"discovery returned an unexpected response for {size} devices")
+
+        async def devices(i: int) -> bool:
+            response = await client.get("/v1.0/user/devices", headers=headers)
+            return response.status_code == 200
+
+        async def query(i: int) -> bool:
+            body = {"devices": [{"id": device_id} for device_id in devices_batch(i)]}
+            response = await client.post("/v1.0/user/devices/query", json=body, headers=headers)
+            return response.status_code == 200
+
+        async def action(i: int) -> bool:
+            body = {"devices": [
+                {"id": device_id, "capabilities": [{"type": ON_OFF, "state": {"instance": "on", "value": i % 2 == 0}}]}
+                for device_id in devices_batch(i)
+            ]}
+            response = await client.post("/v1.0/user/devices/action", json=body, headers=headers)
+            if response.status_code != 200:
+                return False
+            results = [c["state"]["action_result"] for d in response.json()["payload"]["devices"] for c in d["capabilities"]]
+            return all(result.get("status") == "DONE" for result in results)
+
+        adb_bindings = fleet["adb_bindings"] or [None]
+
+        async def invoke_binding(i: int) -> bool:
+            binding_id = adb_bindings[i % len(adb_bindings)]
+            response = await client.post(f"/api/bindings/{binding_id}/invoke", json={"payload": {"value": True}})
+            return response.status_code == 200
+
+        async def invoke_roundtrip(i: int) -> bool:
+            binding_id = adb_bindings[i % len(adb_bindings)]
+            trace_id = f"bench-{size}-{i}-{time.monotonic_ns()}"
+            state = broker.wait_state(trace_id)
+            response = await client.post(
+                f"/api/bindings/{binding_id}/invoke", json={"payload": {"value": True}},
+                headers={"X-Request-Id": trace_id},
+            )
+            if response.status_code != 200:
+                return False
+            data = await asyncio.wait_for(state, timeout=args.timeout)
+            return bool(data["result"].get("ok"))
+
+        scenarios: Dict[str, Callable[[int], Awaitable[bool]]] = {
+            "token_cached": token_cached,
+            "token_uncached": token_uncached,
+            "devices": devices,
+            "query": query,
+            "action": action,
+        }
+        if fleet["adb_bindings"]:
+            scenarios["invoke_binding"] = invoke_binding
+            if settings.trace_enabled:
+                scenarios["invoke_roundtrip"] = invoke_roundtrip  # traceId приходит из трассировки
+
+        results: Dict[str, Any] = {}
+        types = fleet["device_types"]
+        if not args.only or "capabilities" in args.only:
+            results["capabilities"] = measure_sync(
+                lambda i: get_device_capabilities(types[i % len(types)]), args.requests * 10,
+            )
+            print(_row(size, "capabilities", results["capabilities"]), flush=True)
+        for name, call in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = await measure(call, args.requests, args.concurrency, args.warmup)
+            print(_row(size, name, results[name]), flush=True)
+        return results
+    finally:
+        await Tortoise.close_connections()
+
+
+def _row(size: int, name: str, result: Dict[str, Any]) -> str:
+    return (f"{size:>6} {name:<18} {result['throughput_rps']:>10} rps  p50 {result['p50_ms']:>9.3f} ms  "
+            f"p99 {result['p99_ms']:>9.3f} ms  errors {result['errors']}")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    adb_port = _free_port()
+    _prepare_env(args.workdir, adb_port)
+
+    import aiomqtt
+    import httpx
+
+    from fake_adb_server import FakeADBServer
+    from main import app
+    from routes import api_router
+    from services.adb_shell import shell_sessions
+    from services.mqtt_publisher import mqtt_publisher
+    from services.mqtt_service import mqtt_service
+
+    fake_adb = await FakeADBServer(port=adb_port, latency=args.adb_latency).start()
+    for host in range(args.adb_hosts):
+        fake_adb.set_state(f"10.0.0.{host}:5555", "device")
+    app.include_router(api_router)  # как в on_startup; из фоновых служб — только MQTT
+    broker = FakeBroker()
+    aiomqtt.Client = broker.client
+    await mqtt_publisher.start()
+    await mqtt_service.start()
+    await mqtt_service.set_invokes(True)
+
+    results: Dict[str, Any] = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for size in args.sizes:
+                results[str(size)] = await run_size(client, broker, size, args)
+    finally:
+        await mqtt_service.stop()
+        await mqtt_publisher.stop()
+        await shell_sessions.stop()
+        await fake_adb.stop()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "sizes": args.sizes, "requests": args.requests, "concurrency": args.concurrency,
+                "warmup": args.warmup, "batch": args.batch, "adb_hosts": args.adb_hosts,
+                "adb_latency": args.adb_latency,
+            },
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: Optional[float]) -> bool:
+    """Печатает изменения p50/p99/rps; False, если p99 вырос больше ``max_regression`` %"""
+    ok = True
+    print(f"\ncompare with {baseline['meta'].get('commit')} ({baseline['meta'].get('created_at')})")
+    for size, scenarios in current["results"].items():
+        for name, result in scenarios.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if not old:
+                continue
+            deltas = {
+                key: (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                for key in ("p50_ms", "p99_ms", "throughput_rps")
+            }
+            flag = ""
+            if max_regression is not None and deltas["p99_ms"] > max_regression:
+                ok = False
+                flag = "  REGRESSION"
+            print(f"{size:>6} {name:<18} p50 {deltas['p50_ms']:+7.1f}%  p99 {deltas['p99_ms']:+7.1f}%  "
+                  f"rps {deltas['throughput_rps']:+7.1f}%{flag}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the provider API and action dispatch")
+    parser.add_argument("--sizes", default="10,200,2000", help="размеры парка через запятую")
+    parser.add_argument("--requests", type=int, default=300, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=20, help="устройств в одном query/action")
+    parser.add_argument("--adb-hosts", type=int, default=8, help="разных adb-устройств у телевизоров парка")
+    parser.add_argument("--adb-latency", type=float, default=0.0, help="задержка fake adb, сек")
+    parser.add_argument("--timeout", type=float, default=10.0, help="ожидание состояния в invoke_roundtrip, сек")
+    parser.add_argument("--only", default="", help="сценарии через запятую (по умолчанию все)")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, help="допустимый рост p99, %%")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.only = {name.strip() for name in args.only.split(",") if name.strip()}
+
+    with tempfile.TemporaryDirectory(prefix="y2m-bench-") as workdir:
+        args.workdir = workdir
+        report = asyncio.run(run(args))
+
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"results written to {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if not compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
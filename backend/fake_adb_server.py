@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Минимальный fake adb-сервер для локальной проверки ADB-клиента без устройств.
+
+Понимает host:version, host:connect, host:disconnect, host:devices,
+host:track-devices, host:transport:<serial>, shell,v2,raw:<cmd> и shell:<cmd>.
+Команда ``echo <text>`` возвращает текст, ``exit <n>`` — код возврата,
+остальные команды выполняются «успешно» с пустым выводом.
+``shell,v2,raw:sh`` открывает интерактивную сессию с настоящим /bin/sh.
+С ``shell_v2=False`` сервер ведёт себя как старое устройство: службы
+``shell,v2`` отвечают FAIL, работает только ``shell:``.
+
+Запуск: python fake_adb_server.py --port 5037
+"""
+
+import argparse
+import asyncio
+import contextlib
+import shlex
+import struct
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeADBServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 shell_v2: bool = True) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.shell_v2 = shell_v2
+        self.devices: Dict[str, str] = {}  # serial -> state
+        self.unreachable: set[str] = set()  # host:port, на которые connect не проходит
+        self.commands: List[Tuple[str, str]] = []  # (serial, command)
+        self.sessions_opened = 0
+        self._trackers: List[asyncio.StreamWriter] = []
+        self._handlers: set[asyncio.Task] = set()
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> "FakeADBServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        for writer in self._trackers:
+            writer.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        # соединения, закрытые клиентом, ещё дорабатывают: дожидаемся их
+        if self._handlers:
+            _, pending = await asyncio.wait(self._handlers, timeout=1.0)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def set_state(self, serial: str, state: Optional[str]) -> None:
+        """Меняет состояние устройства (None — отвал) и оповещает подписчиков track-devices"""
+        if state is None:
+            self.devices.pop(serial, None)
+        else:
+            self.devices[serial] = state
+        self._notify()
+
+    def _device_list(self) -> str:
+        return "".join(f"{s}\t{state}\n" for s, state in self.devices.items())
+
+    def _notify(self) -> None:
+        data = self._device_list().encode()
+        for writer in list(self._trackers):
+            if writer.is_closing():
+                self._trackers.remove(writer)
+            else:
+                writer.write(b"%04x" % len(data) + data)
+
+    # --- protocol helpers ---
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> str:
+        length = int(await reader.readexactly(4), 16)
+        return (await reader.readexactly(length)).decode()
+
+    @staticmethod
+    def _okay(writer: asyncio.StreamWriter, payload: Optional[str] = None) -> None:
+        writer.write(b"OKAY")
+        if payload is not None:
+            data = payload.encode()
+            writer.write(b"%04x" % len(data) + data)
+
+    @staticmethod
+    def _fail(writer: asyncio.StreamWriter, message: str) -> None:
+        data = message.encode()
+        writer.write(b"FAIL" + b"%04x" % len(data) + data)
+
+    @staticmethod
+    def _run(command: str) -> Tuple[int, str]:
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            argv = command.split()
+        if argv and argv[0] == "echo":
+            return 0, " ".join(argv[1:]) + "\n"
+        if argv and argv[0] == "exit":
+            return int(argv[1]) if len(argv) > 1 else 0, ""
+        return 0, ""
+
+    # --- handlers ---
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            request = await self._read_request(reader)
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if request == "host:version":
+                self._okay(writer, "%04x" % 41)
+            elif request.startswith("host:connect:"):
+                serial = request[len("host:connect:"):]
+                if serial in self.unreachable:
+                    self._okay(writer, f"failed to connect to '{serial}': Connection refused")
+                elif self.devices.get(serial) == "device":
+                    self._okay(writer, f"already connected to {serial}")
+                else:
+                    self.set_state(serial, "device")
+                    self._okay(writer, f"connected to {serial}")
+            elif request.startswith("host:disconnect:"):
+                serial = request[len("host:disconnect:"):]
+                self.set_state(serial, None)
+                self._okay(writer, f"disconnected {serial}")
+            elif request == "host:devices":
+                self._okay(writer, self._device_list())
+            elif request == "host:track-devices":
+                self._okay(writer, self._device_list())
+                self._trackers.append(writer)
+                await writer.drain()
+                await reader.read()  # держим поток, пока клиент не закроет
+                if writer in self._trackers:
+                    self._trackers.remove(writer)
+            elif request.startswith("host:transport:"):
+                serial = request[len("host:transport:"):]
+                if self.devices.get(serial) != "device":
+                    self._fail(writer, f"device '{serial}' not found")
+                else:
+                    self._okay(writer)
+                    await writer.drain()
+                    await self._service(serial, reader, writer)
+            else:
+                self._fail(writer, f"unknown host service: {request}")
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    async def _service(self, serial: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request = await self._read_request(reader)
+        if request.startswith("shell,v2,") and not self.shell_v2:
+            self._fail(writer, "closed")
+        elif request == "shell,v2,raw:sh":
+            await self._interactive(serial, reader, writer)
+        elif request.startswith("shell,v2,raw:"):
+            command = request[len("shell,v2,raw:"):]
+            self.commands.append((serial, command))
+            code, out = self._run(command)
+            self._okay(writer)
+            if out:
+                writer.write(struct.pack("<BI", 1, len(out.encode())) + out.encode())
+            writer.write(struct.pack("<BI", 3, 1) + bytes([code & 0xFF]))
+        elif request.startswith("shell:"):
+            command = request[len("shell:"):]
+            self.commands.append((serial, command))
+            self._okay(writer)
+            writer.write(self._run(command)[1].encode())
+        else:
+            self._fail(writer, f"unknown service: {request}")
+
+    async def _interactive(self, serial: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Интерактивный shell v2: stdin-пакеты уходят в настоящий /bin/sh"""
+        self.sessions_opened += 1
+        proc = await asyncio.create_subprocess_exec(
+            "/bin/sh", stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        self._okay(writer)
+        await writer.drain()
+
+        async def pump_stdout() -> None:
+            while True:
+                data = await proc.stdout.read(4096)
+                if not data:
+                    break
+                writer.write(struct.pack("<BI", 1, len(data)) + data)
+                await writer.drain()
+            code = await proc.wait()
+            writer.write(struct.pack("<BI", 3, 1) + bytes([code & 0xFF]))
+            await writer.drain()
+
+        pump = asyncio.create_task(pump_stdout())
+        try:
+            while True:
+                packet_id, length = struct.unpack("<BI", await reader.readexactly(5))
+                data = await reader.readexactly(length)
+                if packet_id == 0:
+                    self.commands.append((serial, data.decode(errors="ignore")))
+                    proc.stdin.write(data)
+                    await proc.stdin.drain()
+                elif packet_id == 4:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if proc.returncode is None:
+                proc.stdin.close()
+                with contextlib.suppress(ProcessLookupError):
+                    proc.kill()
+            with contextlib.suppress(Exception):
+                await pump
+
+
+async def _main(host: str, port: int, latency: float) -> None:
+    server = await FakeADBServer(host, port, latency).start()
+    print(f"fake adb server listening on {server.host}:{server.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake adb server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5037)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
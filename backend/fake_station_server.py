@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Минимальная fake-станция для локальной проверки LAN-клиента станций.
+
+Говорит на протоколе glagol по обычному ws:// (в приложении для этого
+ставится STATION_TLS=false) или по wss://, если передан ``ssl_context`` с
+самоподписанным сертификатом, как у станции: проверяет conversationToken,
+отвечает ``status: SUCCESS`` с ``requestId`` и текущим состоянием.
+Неверный токен закрывает сокет с кодом 4000, как настоящая станция.
+
+Запуск: python fake_station_server.py --port 1961 --token secret
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+
+class FakeStationServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token: str = "fake-token",
+                 latency: float = 0.0, ssl_context: Optional[ssl.SSLContext] = None) -> None:
+        self.host = host
+        self.port = port
+        self.token = token
+        self.latency = latency
+        self.ssl_context = ssl_context
+        self.state: Dict[str, Any] = {"playing": False, "volume": 0.5}
+        self.commands: List[Dict[str, Any]] = []
+        self.connections = 0
+        self._server = None
+
+    async def start(self) -> "FakeStationServer":
+        self._server = await serve(self._handle, self.host, self.port, ssl=self.ssl_context)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def drop_all(self) -> None:
+        """Рвёт все текущие подключения (проверка переподключения)"""
+        if self._server:
+            for connection in list(self._server.connections):
+                connection.transport.abort()
+
+    def _apply(self, payload: Dict[str, Any]) -> Optional[str]:
+        command = payload.get("command")
+        if command == "play":
+            self.state["playing"] = True
+        elif command == "stop":
+            self.state["playing"] = False
+        elif command == "setVolume":
+            self.state["volume"] = payload.get("volume", self.state["volume"])
+        elif command not in ("sendText", "next", "prev", "rewind", "ping"):
+            return "UNSUPPORTED"
+        return None
+
+    async def _handle(self, ws: ServerConnection) -> None:
+        self.connections += 1
+        try:
+            await self._serve(ws)
+        except ConnectionClosed:
+            pass
+
+    async def _serve(self, ws: ServerConnection) -> None:
+        async for raw in ws:
+            message = json.loads(raw)
+            if message.get("conversationToken") != self.token:
+                await ws.close(4000, "invalid token")
+                return
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            payload = message.get("payload") or {}
+            self.commands.append(payload)
+            status = self._apply(payload) or "SUCCESS"
+            await ws.send(json.dumps({
+                "id": str(uuid.uuid4()),
+                "requestId": message.get("id"),
+                "sentTime": int(time.time() * 1000),
+                "status": status,
+                "state": self.state,
+            }))
+
+
+async def _main(host: str, port: int, token: str, latency: float) -> None:
+    server = await FakeStationServer(host, port, token, latency).start()
+    print(f"fake station listening on ws://{server.host}:{server.port} (token {server.token})")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Yandex station (glagol)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1961)
+    parser.add_argument("--token", default="fake-token")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args.host, args.port, args.token, args.latency))
+    except KeyboardInterrupt:
+        pass